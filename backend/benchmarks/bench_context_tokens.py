@@ -0,0 +1,104 @@
+"""
+Prompt-token report for the context windows sent to the LLM.
+
+For each template, parses it with the fixed word window ("words", the previous
+behaviour) and with token-budgeted windows ("budget") at one or more budgets,
+then counts, over the first /chat_fill turn of every occurrence:
+
+    context_tokens    tokens of occurrence_context alone
+    prompt_tokens     tokens of the whole request (system prompt + JSON payload)
+    distinct_prompts  different prompts among them: identical ones are answered
+                      by the decision cache, so this is the number of LLM calls
+    mean/max          prompt tokens per occurrence
+
+Token counts use tiktoken when installed, otherwise ~4 characters per token
+(the counter in use is printed). Run from the backend folder, on real templates:
+
+    python -m benchmarks.bench_context_tokens path/to/safe.docx path/to/nda.docx
+    python -m benchmarks.bench_context_tokens --budget 80 120 200 --json
+
+Without paths it uses generated documents (benchmarks.docgen), one of them with
+signature blocks.
+"""
+import argparse
+import json
+import os
+
+from benchmarks.docgen import DocSpec, make_docx
+from utils.conversation import _build_messages
+from utils.parser import extract_placeholders
+from utils.tokens import count_tokens, token_counter_name
+
+# Per-message framing the chat format adds on top of the content
+MESSAGE_OVERHEAD_TOKENS = 4
+
+
+def prompt_tokens(label: str, context: str) -> int:
+    return sum(count_tokens(m["content"]) + MESSAGE_OVERHEAD_TOKENS for m in _build_messages(label, context))
+
+
+def measure(data: bytes, context_mode: str, context_window_words: int = 80, budget: int | None = None) -> dict:
+    parsed = extract_placeholders(
+        data, context_window_words, context_mode=context_mode, context_token_budget=budget
+    )
+    occurrences, contexts = parsed["occurrences"], parsed["context_map"]
+    prompts = [(o["label"], contexts[o["id"]]) for o in occurrences]
+    per_prompt = [prompt_tokens(label, context) for label, context in prompts]
+    return {
+        "occurrences": len(occurrences),
+        "context_tokens": sum(count_tokens(context) for _, context in prompts),
+        "prompt_tokens": sum(per_prompt),
+        "distinct_prompts": len(set(prompts)),
+        # Identical prompts are sent once and then served by the decision cache
+        "sent_prompt_tokens": sum(dict(zip(prompts, per_prompt)).values()),
+        "mean_prompt_tokens": round(sum(per_prompt) / len(per_prompt), 1) if per_prompt else 0,
+        "max_prompt_tokens": max(per_prompt, default=0),
+    }
+
+
+def _generated() -> list:
+    return [
+        ("generated:body", make_docx(DocSpec(paragraphs=60, density=0.5, seed=1))[0]),
+        ("generated:dense", make_docx(DocSpec(paragraphs=60, density=2.0, seed=2))[0]),
+        ("generated:signatures", make_docx(DocSpec(paragraphs=30, density=0.3, signature_blocks=4, seed=3))[0]),
+    ]
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("docs", nargs="*", help=".docx templates (default: generated ones)")
+    ap.add_argument("--budget", type=int, nargs="+", default=[120], help="token budgets to compare")
+    ap.add_argument("--words", type=int, default=80, help="context_window_words of the baseline")
+    ap.add_argument("--json", action="store_true", help="print machine-readable results")
+    args = ap.parse_args()
+
+    docs = []
+    for path in args.docs:
+        with open(path, "rb") as f:
+            docs.append((os.path.basename(path), f.read()))
+    docs = docs or _generated()
+
+    report = {"token_counter": token_counter_name(), "documents": []}
+    for name, data in docs:
+        modes = {f"words:{args.words}": measure(data, "words", args.words)}
+        for budget in args.budget:
+            modes[f"budget:{budget}"] = measure(data, "budget", budget=budget)
+        report["documents"].append({"name": name, "modes": modes})
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+    print(f"token counter: {report['token_counter']}")
+    header = f"{'document':<24}{'mode':<12}{'occ':>5}{'context':>9}{'prompt':>9}{'distinct':>9}{'sent':>9}{'mean':>8}{'max':>6}{'sent vs words':>15}"
+    print(header)
+    for doc in report["documents"]:
+        baseline = next(iter(doc["modes"].values()))["sent_prompt_tokens"]
+        for mode, m in doc["modes"].items():
+            change = f"{m['sent_prompt_tokens'] / baseline - 1:+.1%}" if baseline else "-"
+            print(f"{doc['name']:<24}{mode:<12}{m['occurrences']:>5}{m['context_tokens']:>9}{m['prompt_tokens']:>9}"
+                  f"{m['distinct_prompts']:>9}{m['sent_prompt_tokens']:>9}{m['mean_prompt_tokens']:>8}"
+                  f"{m['max_prompt_tokens']:>6}{change:>15}")
+
+
+if __name__ == "__main__":
+    main()
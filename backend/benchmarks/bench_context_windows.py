@@ -0,0 +1,120 @@
+"""
+Scaling benchmark for the context-window step of `extract_placeholders`.
+
+Compares the bisect-based `_context_windows` with the previous full-scan loop
+(one pass over every word offset per match) and checks that both produce
+identical snippets.
+
+Run from the backend folder:
+
+    python -m benchmarks.bench_context_windows
+    python -m benchmarks.bench_context_windows --words 10000 100000 1000000 --every 200 --json
+"""
+import argparse
+import json
+import random
+import time
+
+from utils.parser import _context_windows, _tokenize_words_with_offsets
+from utils.placeholders import scan_placeholders
+
+FILLER_WORDS = (
+    "the investor company shall pay purchase amount safe agreement equity financing "
+    "conversion valuation cap discount rate liquidity event dissolution holder"
+).split()
+PLACEHOLDERS = ["[Company Name]", "$[__________]", "<Investor Name>", "{{Date of Safe}}", "[State of Incorporation]"]
+
+
+def make_text(n_words: int, every: int, seed: int = 0) -> str:
+    """Synthetic document of `n_words` words with a placeholder roughly every `every` words."""
+    rng = random.Random(seed)
+    words = []
+    for i in range(n_words):
+        if every and i % every == every // 2:
+            words.append(rng.choice(PLACEHOLDERS))
+        else:
+            words.append(rng.choice(FILLER_WORDS))
+        if i % 40 == 39:
+            words[-1] += ".\n"
+    return " ".join(words)
+
+
+def find_spans(text: str):
+    return [(m.start, m.end) for m in scan_placeholders(text)]
+
+
+def legacy_context_windows(word_positions, words_only, spans, context_window_words):
+    """The original O(matches x words) loop, kept here only as the reference implementation."""
+    snippets = []
+    for s, e in spans:
+        left_idx = 0
+        right_idx = len(words_only) - 1
+        for i, off in enumerate(word_positions):
+            if off <= s:
+                left_idx = i
+            if off < e:
+                right_idx = i
+        cstart = max(0, left_idx - context_window_words)
+        cend = min(len(words_only), right_idx + 1 + context_window_words)
+        snippets.append(" ".join(words_only[cstart:cend]).strip())
+    return snippets
+
+
+def run_case(n_words: int, every: int, window: int, legacy_budget: int) -> dict:
+    text = make_text(n_words, every)
+    spans = find_spans(text)
+    words_with_offs = _tokenize_words_with_offsets(text)
+    word_positions = [off for _, off in words_with_offs]
+    words_only = [w for w, _ in words_with_offs]
+
+    t0 = time.perf_counter()
+    fast = _context_windows(word_positions, words_only, spans, window)
+    fast_s = time.perf_counter() - t0
+
+    # The legacy loop is quadratic: time it on as many matches as the budget allows and extrapolate
+    legacy_n = min(len(spans), max(1, legacy_budget // max(1, len(word_positions))))
+    t0 = time.perf_counter()
+    legacy = legacy_context_windows(word_positions, words_only, spans[:legacy_n], window)
+    legacy_s = time.perf_counter() - t0
+    identical = legacy == fast[:legacy_n]
+    legacy_est_s = legacy_s * len(spans) / legacy_n if legacy_n else 0.0
+
+    return {
+        "words": len(words_only),
+        "matches": len(spans),
+        "bisect_s": round(fast_s, 6),
+        "legacy_s": round(legacy_est_s, 6),
+        "legacy_extrapolated": legacy_n < len(spans),
+        "speedup": round(legacy_est_s / fast_s, 1) if fast_s else None,
+        "identical": identical,
+        "checked_matches": legacy_n,
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--words", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    ap.add_argument("--every", type=int, default=200, help="one placeholder every N words")
+    ap.add_argument("--window", type=int, default=80, help="context_window_words")
+    ap.add_argument("--legacy-budget", type=int, default=50_000_000,
+                    help="max word-offset comparisons spent timing the legacy loop")
+    ap.add_argument("--json", action="store_true", help="print machine-readable results")
+    args = ap.parse_args()
+
+    results = [run_case(n, args.every, args.window, args.legacy_budget) for n in args.words]
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"{'words':>10} {'matches':>8} {'bisect (s)':>11} {'legacy (s)':>12} {'speedup':>9}  identical")
+    for r in results:
+        legacy = f"{r['legacy_s']:.3f}{'*' if r['legacy_extrapolated'] else ''}"
+        print(f"{r['words']:>10} {r['matches']:>8} {r['bisect_s']:>11.4f} {legacy:>12} {r['speedup']:>8}x  {r['identical']}")
+    if any(r["legacy_extrapolated"] for r in results):
+        print("* extrapolated from the first `checked_matches` matches")
+    if not all(r["identical"] for r in results):
+        raise SystemExit("❌ snippets differ from the legacy implementation")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,205 @@
+"""
+Parse/fill microbenchmarks over synthetic documents (see benchmarks/docgen.py).
+
+Starting from a base document, each sweep varies one dimension (paragraph count,
+placeholder density, table nesting, header/footer, run fragmentation) and times:
+
+    parse:docx, parse:stream                  extract_placeholders in both parse modes
+    fill:ordered:docx, fill:ordered:xml       ordered-list responses, scanning fill engines
+    fill:ordered:positions                    ordered-list responses filled by parsed position
+    fill:legacy:docx, fill:legacy:xml         legacy label-dict responses
+    fill:template                             compiled template plan (utils.templates)
+
+Each operation reports the best and median wall time over `--repeat` runs and the
+peak Python heap from one extra run under tracemalloc (lxml's C allocations are
+not included). The paragraphs sweep also reports a scaling exponent per operation
+(~1 is linear, ~2 is quadratic) to catch regressions like the old context-window loop.
+
+Run from the backend folder:
+
+    python -m benchmarks.bench_parse_fill
+    python -m benchmarks.bench_parse_fill --quick --out bench.json
+    python -m benchmarks.bench_parse_fill --compare bench.json --threshold 1.3
+"""
+import argparse
+import json
+import math
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from dataclasses import replace
+
+from benchmarks.docgen import PLACEHOLDERS, DocSpec, make_docx
+from utils.filler import fill_placeholders
+from utils.parser import extract_placeholders
+from utils.placeholders import MONEY_LABEL, normalize_label
+from utils.templates import compile_template
+
+SWEEPS = {
+    "paragraphs": [100, 1_000, 5_000],
+    "density": [0.2, 1.0, 4.0],
+    "table_depth": [0, 2, 4],
+    "fragmentation": [1, 4, 12],
+    "header_footer": [False, True],
+}
+QUICK_SWEEPS = {
+    "paragraphs": [50, 200, 800],
+    "density": [0.2, 2.0],
+    "table_depth": [0, 3],
+    "fragmentation": [1, 8],
+    "header_footer": [False, True],
+}
+
+
+def _measure(fn, repeat: int) -> dict:
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t0)
+    tracemalloc.start()
+    try:
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {
+        "best_s": round(min(times), 6),
+        "median_s": round(statistics.median(times), 6),
+        "peak_mb": round(peak / 2**20, 3),
+    }
+
+
+def _legacy_responses() -> dict:
+    responses = {normalize_label(p).title(): f"Value {i}" for i, p in enumerate(PLACEHOLDERS) if not p.startswith("$")}
+    responses[MONEY_LABEL] = "1,000,000"
+    return responses
+
+
+def run_case(spec: DocSpec, repeat: int) -> dict:
+    data, written = make_docx(spec)
+    parsed = extract_placeholders(data)
+    occurrences = parsed["occurrences"]
+    ordered = [{"id": o["id"], "label": o["label"], "value": f"Value {o['id']}"} for o in occurrences]
+    positions = {o["id"]: o["pos"] for o in occurrences}
+    legacy = _legacy_responses()
+    template = compile_template("bench", data, parsed)
+
+    ops = {
+        "parse:docx": lambda: extract_placeholders(data, 80, "docx"),
+        "parse:stream": lambda: extract_placeholders(data, 80, "stream"),
+        "fill:ordered:docx": lambda: fill_placeholders(data, ordered, "docx"),
+        "fill:ordered:xml": lambda: fill_placeholders(data, ordered, "xml"),
+        "fill:ordered:positions": lambda: fill_placeholders(data, ordered, "xml", positions),
+        "fill:legacy:docx": lambda: fill_placeholders(data, legacy, "docx"),
+        "fill:legacy:xml": lambda: fill_placeholders(data, legacy, "xml"),
+        "fill:template": lambda: template.fill(ordered),
+    }
+    return {
+        "spec": spec.as_dict(),
+        "bytes": len(data),
+        "placeholders": written,
+        "occurrences": len(occurrences),
+        "ops": {name: _measure(fn, repeat) for name, fn in ops.items()},
+    }
+
+
+def scaling(results: list, sweep: str = "paragraphs") -> dict:
+    """log-log slope of best time vs. the swept size, between its smallest and largest value."""
+    cases = [r for r in results if r["sweep"] == sweep]
+    if len(cases) < 2:
+        return {}
+    lo, hi = cases[0], cases[-1]
+    size_ratio = math.log(hi["value"] / lo["value"])
+    out = {}
+    for op, m in hi["ops"].items():
+        a, b = lo["ops"][op]["best_s"], m["best_s"]
+        if a > 0 and b > 0:
+            out[op] = round(math.log(b / a) / size_ratio, 2)
+    return out
+
+
+def compare(results: list, baseline: dict, threshold: float) -> list:
+    """(sweep, value, op, ratio) for every operation slower than `threshold` x the baseline."""
+    base = {(r["sweep"], json.dumps(r["value"]), op): m["best_s"] for r in baseline["results"] for op, m in r["ops"].items()}
+    slower = []
+    for r in results:
+        for op, m in r["ops"].items():
+            before = base.get((r["sweep"], json.dumps(r["value"]), op))
+            if before and m["best_s"] / before > threshold:
+                slower.append((r["sweep"], r["value"], op, round(m["best_s"] / before, 2)))
+    return slower
+
+
+def _commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--sweep", choices=list(SWEEPS), nargs="+", help="only run these sweeps")
+    ap.add_argument("--quick", action="store_true", help="smaller documents, for a fast check")
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--json", action="store_true", help="print machine-readable results")
+    ap.add_argument("--out", help="also write the JSON results to this file")
+    ap.add_argument("--compare", help="JSON results of a previous run to compare against")
+    ap.add_argument("--threshold", type=float, default=1.3, help="slowdown ratio reported as a regression")
+    args = ap.parse_args()
+
+    sweeps = QUICK_SWEEPS if args.quick else SWEEPS
+    base = DocSpec(paragraphs=sweeps["paragraphs"][0])
+    results = []
+    for sweep in args.sweep or list(sweeps):
+        for value in sweeps[sweep]:
+            case = run_case(replace(base, **{sweep: value}), args.repeat)
+            results.append({"sweep": sweep, "value": value, **case})
+            if not args.json:
+                print(f"{sweep}={value}: {case['bytes']} bytes, {case['occurrences']} occurrences", file=sys.stderr)
+
+    report = {
+        "commit": _commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "quick": args.quick,
+        "repeat": args.repeat,
+        "results": results,
+        "scaling": {"paragraphs": scaling(results)},
+    }
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+    slower = []
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            slower = compare(results, json.load(f), args.threshold)
+        report["regressions"] = [dict(zip(("sweep", "value", "op", "ratio"), s)) for s in slower]
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        ops = list(results[0]["ops"]) if results else []
+        print(f"{'case':<22}" + "".join(f"{op:>24}" for op in ops))
+        for r in results:
+            cells = "".join(f"{r['ops'][op]['best_s'] * 1000:>15.1f}ms {r['ops'][op]['peak_mb']:>5.1f}M" for op in ops)
+            print(f"{r['sweep'] + '=' + str(r['value']):<22}{cells}")
+        if report["scaling"]["paragraphs"]:
+            print("\nscaling exponent vs paragraphs (1 = linear):")
+            for op, k in report["scaling"]["paragraphs"].items():
+                print(f"  {op:<24} {k}")
+        for sweep, value, op, ratio in slower:
+            print(f"❌ {op} at {sweep}={value} is {ratio}x slower than the baseline")
+    if slower:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,215 @@
+"""
+Synthetic .docx generator for the benchmarks.
+
+Builds WordprocessingML directly (python-docx is far too slow to produce large
+documents) on top of python-docx's default template, so the output opens with
+every parser and fill engine in this repo. Everything is controlled by `DocSpec`:
+
+    paragraphs      body paragraphs
+    density         placeholders per paragraph (fractions are spread at random)
+    tables          tables appended to the body
+    table_depth     nesting: each table's first cell holds another table, this deep
+    table_size      rows = columns of every table
+    header_footer   add a default header and footer holding placeholders
+    fragmentation   runs each placeholder is split across (Word does this after edits)
+    signature_blocks  signature blocks appended to the body (short lines, placeholders close together)
+"""
+import io
+import random
+import zipfile
+from dataclasses import asdict, dataclass
+from xml.sax.saxutils import escape
+
+from docx import Document
+
+FILLER_WORDS = (
+    "the investor company shall pay purchase amount safe agreement equity financing "
+    "conversion valuation cap discount rate liquidity event dissolution holder"
+).split()
+
+PLACEHOLDERS = [
+    "[Company Name]",
+    "[Investor Name]",
+    "$[__________]",
+    "{{Date of Safe}}",
+    "<Governing Law>",
+    "[State of Incorporation]",
+    "[Post-Money Valuation Cap]",
+    "{{Investor Title}}",
+]
+
+W_NS = "http://schemas.openxmlformats.org/wordprocessingml/2006/main"
+R_NS = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+HEADER_REL = "http://schemas.openxmlformats.org/officeDocument/2006/relationships/header"
+FOOTER_REL = "http://schemas.openxmlformats.org/officeDocument/2006/relationships/footer"
+HEADER_CT = "application/vnd.openxmlformats-officedocument.wordprocessingml.header+xml"
+FOOTER_CT = "application/vnd.openxmlformats-officedocument.wordprocessingml.footer+xml"
+XML_DECL = '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+
+
+@dataclass(frozen=True)
+class DocSpec:
+    paragraphs: int = 200
+    density: float = 1.0
+    tables: int = 2
+    table_depth: int = 1
+    table_size: int = 2
+    header_footer: bool = True
+    fragmentation: int = 1
+    words_per_paragraph: int = 40
+    signature_blocks: int = 0
+    seed: int = 0
+
+    def as_dict(self) -> dict:
+        return asdict(self)
+
+
+def _run(text: str, bold: bool = False) -> str:
+    rpr = "<w:rPr><w:b/></w:rPr>" if bold else ""
+    return f'<w:r>{rpr}<w:t xml:space="preserve">{escape(text)}</w:t></w:r>'
+
+
+def _fragments(text: str, pieces: int) -> list:
+    pieces = max(1, min(pieces, len(text)))
+    step = -(-len(text) // pieces)
+    return [text[i:i + step] for i in range(0, len(text), step)]
+
+
+class _Writer:
+    def __init__(self, spec: DocSpec):
+        self.spec = spec
+        self.rng = random.Random(spec.seed)
+        self.placeholders = 0
+
+    def _count(self) -> int:
+        whole = int(self.spec.density)
+        return whole + (1 if self.rng.random() < self.spec.density - whole else 0)
+
+    def paragraph(self, words: int | None = None) -> str:
+        words = self.spec.words_per_paragraph if words is None else words
+        n_ph = self._count()
+        slots = sorted(self.rng.sample(range(words + 1), min(n_ph, words + 1)))
+        runs, text, slot_iter = [], [], iter(slots)
+        next_slot = next(slot_iter, None)
+        for i in range(words + 1):
+            while next_slot == i:
+                if text:
+                    runs.append(_run(" ".join(text) + " "))
+                    text = []
+                ph = self.rng.choice(PLACEHOLDERS)
+                runs.extend(_run(f, bold=j % 2 == 1) for j, f in enumerate(_fragments(ph, self.spec.fragmentation)))
+                runs.append(_run(" "))
+                self.placeholders += 1
+                next_slot = next(slot_iter, None)
+            if i < words:
+                text.append(self.rng.choice(FILLER_WORDS))
+        if text:
+            runs.append(_run(" ".join(text) + "."))
+        return f"<w:p>{''.join(runs)}</w:p>"
+
+    def table(self, depth: int) -> str:
+        size = self.spec.table_size
+        rows = []
+        for r in range(size):
+            cells = []
+            for c in range(size):
+                inner = self.paragraph(8)
+                if depth > 0 and r == 0 and c == 0:
+                    # A cell must end with a paragraph
+                    inner += self.table(depth - 1) + "<w:p/>"
+                cells.append(f"<w:tc><w:tcPr><w:tcW w:w=\"0\" w:type=\"auto\"/></w:tcPr>{inner}</w:tc>")
+            rows.append(f"<w:tr>{''.join(cells)}</w:tr>")
+        grid = "".join('<w:gridCol w:w="2000"/>' for _ in range(size))
+        return f"<w:tbl><w:tblPr><w:tblW w:w=\"0\" w:type=\"auto\"/></w:tblPr><w:tblGrid>{grid}</w:tblGrid>{''.join(rows)}</w:tbl>"
+
+    def signature_block(self) -> str:
+        lines = [
+            "IN WITNESS WHEREOF, the undersigned have caused this Safe to be duly executed and delivered.",
+            "[Company Name]",
+            "By: ______________________",
+            "Name: [Investor Name]",
+            "Title: {{Investor Title}}",
+            "Date: {{Date of Safe}}",
+            "Address: [Company Name], [State of Incorporation]",
+        ]
+        self.placeholders += sum(line.count("[") - line.count("$[") + line.count("{{") for line in lines)
+        return "".join(f"<w:p>{_run(line)}</w:p>" for line in lines)
+
+    def story(self, tag: str, paragraphs: int) -> str:
+        body = "".join(self.paragraph(12) for _ in range(paragraphs))
+        return f'{XML_DECL}<w:{tag} xmlns:w="{W_NS}" xmlns:r="{R_NS}">{body}</w:{tag}>'
+
+
+def make_docx(spec: DocSpec) -> tuple:
+    """(docx bytes, number of placeholders written) for `spec`."""
+    base = io.BytesIO()
+    Document().save(base)
+    writer = _Writer(spec)
+
+    body = [writer.paragraph() for _ in range(spec.paragraphs)]
+    body += [writer.table(spec.table_depth) + "<w:p/>" for _ in range(spec.tables)]
+    body += [writer.signature_block() for _ in range(spec.signature_blocks)]
+    refs = ""
+    if spec.header_footer:
+        refs = (
+            '<w:headerReference w:type="default" r:id="rIdBenchHdr"/>'
+            '<w:footerReference w:type="default" r:id="rIdBenchFtr"/>'
+        )
+        header = writer.story("hdr", 2)
+        footer = writer.story("ftr", 1)
+    document = (
+        f'{XML_DECL}<w:document xmlns:w="{W_NS}" xmlns:r="{R_NS}"><w:body>{"".join(body)}'
+        f'<w:sectPr>{refs}<w:pgSz w:w="12240" w:h="15840"/></w:sectPr></w:body></w:document>'
+    )
+
+    out = io.BytesIO()
+    with zipfile.ZipFile(base) as zin, zipfile.ZipFile(out, "w", zipfile.ZIP_DEFLATED) as zout:
+        for info in zin.infolist():
+            data = zin.read(info.filename)
+            if info.filename == "word/document.xml":
+                data = document.encode("utf-8")
+            elif spec.header_footer and info.filename == "word/_rels/document.xml.rels":
+                data = data.replace(
+                    b"</Relationships>",
+                    f'<Relationship Id="rIdBenchHdr" Type="{HEADER_REL}" Target="bench_header.xml"/>'
+                    f'<Relationship Id="rIdBenchFtr" Type="{FOOTER_REL}" Target="bench_footer.xml"/>'
+                    "</Relationships>".encode("utf-8"),
+                )
+            elif spec.header_footer and info.filename == "[Content_Types].xml":
+                data = data.replace(
+                    b"</Types>",
+                    f'<Override PartName="/word/bench_header.xml" ContentType="{HEADER_CT}"/>'
+                    f'<Override PartName="/word/bench_footer.xml" ContentType="{FOOTER_CT}"/>'
+                    "</Types>".encode("utf-8"),
+                )
+            zout.writestr(info, data)
+        if spec.header_footer:
+            zout.writestr("word/bench_header.xml", header)
+            zout.writestr("word/bench_footer.xml", footer)
+    return out.getvalue(), writer.placeholders
+
+
+def main():
+    import argparse
+
+    ap = argparse.ArgumentParser(description="Write one synthetic .docx (python -m benchmarks.docgen out.docx)")
+    ap.add_argument("out")
+    ap.add_argument("--paragraphs", type=int, default=DocSpec.paragraphs)
+    ap.add_argument("--density", type=float, default=DocSpec.density)
+    ap.add_argument("--tables", type=int, default=DocSpec.tables)
+    ap.add_argument("--table-depth", type=int, default=DocSpec.table_depth)
+    ap.add_argument("--table-size", type=int, default=DocSpec.table_size)
+    ap.add_argument("--no-header-footer", dest="header_footer", action="store_false")
+    ap.add_argument("--fragmentation", type=int, default=DocSpec.fragmentation)
+    ap.add_argument("--signature-blocks", type=int, default=DocSpec.signature_blocks)
+    ap.add_argument("--seed", type=int, default=DocSpec.seed)
+    args = vars(ap.parse_args())
+    out = args.pop("out")
+    data, n = make_docx(DocSpec(**args))
+    with open(out, "wb") as f:
+        f.write(data)
+    print(f"wrote {out}: {len(data)} bytes, {n} placeholders")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,193 @@
+"""
+Local stand-in for the OpenAI chat-completions API, for offline load tests.
+
+Answers POST /v1/chat/completions in the OpenAI response format after a delay
+drawn from a configurable distribution, and can inject HTTP errors and replies
+that are not valid JSON. Replies follow the backend's decision protocol: "fill"
+when the turn carries user_input, "reuse" when a previous_global_value exists,
+"ask" otherwise. With `"stream": true` the reply is sent as chat.completion.chunk
+server-sent events: the first chunk after `--ttft-share` of the sampled latency,
+the rest spread over the remainder.
+
+Latency specs (seconds):
+
+    fixed:0.5            always 0.5
+    uniform:0.2,1.5      uniform between the bounds
+    normal:0.8,0.2       mean, standard deviation (clamped at 0)
+    lognormal:0.7,0.5    median, sigma (long tail, closest to real LLM latency)
+    exp:0.8              exponential with this mean
+
+Run from the backend folder, then point the backend at it:
+
+    python -m benchmarks.fake_openai --port 9100 --latency lognormal:0.7,0.5 --error-rate 0.02
+    OPENAI_BASE_URL=http://127.0.0.1:9100/v1 OPENAI_API_KEY=sk-fake uvicorn main:app
+"""
+import argparse
+import asyncio
+import json
+import math
+import random
+import time
+import uuid
+from dataclasses import dataclass, field
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+
+
+def parse_latency(spec: str):
+    """Return a sampler `rng -> seconds` for a latency spec such as "lognormal:0.7,0.5"."""
+    kind, _, args = spec.partition(":")
+    values = [float(v) for v in args.split(",") if v]
+    samplers = {
+        "fixed": (1, lambda rng, v: v[0]),
+        "uniform": (2, lambda rng, v: rng.uniform(v[0], v[1])),
+        "normal": (2, lambda rng, v: max(0.0, rng.gauss(v[0], v[1]))),
+        "lognormal": (2, lambda rng, v: rng.lognormvariate(math.log(v[0]), v[1])),
+        "exp": (1, lambda rng, v: rng.expovariate(1 / v[0]) if v[0] > 0 else 0.0),
+    }
+    if kind not in samplers or len(values) != samplers[kind][0]:
+        raise ValueError(f"Bad latency spec {spec!r} (e.g. fixed:0.5, uniform:0.2,1.5, lognormal:0.7,0.5)")
+    fn = samplers[kind][1]
+    return lambda rng: fn(rng, values)
+
+
+@dataclass
+class FakeConfig:
+    latency: str = "lognormal:0.6,0.4"
+    error_rate: float = 0.0
+    error_status: int = 500
+    malformed_rate: float = 0.0
+    seed: int | None = None
+    ttft_share: float = 0.25
+    chunk_chars: int = 4
+    stats: dict = field(default_factory=lambda: {"requests": 0, "errors": 0, "malformed": 0})
+
+
+def decide(payload: dict) -> dict:
+    label = payload.get("placeholder_label", "")
+    if payload.get("user_input"):
+        return {"action": "fill", "filled_value": payload["user_input"].strip(), "followup_question": "", "confidence": 0.9}
+    if payload.get("previous_global_value"):
+        return {"action": "reuse", "filled_value": payload["previous_global_value"], "followup_question": "", "confidence": 0.8}
+    return {"action": "ask", "filled_value": "", "followup_question": f"What is the {label.title()}?", "confidence": 0.85}
+
+
+def _stream_reply(completion_id: str, model: str, content: str, latency: float, config: FakeConfig):
+    pieces = [content[i:i + config.chunk_chars] for i in range(0, len(content), config.chunk_chars)] or [""]
+    first = latency * config.ttft_share
+    gap = (latency - first) / max(1, len(pieces) - 1)
+
+    def chunk(delta: dict, finish_reason=None) -> str:
+        body = {
+            "id": completion_id,
+            "object": "chat.completion.chunk",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+        }
+        return f"data: {json.dumps(body)}\n\n"
+
+    async def events():
+        await asyncio.sleep(first)
+        yield chunk({"role": "assistant", "content": ""})
+        for i, piece in enumerate(pieces):
+            if i:
+                await asyncio.sleep(gap)
+            yield chunk({"content": piece})
+        yield chunk({}, "stop")
+        yield "data: [DONE]\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+
+def create_app(config: FakeConfig) -> FastAPI:
+    app = FastAPI(title="Fake OpenAI")
+    rng = random.Random(config.seed)
+    sample_latency = parse_latency(config.latency)
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        config.stats["requests"] += 1
+        latency = sample_latency(rng)
+        stream = bool(body.get("stream"))
+        if not stream:
+            await asyncio.sleep(latency)
+
+        if rng.random() < config.error_rate:
+            config.stats["errors"] += 1
+            return JSONResponse(
+                status_code=config.error_status,
+                content={"error": {"message": "Injected failure", "type": "server_error", "code": None}},
+            )
+
+        messages = body.get("messages", [])
+        try:
+            payload = json.loads(messages[-1]["content"])
+        except (IndexError, KeyError, TypeError, ValueError):
+            payload = {}
+        if rng.random() < config.malformed_rate:
+            config.stats["malformed"] += 1
+            content = "Sure! I think the answer is probably the company name."
+        else:
+            content = json.dumps(decide(payload))
+
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:24]}"
+        if stream:
+            return _stream_reply(completion_id, body.get("model", "gpt-4o-mini"), content, latency, config)
+
+        prompt_chars = sum(len(m.get("content", "")) for m in messages)
+        return {
+            "id": completion_id,
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "gpt-4o-mini"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop",
+            }],
+            # Rough 4-characters-per-token estimate
+            "usage": {
+                "prompt_tokens": prompt_chars // 4,
+                "completion_tokens": len(content) // 4,
+                "total_tokens": (prompt_chars + len(content)) // 4,
+            },
+        }
+
+    @app.get("/stats")
+    def stats():
+        return config.stats
+
+    @app.get("/", response_class=PlainTextResponse)
+    def root():
+        return "fake-openai ok"
+
+    return app
+
+
+def main():
+    import uvicorn
+
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=9100)
+    ap.add_argument("--latency", default=FakeConfig.latency, help="latency distribution spec")
+    ap.add_argument("--error-rate", type=float, default=0.0, help="share of requests answered with an HTTP error")
+    ap.add_argument("--error-status", type=int, default=500, help="status code of injected errors (e.g. 429, 503)")
+    ap.add_argument("--malformed-rate", type=float, default=0.0, help="share of replies that are not JSON")
+    ap.add_argument("--seed", type=int, default=None)
+    ap.add_argument("--ttft-share", type=float, default=FakeConfig.ttft_share,
+                    help="streamed replies: share of the latency before the first chunk")
+    args = ap.parse_args()
+
+    parse_latency(args.latency)  # fail fast on a bad spec
+    config = FakeConfig(
+        args.latency, args.error_rate, args.error_status, args.malformed_rate, args.seed, args.ttft_share
+    )
+    uvicorn.run(create_app(config), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
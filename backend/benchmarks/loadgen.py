@@ -0,0 +1,344 @@
+"""
+End-to-end load generator: realistic sessions against the FastAPI backend.
+
+Each virtual user runs sessions the way the Streamlit frontend does:
+
+    POST /parse_doc                 upload a template
+    POST /chat_fill  (per occurrence, in order)
+                                    first turn without input; when the model asks,
+                                    a second turn with a synthetic answer
+    POST /fill_doc                  ordered responses against the session's doc_id
+
+(`--batch` resolves the occurrences with one /chat_fill_batch call instead;
+`--stream` uses /chat_fill_stream and also records the time to its first event
+as "chat_fill_stream:first_event".) It reports throughput and p50/p95/p99
+latency per endpoint and per session.
+
+Fully offline with `--spawn`: starts benchmarks.fake_openai and the backend
+(uvicorn) on local ports, wired together through OPENAI_BASE_URL:
+
+    python -m benchmarks.loadgen --spawn --sessions 50 --concurrency 10
+    python -m benchmarks.loadgen --spawn --latency lognormal:0.7,0.6 --error-rate 0.05 --malformed-rate 0.05 --json
+
+Or against servers you started yourself:
+
+    python -m benchmarks.loadgen --base-url http://127.0.0.1:8000 --doc my_template.docx
+
+Templates are generated with benchmarks.docgen unless `--doc` is given. The
+backend's decision cache answers repeated identical turns, so use
+`--unique-docs` (one generated document per session) or run the backend with
+DECISION_CACHE_TTL_SECONDS=0 to measure the LLM path every time.
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import subprocess
+import sys
+import time
+from collections import defaultdict
+
+import httpx
+
+from benchmarks.docgen import DocSpec, make_docx
+
+
+def percentile(sorted_values: list, q: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    k = max(0, min(len(sorted_values) - 1, math.ceil(q / 100 * len(sorted_values)) - 1))
+    return sorted_values[k]
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.statuses = defaultdict(lambda: defaultdict(int))
+
+    async def call(self, client: httpx.AsyncClient, name: str, method: str, url: str, **kwargs) -> httpx.Response | None:
+        t0 = time.perf_counter()
+        try:
+            resp = await client.request(method, url, **kwargs)
+            await resp.aread()
+        except httpx.HTTPError as e:
+            self.latencies[name].append(time.perf_counter() - t0)
+            self.errors[name] += 1
+            self.statuses[name][type(e).__name__] += 1
+            return None
+        self.latencies[name].append(time.perf_counter() - t0)
+        self.statuses[name][str(resp.status_code)] += 1
+        if resp.status_code >= 400:
+            self.errors[name] += 1
+        return resp
+
+    async def stream(self, client: httpx.AsyncClient, name: str, url: str, **kwargs) -> dict | None:
+        """POST an SSE endpoint; records the time to the first event and to the end, returns the `final` event."""
+        t0 = time.perf_counter()
+        final, event = None, None
+        try:
+            async with client.stream("POST", url, **kwargs) as resp:
+                if resp.status_code >= 400:
+                    await resp.aread()
+                    self.latencies[name].append(time.perf_counter() - t0)
+                    self.statuses[name][str(resp.status_code)] += 1
+                    self.errors[name] += 1
+                    return None
+                async for line in resp.aiter_lines():
+                    if line.startswith("event:"):
+                        if event is None:
+                            self.latencies[f"{name}:first_event"].append(time.perf_counter() - t0)
+                        event = line[6:].strip()
+                    elif line.startswith("data:") and event == "final":
+                        final = json.loads(line[5:])
+        except httpx.HTTPError as e:
+            self.latencies[name].append(time.perf_counter() - t0)
+            self.errors[name] += 1
+            self.statuses[name][type(e).__name__] += 1
+            return None
+        self.latencies[name].append(time.perf_counter() - t0)
+        self.statuses[name]["200"] += 1
+        return final
+
+    def summary(self, wall_s: float) -> dict:
+        out = {}
+        for name, values in sorted(self.latencies.items()):
+            values = sorted(values)
+            out[name] = {
+                "count": len(values),
+                "errors": self.errors[name],
+                "throughput_rps": round(len(values) / wall_s, 2) if wall_s else None,
+                "mean_ms": round(1000 * sum(values) / len(values), 1),
+                "p50_ms": round(1000 * percentile(values, 50), 1),
+                "p95_ms": round(1000 * percentile(values, 95), 1),
+                "p99_ms": round(1000 * percentile(values, 99), 1),
+                "max_ms": round(1000 * values[-1], 1),
+                "statuses": dict(self.statuses[name]),
+            }
+        return out
+
+
+def _answer(label: str, session: int) -> str:
+    if "$" in label or "AMOUNT" in label or "CAP" in label:
+        return f"{(session + 1) * 1000:,}"
+    if "DATE" in label:
+        return "March 3, 2025"
+    return f"{label.title()} {session}"
+
+
+async def _chat_turn(client: httpx.AsyncClient, rec: Recorder, form: dict, stream: bool) -> dict:
+    if stream:
+        return await rec.stream(client, "chat_fill_stream", "/chat_fill_stream", data=form) or {}
+    resp = await rec.call(client, "chat_fill", "POST", "/chat_fill", data=form)
+    return resp.json() if resp is not None and resp.status_code == 200 else {}
+
+
+async def run_session(
+    client: httpx.AsyncClient, rec: Recorder, doc: bytes, session: int, batch: bool, stream: bool = False
+) -> bool:
+    t0 = time.perf_counter()
+    resp = await rec.call(client, "parse_doc", "POST", "/parse_doc", files={"file": ("template.docx", doc)})
+    if resp is None or resp.status_code != 200:
+        return False
+    parsed = resp.json()
+    occurrences, context_map = parsed["occurrences"], parsed["context_map"]
+
+    values = {}
+    if batch:
+        user_inputs = {o["id"]: _answer(o["label"], session) for o in occurrences}
+        resp = await rec.call(client, "chat_fill_batch", "POST", "/chat_fill_batch", data={
+            "occurrences": json.dumps(occurrences),
+            "context_map": json.dumps(context_map),
+            "user_inputs": json.dumps(user_inputs),
+        })
+        if resp is None or resp.status_code != 200:
+            return False
+        for r in resp.json()["results"]:
+            values[r["id"]] = r.get("filled_value") or ""
+    else:
+        global_values = {}
+        for o in occurrences:
+            form = {
+                "placeholder": o["label"],
+                "context": context_map.get(o["id"], ""),
+                "previous_global_value": global_values.get(o["label"], ""),
+            }
+            result = await _chat_turn(client, rec, form, stream)
+            if result.get("action") == "ask":
+                # The user answers the question
+                form["user_input"] = _answer(o["label"], session)
+                result = await _chat_turn(client, rec, form, stream)
+            value = result.get("filled_value") or ""
+            values[o["id"]] = value
+            if value:
+                global_values[o["label"]] = value
+
+    responses = [{"id": o["id"], "label": o["label"], "value": values.get(o["id"], "")} for o in occurrences]
+    form = {"responses": json.dumps(responses)}
+    files = None
+    if parsed.get("doc_id"):
+        form["doc_id"] = parsed["doc_id"]
+    else:
+        files = {"file": ("template.docx", doc)}
+    resp = await rec.call(client, "fill_doc", "POST", "/fill_doc", data=form, files=files)
+    ok = resp is not None and resp.status_code == 200
+    if ok:
+        rec.latencies["session"].append(time.perf_counter() - t0)
+    return ok
+
+
+def _auth(args) -> dict:
+    return {"Authorization": f"Bearer {args.api_key}"} if args.api_key else {}
+
+
+async def run_load(args, docs: list) -> dict:
+    rec = Recorder()
+    queue = asyncio.Queue()
+    for i in range(args.sessions):
+        queue.put_nowait(i)
+    completed = 0
+
+    limits = httpx.Limits(max_connections=args.concurrency * 2, max_keepalive_connections=args.concurrency * 2)
+    headers = _auth(args)
+    async with httpx.AsyncClient(base_url=args.base_url, limits=limits, timeout=args.timeout, headers=headers) as client:
+        async def user():
+            nonlocal completed
+            while not queue.empty():
+                i = queue.get_nowait()
+                if await run_session(client, rec, docs[i % len(docs)], i, args.batch, args.stream):
+                    completed += 1
+
+        t0 = time.perf_counter()
+        await asyncio.gather(*(user() for _ in range(args.concurrency)))
+        wall = time.perf_counter() - t0
+
+    return {
+        "sessions": args.sessions,
+        "completed_sessions": completed,
+        "concurrency": args.concurrency,
+        "wall_s": round(wall, 3),
+        "sessions_per_s": round(completed / wall, 3) if wall else None,
+        "endpoints": rec.summary(wall),
+    }
+
+
+def _wait_ready(url: str, timeout: float = 30.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(url, timeout=1.0).status_code < 500:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise SystemExit(f"❌ {url} did not come up within {timeout:.0f}s")
+
+
+def spawn_servers(args) -> list:
+    """Start the fake OpenAI server and the backend; returns the processes to stop afterwards."""
+    backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    fake = subprocess.Popen(
+        [sys.executable, "-m", "benchmarks.fake_openai", "--port", str(args.fake_port),
+         "--latency", args.latency, "--error-rate", str(args.error_rate),
+         "--malformed-rate", str(args.malformed_rate), "--seed", "1"],
+        cwd=backend_dir,
+    )
+    env = {
+        **os.environ,
+        "OPENAI_BASE_URL": f"http://127.0.0.1:{args.fake_port}/v1",
+        "OPENAI_API_KEY": args.api_key or "sk-fake",
+    }
+    backend = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(args.backend_port), "--log-level", "warning"],
+        cwd=backend_dir,
+        env=env,
+        stdout=subprocess.DEVNULL,
+    )
+    procs = [fake, backend]
+    try:
+        _wait_ready(f"http://127.0.0.1:{args.fake_port}/")
+        _wait_ready(f"http://127.0.0.1:{args.backend_port}/")
+    except BaseException:
+        stop_servers(procs)
+        raise
+    args.base_url = f"http://127.0.0.1:{args.backend_port}"
+    return procs
+
+
+def stop_servers(procs: list) -> None:
+    for p in procs:
+        p.terminate()
+    for p in procs:
+        try:
+            p.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            p.kill()
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--base-url", default="http://127.0.0.1:8000")
+    ap.add_argument("--sessions", type=int, default=20)
+    ap.add_argument("--concurrency", type=int, default=5, help="virtual users running sessions in parallel")
+    ap.add_argument("--batch", action="store_true", help="use /chat_fill_batch instead of one /chat_fill per turn")
+    ap.add_argument("--stream", action="store_true", help="use /chat_fill_stream (SSE) for each turn")
+    ap.add_argument("--doc", help="template to upload (default: a generated one)")
+    ap.add_argument("--paragraphs", type=int, default=60, help="size of the generated template")
+    ap.add_argument("--density", type=float, default=0.3, help="placeholders per generated paragraph")
+    ap.add_argument("--unique-docs", action="store_true", help="generate a different template per session")
+    ap.add_argument("--api-key", default="sk-fake", help="sent as the Bearer key (empty: use the server's)")
+    ap.add_argument("--timeout", type=float, default=120.0)
+    ap.add_argument("--json", action="store_true", help="print machine-readable results")
+    ap.add_argument("--out", help="also write the JSON results to this file")
+    spawn = ap.add_argument_group("--spawn: run the fake OpenAI server and the backend locally")
+    spawn.add_argument("--spawn", action="store_true")
+    spawn.add_argument("--fake-port", type=int, default=9100)
+    spawn.add_argument("--backend-port", type=int, default=8765)
+    spawn.add_argument("--latency", default="lognormal:0.6,0.4")
+    spawn.add_argument("--error-rate", type=float, default=0.0)
+    spawn.add_argument("--malformed-rate", type=float, default=0.0)
+    args = ap.parse_args()
+
+    if args.doc:
+        with open(args.doc, "rb") as f:
+            docs = [f.read()]
+    else:
+        n_docs = args.sessions if args.unique_docs else 1
+        docs = [make_docx(DocSpec(paragraphs=args.paragraphs, density=args.density, tables=1, seed=i))[0]
+                for i in range(n_docs)]
+
+    procs = spawn_servers(args) if args.spawn else []
+    try:
+        report = asyncio.run(run_load(args, docs))
+        # How the backend answered the turns (rule-based fast path, decision cache, LLM)
+        report["chat_turns"] = httpx.get(f"{args.base_url}/cache_stats", headers=_auth(args)).json().get("chat_turns")
+        if args.spawn:
+            report["fake_openai"] = httpx.get(f"http://127.0.0.1:{args.fake_port}/stats").json()
+    finally:
+        stop_servers(procs)
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+
+    print(f"{report['completed_sessions']}/{report['sessions']} sessions in {report['wall_s']}s "
+          f"({report['sessions_per_s']} sessions/s, concurrency {report['concurrency']})")
+    print(f"{'endpoint':<30}{'count':>7}{'errors':>8}{'req/s':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for name, s in report["endpoints"].items():
+        print(f"{name:<30}{s['count']:>7}{s['errors']:>8}{s['throughput_rps']:>9}"
+              f"{s['p50_ms']:>10}{s['p95_ms']:>10}{s['p99_ms']:>10}{s['max_ms']:>10}")
+    if report.get("chat_turns"):
+        t = report["chat_turns"]
+        print(f"chat turns: {t['turns']} ({t['fast']} fast path, {t['cache']} cached, {t['llm']} LLM; "
+              f"fast share {t['fast_share']:.1%}) rules {t['rules']}")
+    if "fake_openai" in report:
+        print(f"fake OpenAI: {report['fake_openai']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,57 @@
-from fastapi import FastAPI, UploadFile, File, Form, HTTPException, Header
+from fastapi import FastAPI, UploadFile, File, Form, HTTPException, Header, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse
-from utils.parser import extract_placeholders
-from utils.filler import fill_placeholders
-from utils.conversation import handle_conversational_turn
-import json, os, tempfile
+from fastapi.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse
+from utils.parser import extract_placeholders_timed, PARSE_MODES, DEFAULT_PARSE_MODE, PARSER_VERSION
+from utils.context import CONTEXT_MODES, CONTEXT_TOKEN_BUDGET, DEFAULT_CONTEXT_MODE
+from utils.filler import fill_placeholders_timed, FILL_ENGINES
+from utils.conversation import handle_conversational_turn_async, stream_conversational_turn
+from utils.clients import client_cache
+from utils.executors import pools, PoolSaturatedError
+from utils.parse_cache import parse_cache, parse_cache_key, content_digest
+from utils.decision_cache import decision_cache
+from utils.fast_path import turn_stats
+from utils.resilience import UpstreamError, openai_guard
+from utils.uploads import MAX_REQUEST_BYTES, MAX_UPLOAD_BYTES, UploadRejectedError, read_upload
+from utils.sessions import doc_sessions
+from utils.merge import ROW_FORMATS, iter_rows, merge_documents, rows_format
+from utils.templates import (
+    TEMPLATE_ID_RE,
+    TemplateNotFoundError,
+    compile_template,
+    new_template_id,
+    template_registry,
+)
+from utils.metrics import (
+    DOCUMENT_OCCURRENCES,
+    FILL_STAGE_SECONDS,
+    HTTP_REQUEST_SECONDS,
+    PARSE_STAGE_SECONDS,
+    StageTimings,
+    UPLOADS_REJECTED,
+    metrics,
+)
+from utils.log import configure_logging, get_logger
+from utils.profiling import PROFILING_ENABLED, RequestProfile, activate, deactivate, profile_store
+from contextlib import asynccontextmanager
+import asyncio, json, os, time
 from ast import literal_eval
 
-app = FastAPI(title="Lexsy AI Backend")
+configure_logging()
+logger = get_logger("api")
+
+# Max number of conversational turns /chat_fill_batch runs at the same time
+CHAT_FILL_BATCH_CONCURRENCY = int(os.getenv("CHAT_FILL_BATCH_CONCURRENCY", "8"))
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    # Close pooled OpenAI connections and worker pools on shutdown
+    await client_cache.aclose()
+    pools.shutdown()
+
+
+app = FastAPI(title="Lexsy AI Backend", lifespan=lifespan)
 
 # Allow Streamlit frontend to call this API
 app.add_middleware(
@@ -18,22 +62,354 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.middleware("http")
+async def limit_request_size(request: Request, call_next):
+    """Refuse oversized bodies from Content-Length, before they are received and spooled."""
+    length = request.headers.get("content-length")
+    if length and length.isdigit() and int(length) > MAX_REQUEST_BYTES:
+        UPLOADS_REJECTED.inc(reason="request_size")
+        return JSONResponse(
+            status_code=413, content={"detail": f"Request is {length} bytes (limit {MAX_REQUEST_BYTES})"}
+        )
+    return await call_next(request)
+
+
+@app.middleware("http")
+async def record_request_time(request: Request, call_next):
+    t0 = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        # Route template (/templates/{template_id}), not the raw path, to keep label values bounded
+        route = request.scope.get("route")
+        HTTP_REQUEST_SECONDS.observe(
+            time.perf_counter() - t0,
+            method=request.method,
+            route=getattr(route, "path", "unmatched"),
+            status=status,
+        )
+
+
+def _profile_requested(request: Request) -> bool:
+    flag = request.headers.get("x-profile") or request.query_params.get("profile")
+    return PROFILING_ENABLED and flag in ("1", "true", "yes")
+
+
+@app.middleware("http")
+async def profile_request(request: Request, call_next):
+    """`X-Profile: 1` or `?profile=1`: sample this request and point to the saved profile."""
+    if not _profile_requested(request):
+        return await call_next(request)
+    profile = RequestProfile(request.method, request.url.path)
+    token = activate(profile)
+    try:
+        response = await call_next(request)
+    finally:
+        deactivate(profile, token)
+        summary = await pools.run_io(profile_store.save, profile)
+        logger.info("Profiled %s %s: %d samples in %.3fs", profile.method, profile.path, summary["samples"], summary["duration_s"])
+    response.headers["X-Profile-Id"] = profile.profile_id
+    response.headers["X-Profile-Url"] = f"/profiles/{profile.profile_id}"
+    return response
+
+
+@app.exception_handler(PoolSaturatedError)
+async def pool_saturated_handler(request, exc: PoolSaturatedError):
+    return JSONResponse(status_code=503, content={"detail": str(exc)}, headers={"Retry-After": "1"})
+
+
+@app.exception_handler(UpstreamError)
+async def upstream_error_handler(request, exc: UpstreamError):
+    # 429 when rate limited (here or by OpenAI), 503 when OpenAI is failing or the breaker is open
+    return JSONResponse(
+        status_code=exc.status_code,
+        content={"detail": str(exc)},
+        headers={"Retry-After": str(int(exc.retry_after + 0.999))},
+    )
+
+
+@app.exception_handler(UploadRejectedError)
+async def upload_rejected_handler(request, exc: UploadRejectedError):
+    UPLOADS_REJECTED.inc(reason=exc.reason)
+    return JSONResponse(status_code=exc.status_code, content={"detail": str(exc)})
+
+
 @app.get("/")
 def root():
-    return {"status": "ok", "service": "lexsy-backend"}
+    return {"status": "ok", "service": "lexsy-backend", **pools.stats()}
+
+
+DOCX_MEDIA_TYPE = "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+RESPONSE_CHUNK_BYTES = 64 * 1024
+
+
+def _docx_response(data: bytes, filename: str = "completed_document.docx") -> StreamingResponse:
+    """Stream an in-memory .docx back in chunks (no file on disk to clean up)."""
+    chunks = (data[i:i + RESPONSE_CHUNK_BYTES] for i in range(0, len(data), RESPONSE_CHUNK_BYTES))
+    return StreamingResponse(
+        chunks,
+        media_type=DOCX_MEDIA_TYPE,
+        headers={
+            "Content-Disposition": f'attachment; filename="{filename}"',
+            "Content-Length": str(len(data)),
+        },
+    )
+
+
+async def _parse_cached(
+    content: bytes,
+    context_window_words: int = 80,
+    parse_mode: str | None = None,
+    context_mode: str | None = None,
+    context_token_budget: int | None = None,
+    digest: str | None = None,
+) -> dict:
+    """Parse on the process pool; same template bytes + same parse options -> serve the stored result.
+
+    `digest` is the content's SHA-256 when the caller already has it (computed while reading the upload).
+    """
+    parse_mode = parse_mode or DEFAULT_PARSE_MODE
+    context_mode = context_mode or DEFAULT_CONTEXT_MODE
+    context_token_budget = context_token_budget or CONTEXT_TOKEN_BUDGET
+    cache_key = parse_cache_key(
+        digest or content_digest(content),
+        context_window_words=context_window_words,
+        parse_mode=parse_mode,
+        context_mode=context_mode,
+        context_token_budget=context_token_budget,
+        parser_version=PARSER_VERSION,
+    )
+    result = await pools.run_io(parse_cache.get, cache_key)
+    if result is None:
+        result, timings = await pools.run_cpu(
+            extract_placeholders_timed,
+            content,
+            context_window_words,
+            parse_mode,
+            context_mode=context_mode,
+            context_token_budget=context_token_budget,
+        )
+        PARSE_STAGE_SECONDS.observe_stages(timings)
+        DOCUMENT_OCCURRENCES.observe(len(result.get("occurrences", [])))
+        await pools.run_io(parse_cache.put, cache_key, result)
+    return result
+
+
+async def _read_upload(file: UploadFile, docx: bool = True) -> tuple[bytes, str]:
+    """Size- and zip-checked chunked read of an upload -> (content, SHA-256 digest); 413/400 if refused."""
+    with PARSE_STAGE_SECONDS.time(stage="upload_read"):
+        return await pools.run_io(read_upload, file.file, MAX_UPLOAD_BYTES, docx)
 
 
 @app.post("/parse_doc")
-async def parse_doc(file: UploadFile = File(...)):
-    with tempfile.NamedTemporaryFile(delete=False, suffix=".docx") as tmp:
-        tmp.write(await file.read())
-        tmp_path = tmp.name
-    return extract_placeholders(tmp_path)
+async def parse_doc(
+    file: UploadFile = File(...),
+    context_window_words: int = Form(80),
+    parse_mode: str | None = Form(None),
+    context_mode: str | None = Form(None),
+    context_token_budget: int | None = Form(None),
+):
+    """`parse_mode` selects the python-docx ("docx") or streaming XML ("stream") parser.
+
+    `context_mode` "budget" (default) builds sentence-aligned contexts of at most
+    `context_token_budget` tokens with the occurrence marked ⟦inline⟧; "words" keeps
+    the fixed `context_window_words` window.
+    """
+    if not 0 <= context_window_words <= 1000:
+        raise HTTPException(status_code=400, detail="context_window_words must be between 0 and 1000")
+    parse_mode = parse_mode or DEFAULT_PARSE_MODE
+    if parse_mode not in PARSE_MODES:
+        raise HTTPException(status_code=400, detail=f"parse_mode must be one of {PARSE_MODES}")
+    if context_mode and context_mode not in CONTEXT_MODES:
+        raise HTTPException(status_code=400, detail=f"context_mode must be one of {CONTEXT_MODES}")
+    if context_token_budget is not None and not 16 <= context_token_budget <= 4000:
+        raise HTTPException(status_code=400, detail="context_token_budget must be between 16 and 4000")
+    content, digest = await _read_upload(file)
+    try:
+        result = await _parse_cached(
+            content, context_window_words, parse_mode, context_mode, context_token_budget, digest=digest
+        )
+    except PoolSaturatedError:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Could not read document: {e}")
+
+    # Keep the template server-side so /fill_doc can take the doc_id instead of a re-upload
+    doc_id = doc_sessions.create(content, result, file.filename)
+    return {**result, "doc_id": doc_id}
+
+
+@app.delete("/docs/{doc_id}")
+def delete_doc(doc_id: str):
+    if not doc_sessions.delete(doc_id):
+        raise HTTPException(status_code=404, detail="Unknown or expired doc_id")
+    return {"deleted": doc_id}
+
+
+@app.get("/cache_stats")
+def cache_stats():
+    return {
+        "parse": parse_cache.stats(),
+        "decisions": decision_cache.stats(),
+        "sessions": doc_sessions.stats(),
+        "templates": template_registry.stats(),
+        "chat_turns": turn_stats.stats(),
+        "openai": openai_guard.stats(),
+    }
+
+
+def _collect_state():
+    """Cache and pool figures that already live in their own stats(), read at scrape time."""
+    parse, decisions, templates = parse_cache.stats(), decision_cache.stats(), template_registry.stats()
+    sessions = doc_sessions.stats()
+    return [
+        ("lexsy_cache_hits_total", "counter", "Cache lookups answered from memory (or disk).", [
+            ({"cache": "parse"}, parse["hits"] + parse["disk_hits"]),
+            ({"cache": "decision"}, decisions["hits"]),
+            ({"cache": "template"}, templates["hits"]),
+        ]),
+        ("lexsy_cache_misses_total", "counter", "Cache lookups that had to compute or load the value.", [
+            ({"cache": "parse"}, parse["misses"]),
+            ({"cache": "decision"}, decisions["misses"]),
+            ({"cache": "template"}, templates["loads"]),
+        ]),
+        ("lexsy_cache_entries", "gauge", "Entries currently held in memory.", [
+            ({"cache": "parse"}, parse["entries"]),
+            ({"cache": "decision"}, decisions["entries"]),
+            ({"cache": "template"}, templates["cached"]),
+            ({"cache": "session"}, sessions["sessions"]),
+        ]),
+        ("lexsy_openai_circuit_open", "gauge", "API keys whose OpenAI circuit breaker is open (or probing).", [
+            ({}, openai_guard.open_breakers()),
+        ]),
+        ("lexsy_pool_pending", "gauge", "Jobs submitted to a worker pool and not finished yet.", [
+            ({"pool": pool.removesuffix("_pending")}, n) for pool, n in pools.stats().items()
+        ]),
+    ]
+
+
+metrics.register_collector(_collect_state)
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def prometheus_metrics():
+    """Prometheus text exposition of this worker's latency histograms and cache counters."""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+def _require_profiling():
+    if not PROFILING_ENABLED:
+        raise HTTPException(status_code=404, detail="Profiling is disabled (set PROFILING_ENABLED=1)")
+
+
+@app.get("/profiles")
+async def list_profiles():
+    _require_profiling()
+    return {"profiles": await pools.run_io(profile_store.list)}
+
+
+@app.get("/profiles/{profile_id}")
+async def get_profile(profile_id: str, format: str = "json"):
+    """Saved profile summary (`json`) or its stacks in collapsed form (`collapsed`, for flame graph tools)."""
+    _require_profiling()
+    if format not in ("json", "collapsed"):
+        raise HTTPException(status_code=400, detail="format must be 'json' or 'collapsed'")
+    data = await pools.run_io(profile_store.load, profile_id, format)
+    if data is None:
+        raise HTTPException(status_code=404, detail="Unknown profile")
+    if format == "collapsed":
+        return Response(
+            data,
+            media_type="text/plain; charset=utf-8",
+            headers={"Content-Disposition": f'attachment; filename="{profile_id}.collapsed"'},
+        )
+    return Response(data, media_type="application/json")
+
+
+async def _get_template(template_id: str, version: int | None = None):
+    try:
+        return await pools.run_io(template_registry.get, template_id, version)
+    except TemplateNotFoundError:
+        raise HTTPException(status_code=404, detail=f"Unknown template {template_id!r}")
+
+
+@app.post("/templates")
+async def register_template(file: UploadFile = File(...), template_id: str | None = Form(None)):
+    """Parse and compile a template once; re-registering an existing template_id adds a version."""
+    template_id = template_id or new_template_id()
+    if not TEMPLATE_ID_RE.match(template_id):
+        raise HTTPException(status_code=400, detail="template_id must be 1-64 letters, digits, '-' or '_'")
+    content, digest = await _read_upload(file)
+    try:
+        result = await _parse_cached(content, digest=digest)
+        compiled = await pools.run_cpu(compile_template, template_id, content, result, file.filename)
+    except PoolSaturatedError:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Could not compile template: {e}")
+    meta = await pools.run_io(template_registry.add, compiled)
+    return {**meta, **result}
+
+
+@app.get("/templates")
+async def list_templates():
+    return {"templates": await pools.run_io(template_registry.list)}
+
+
+@app.get("/templates/{template_id}")
+async def get_template(template_id: str, version: int | None = None):
+    template = await _get_template(template_id, version)
+    return {**template.meta(), **template.parse_result}
+
+
+@app.delete("/templates/{template_id}")
+async def delete_template(template_id: str, version: int | None = None):
+    """Evict one version of a template, or all of them."""
+    try:
+        deleted = await pools.run_io(template_registry.delete, template_id, version)
+    except TemplateNotFoundError:
+        deleted = False
+    if not deleted:
+        raise HTTPException(status_code=404, detail=f"Unknown template {template_id!r}")
+    return {"deleted": template_id, "version": version}
 
 
 @app.post("/fill_doc")
-async def fill_doc(file: UploadFile = File(...), responses: str = Form(...)):
-    print("📨 Received /fill_doc request")
+async def fill_doc(
+    file: UploadFile | None = File(None),
+    responses: str = Form(...),
+    doc_id: str | None = Form(None),
+    fill_engine: str | None = Form(None),
+    template_id: str | None = Form(None),
+    template_version: int | None = Form(None),
+):
+    """Fill either an uploaded template, one kept from /parse_doc (`doc_id`) or a registered one.
+
+    `fill_engine` picks the python-docx ("docx") or raw-XML ("xml") engine. Values whose
+    occurrence position is known (from the doc_id's parse result or an item's `pos`)
+    are written straight to that position instead. A `template_id` fill only applies
+    the values to the compiled template (latest version unless `template_version`).
+    """
+    if fill_engine and fill_engine not in FILL_ENGINES:
+        raise HTTPException(status_code=400, detail=f"fill_engine must be one of {FILL_ENGINES}")
+    template = None
+    if template_id:
+        template = await _get_template(template_id, template_version)
+    elif doc_id:
+        session = doc_sessions.get(doc_id)
+        if session is None:
+            raise HTTPException(status_code=404, detail="Document session expired. Please upload the file again.")
+        content = session.content
+        positions = {o["id"]: o["pos"] for o in session.parse_result["occurrences"] if "pos" in o}
+    elif file is not None:
+        content, _ = await _read_upload(file)
+        positions = None
+    else:
+        raise HTTPException(status_code=400, detail="Provide a file, a doc_id or a template_id")
+
     try:
         if not responses:
             raise ValueError("No responses data received")
@@ -41,19 +417,98 @@ async def fill_doc(file: UploadFile = File(...), responses: str = Form(...)):
             data = json.loads(responses)
         except Exception:
             data = literal_eval(responses)
-        content = await file.read()
         # data can be either list (ordered) or dict (legacy)
-        output_path = fill_placeholders(content, data)
-        return FileResponse(
-            output_path,
-            filename="completed_document.docx",
-            media_type="application/vnd.openxmlformats-officedocument.wordprocessingml.document",
-        )
+        if template is not None:
+            # Only byte joins and deflate (which releases the GIL): no need to ship the plan to a process
+            timings = StageTimings()
+            filled = await pools.run_io(template.fill, data, timings)
+        else:
+            filled, timings = await pools.run_cpu(fill_placeholders_timed, content, data, fill_engine, positions)
+        FILL_STAGE_SECONDS.observe_stages(timings, engine=timings.labels.get("engine", "unknown"))
+        return _docx_response(filled)
+    except PoolSaturatedError:
+        raise
     except Exception as e:
-        print("❌ Error in /fill_doc:", e)
+        logger.exception("Error in /fill_doc")
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.post("/merge_doc")
+async def merge_doc(
+    rows: UploadFile = File(...),
+    file: UploadFile | None = File(None),
+    doc_id: str | None = Form(None),
+    rows_format_name: str | None = Form(None, alias="rows_format"),
+    fill_engine: str | None = Form(None),
+    name_field: str | None = Form(None),
+    template_id: str | None = Form(None),
+    template_version: int | None = Form(None),
+):
+    """Mail merge: fill one template (`doc_id`, upload or `template_id`) once per row of a JSONL or CSV file.
+
+    The template is parsed once; the fills run on the process pool and the response is
+    a zip streamed as documents complete, ending with a per-row `report.jsonl`.
+    `name_field` names each document after that column/key of its row.
+    """
+    if fill_engine and fill_engine not in FILL_ENGINES:
+        raise HTTPException(status_code=400, detail=f"fill_engine must be one of {FILL_ENGINES}")
+    fmt = rows_format_name or rows_format(rows.filename)
+    if fmt not in ROW_FORMATS:
+        raise HTTPException(status_code=400, detail=f"rows_format must be one of {ROW_FORMATS}")
+    template = None
+    if template_id:
+        template = await _get_template(template_id, template_version)
+        content, parse_result = template.source, template.parse_result
+    elif doc_id:
+        session = doc_sessions.get(doc_id)
+        if session is None:
+            raise HTTPException(status_code=404, detail="Document session expired. Please upload the file again.")
+        content, parse_result = session.content, session.parse_result
+    elif file is not None:
+        content, digest = await _read_upload(file)
+        try:
+            parse_result = await _parse_cached(content, digest=digest)
+        except PoolSaturatedError:
+            raise
+        except Exception as e:
+            raise HTTPException(status_code=400, detail=f"Could not read template: {e}")
+    else:
+        raise HTTPException(status_code=400, detail="Provide a file, a doc_id or a template_id")
+
+    try:
+        row_bytes, _ = await _read_upload(rows, docx=False)
+        row_text = row_bytes.decode("utf-8-sig")
+    except UnicodeDecodeError:
+        raise HTTPException(status_code=400, detail="Rows file must be UTF-8")
+    return StreamingResponse(
+        merge_documents(content, parse_result, iter_rows(row_text, fmt), fill_engine, name_field, template),
+        media_type="application/zip",
+        headers={"Content-Disposition": 'attachment; filename="merged_documents.zip"'},
+    )
+
+
+def _resolve_api_key(authorization: str | None) -> str:
+    """Return the user's key from `Authorization: Bearer <key>` or the server default."""
+    user_key = None
+    if authorization and authorization.startswith("Bearer "):
+        user_key = authorization.split(" ")[1].strip()
+
+    api_key = user_key or os.getenv("OPENAI_API_KEY")
+    if not api_key:
+        raise HTTPException(status_code=401, detail="❌ No OpenAI API key provided.")
+    return api_key
+
+
+def _load_json_field(name: str, raw: str | None, default):
+    """Decode a JSON-encoded form field, raising a 400 on malformed input."""
+    if not raw:
+        return default
+    try:
+        return json.loads(raw)
+    except json.JSONDecodeError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid JSON in '{name}': {e}")
+
+
 @app.post("/chat_fill")
 async def chat_fill(
     placeholder: str = Form(...),
@@ -69,18 +524,10 @@ async def chat_fill(
     or falls back to the server default key.
     """
     try:
-        # Extract user API key from Authorization: Bearer <key>
-        user_key = None
-        if authorization and authorization.startswith("Bearer "):
-            user_key = authorization.split(" ")[1].strip()
-
-        # Validate API key source
-        api_key = user_key or os.getenv("OPENAI_API_KEY")
-        if not api_key:
-            raise HTTPException(status_code=401, detail="❌ No OpenAI API key provided.")
+        api_key = _resolve_api_key(authorization)
 
         # Call conversation handler with explicit key
-        result = handle_conversational_turn(
+        result = await handle_conversational_turn_async(
             placeholder_label=placeholder,
             occurrence_context=context,
             user_input=user_input,
@@ -90,7 +537,155 @@ async def chat_fill(
         )
         return result
 
-    except HTTPException:
+    except (HTTPException, UpstreamError):
         raise
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.post("/chat_fill_stream")
+async def chat_fill_stream(
+    placeholder: str = Form(...),
+    context: str = Form(...),
+    user_input: str = Form(""),
+    previous_global_value: str | None = Form(None),
+    prior_occurrence_value: str | None = Form(None),
+    authorization: str | None = Header(default=None),
+):
+    """
+    `/chat_fill` as server-sent events, so the UI can react at time-to-first-token.
+
+    Events: `token` (raw model output), `action` (as soon as it is known),
+    `question` (followup_question deltas) and `final` (the validated decision,
+    same shape as the `/chat_fill` response).
+    """
+    api_key = _resolve_api_key(authorization)
+
+    async def events():
+        async for event, data in stream_conversational_turn(
+            placeholder_label=placeholder,
+            occurrence_context=context,
+            user_input=user_input,
+            previous_global_value=previous_global_value,
+            prior_occurrence_value=prior_occurrence_value,
+            api_key=api_key,
+        ):
+            yield f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        # Keep proxies from buffering the stream
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.post("/chat_fill_batch")
+async def chat_fill_batch(
+    occurrences: str = Form(...),
+    context_map: str = Form(...),
+    user_inputs: str | None = Form(None),
+    responses_global: str | None = Form(None),
+    responses_occurrence: str | None = Form(None),
+    concurrency: int | None = Form(None),
+    authorization: str | None = Header(default=None),
+):
+    """
+    Resolve every occurrence of a document in one request.
+
+    Takes the `occurrences` / `context_map` returned by /parse_doc (JSON-encoded)
+    and runs one conversational turn per occurrence, at most `concurrency` at a time.
+    Occurrences sharing a label are chained: the first one (in document order) is
+    resolved alone, then the remaining ones run concurrently with the value it
+    yielded, if any, as `previous_global_value`.
+    Results are returned in the same order as `occurrences`.
+    """
+    api_key = _resolve_api_key(authorization)
+
+    occs = _load_json_field("occurrences", occurrences, [])
+    contexts = _load_json_field("context_map", context_map, {})
+    inputs = _load_json_field("user_inputs", user_inputs, {})
+    globals_in = _load_json_field("responses_global", responses_global, {})
+    prior_values = _load_json_field("responses_occurrence", responses_occurrence, {})
+    if not isinstance(occs, list):
+        raise HTTPException(status_code=400, detail="'occurrences' must be a list")
+    for i, occ in enumerate(occs):
+        if not isinstance(occ, dict) or "id" not in occ or not isinstance(occ.get("label"), str):
+            raise HTTPException(
+                status_code=400, detail=f"occurrences[{i}] must be an object with an 'id' and a string 'label'"
+            )
+    for name, value in (
+        ("context_map", contexts),
+        ("user_inputs", inputs),
+        ("responses_global", globals_in),
+        ("responses_occurrence", prior_values),
+    ):
+        if not isinstance(value, dict):
+            raise HTTPException(status_code=400, detail=f"'{name}' must be an object")
+
+    limit = min(concurrency or CHAT_FILL_BATCH_CONCURRENCY, CHAT_FILL_BATCH_CONCURRENCY)
+    semaphore = asyncio.Semaphore(max(1, limit))
+
+    async def run_turn(occ: dict, prev_global: str) -> dict:
+        occ_id = str(occ["id"])
+        async with semaphore:
+            try:
+                result = await handle_conversational_turn_async(
+                    placeholder_label=occ["label"].upper(),
+                    occurrence_context=contexts.get(occ_id, ""),
+                    user_input=inputs.get(occ_id, ""),
+                    previous_global_value=prev_global,
+                    prior_occurrence_value=prior_values.get(occ_id, ""),
+                    api_key=api_key,
+                )
+            except Exception as e:
+                result = {
+                    "action": "ask",
+                    "filled_value": "",
+                    "followup_question": f"Sorry, I hit an error. Please provide this value: {occ['label']}",
+                    "confidence": 0.0,
+                    "error": str(e),
+                }
+                if isinstance(e, UpstreamError):
+                    result["error_status"] = e.status_code
+        return {"id": occ_id, "label": occ["label"], "previous_global_value": prev_global, **result}
+
+    def resolved_value(occ_id: str, result: dict, prev_global: str) -> str:
+        """Value this turn contributes to the label's global value (frontend semantics)."""
+        filled = (result.get("filled_value") or "").strip()
+        if result.get("action") == "fill" and filled:
+            return filled
+        if result.get("action") == "reuse" and prev_global:
+            return prev_global
+        return (inputs.get(occ_id) or "").strip()
+
+    # Group by label, keeping document order inside each group
+    by_label: dict[str, list[dict]] = {}
+    for occ in occs:
+        by_label.setdefault(occ["label"].upper(), []).append(occ)
+
+    final_globals = {k.upper(): v for k, v in globals_in.items() if v}
+
+    async def resolve_label(label: str, label_occs: list[dict]) -> list[dict]:
+        global_value = final_globals.get(label, "")
+        results = []
+        pending = list(label_occs)
+        # Without a known value, the first occurrence goes alone so the others can reuse what it
+        # resolves to; whatever it returns (often "ask" on a first pass), the rest then fan out
+        if not global_value:
+            occ = pending.pop(0)
+            result = await run_turn(occ, "")
+            results.append(result)
+            global_value = resolved_value(str(occ["id"]), result, "")
+        if global_value:
+            final_globals[label] = global_value
+        results.extend(await asyncio.gather(*(run_turn(occ, global_value) for occ in pending)))
+        return results
+
+    grouped = await asyncio.gather(*(resolve_label(l, o) for l, o in by_label.items()))
+    by_id = {r["id"]: r for group in grouped for r in group}
+
+    return {
+        "results": [by_id[str(occ["id"])] for occ in occs],
+        "responses_global": final_globals,
+    }
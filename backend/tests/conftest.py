@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Tests import the backend's modules as `utils.*`, like main.py does: make that work from any cwd
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
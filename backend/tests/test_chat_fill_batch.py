@@ -0,0 +1,58 @@
+import asyncio
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+
+AUTH = {"Authorization": "Bearer sk-test"}
+
+
+@pytest.fixture
+def turns(monkeypatch):
+    """Replace the LLM turn with one that always asks, recording peak concurrency."""
+    state = {"running": 0, "peak": 0, "calls": []}
+
+    async def fake_turn(placeholder_label, occurrence_context, user_input="", previous_global_value=None,
+                        prior_occurrence_value=None, api_key=None):
+        state["running"] += 1
+        state["peak"] = max(state["peak"], state["running"])
+        state["calls"].append(previous_global_value)
+        await asyncio.sleep(0.02)
+        state["running"] -= 1
+        return {"action": "ask", "filled_value": "", "followup_question": "?", "confidence": 0.0}
+
+    monkeypatch.setattr(main, "handle_conversational_turn_async", fake_turn)
+    return state
+
+
+def _batch(occs, **fields):
+    client = TestClient(main.app)
+    data = {"occurrences": json.dumps(occs), "context_map": "{}", **fields}
+    return client.post("/chat_fill_batch", data=data, headers=AUTH)
+
+
+def test_unresolved_label_fans_out_after_first_turn(turns):
+    occs = [{"id": str(i), "label": "$[__________]"} for i in range(12)]
+    res = _batch(occs)
+    assert res.status_code == 200
+    assert [r["id"] for r in res.json()["results"]] == [o["id"] for o in occs]
+    # First occurrence alone, then the other 11 together (up to the concurrency limit)
+    assert turns["peak"] == min(11, main.CHAT_FILL_BATCH_CONCURRENCY)
+
+
+@pytest.mark.parametrize("occs", [
+    [{"id": "0"}],
+    ["not an object"],
+    [{"id": "0", "label": 7}],
+])
+def test_malformed_occurrences_are_rejected(turns, occs):
+    res = _batch(occs)
+    assert res.status_code == 400
+    assert turns["calls"] == []
+
+
+def test_non_object_maps_are_rejected(turns):
+    res = _batch([{"id": "0", "label": "NAME"}], user_inputs="[]")
+    assert res.status_code == 400
@@ -0,0 +1,68 @@
+import asyncio
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import pytest
+
+from utils.executors import _BoundedPool
+
+
+def _die():
+    os._exit(1)
+
+
+def _square(x):
+    return x * x
+
+
+def _process_pool() -> _BoundedPool:
+    return _BoundedPool(
+        "cpu", lambda: ProcessPoolExecutor(max_workers=2, mp_context=multiprocessing.get_context("fork")), 8
+    )
+
+
+def test_broken_process_pool_is_replaced():
+    pool = _process_pool()
+
+    async def scenario():
+        with pytest.raises(BrokenProcessPool):
+            await pool.run(_die)
+        # Later jobs get a new pool instead of failing until the process restarts
+        assert await pool.run(_square, 3) == 9
+        assert await pool.run(pow, 2, 3) == 8
+
+    try:
+        asyncio.run(scenario())
+        assert pool.pending == 0
+    finally:
+        pool.shutdown()
+
+
+def test_cancelled_request_keeps_counting_its_running_job():
+    release = threading.Event()
+    pool = _BoundedPool("io", lambda: ThreadPoolExecutor(max_workers=1), 1)
+
+    async def scenario():
+        task = asyncio.create_task(pool.run(release.wait))
+        await asyncio.sleep(0.05)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        # The job is still running in the pool, so it still takes the only slot
+        assert pool.pending == 1
+        release.set()
+        for _ in range(100):
+            if pool.pending == 0:
+                break
+            await asyncio.sleep(0.01)
+        assert pool.pending == 0
+        assert await pool.run(pow, 2, 3) == 8
+
+    try:
+        asyncio.run(scenario())
+    finally:
+        release.set()
+        pool.shutdown()
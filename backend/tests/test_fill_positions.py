@@ -0,0 +1,53 @@
+import io
+import json
+import zipfile
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from benchmarks.docgen import DocSpec, make_docx
+from utils.filler import fill_placeholders
+from utils.parser import extract_placeholders
+
+
+@pytest.fixture(scope="module")
+def template():
+    data = make_docx(DocSpec(paragraphs=5, density=0.5, seed=1))[0]
+    return data, extract_placeholders(data)["occurrences"]
+
+
+def _text(docx: bytes) -> str:
+    # Raw XML of every part: placeholders also sit in tables, headers and footers
+    with zipfile.ZipFile(io.BytesIO(docx)) as zf:
+        return "".join(zf.read(n).decode("utf-8") for n in zf.namelist() if n.endswith(".xml"))
+
+
+def _responses(occs, pos):
+    return [{"id": o["id"], "label": o["label"], "value": f"VALUE-{i}", "pos": pos} for i, o in enumerate(occs)]
+
+
+@pytest.mark.parametrize("pos", [
+    {"part": "word/document.xml", "path": ["a"], "span": [0, 4]},
+    {"part": "word/document.xml", "path": [0], "span": "0:4"},
+    {"part": "word/document.xml", "path": [-1], "span": [0, 4]},
+    {"part": 3, "path": [0], "span": [0, 4]},
+    {"path": [0]},
+    "word/document.xml",
+])
+def test_malformed_client_positions_fall_back_to_scanning(template, pos):
+    data, occs = template
+    filled = fill_placeholders(data, _responses(occs, pos))
+    text = _text(filled)
+    assert all(f"VALUE-{i}" in text for i in range(len(occs)))
+
+
+def test_fill_doc_with_malformed_positions_succeeds(template):
+    data, occs = template
+    res = TestClient(main.app).post(
+        "/fill_doc",
+        files={"file": ("t.docx", data)},
+        data={"responses": json.dumps(_responses(occs, {"part": "word/document.xml", "path": ["x"], "span": [0, 1]}))},
+    )
+    assert res.status_code == 200
+    assert "VALUE-0" in _text(res.content)
@@ -0,0 +1,136 @@
+import asyncio
+import time
+
+import httpx
+import openai
+import pytest
+
+from utils import resilience
+from utils.resilience import CircuitOpenError, OpenAIGuard, UpstreamError
+
+
+def _server_error():
+    request = httpx.Request("POST", "https://api.openai.test/v1/chat/completions")
+    return openai.InternalServerError("boom", response=httpx.Response(500, request=request), body=None)
+
+
+class _Upstream:
+    """Stand-in for client.chat.completions.create: fails the first `failures` calls."""
+
+    def __init__(self, failures: int = 0):
+        self.failures = failures
+        self.calls = 0
+
+    async def __call__(self):
+        self.calls += 1
+        if self.calls <= self.failures:
+            raise _server_error()
+        return "ok"
+
+
+@pytest.fixture(autouse=True)
+def _fast_retries(monkeypatch):
+    monkeypatch.setattr(resilience, "OPENAI_RETRY_BASE_SECONDS", 0.0)
+    monkeypatch.setattr(resilience, "OPENAI_MAX_RETRIES", 2)
+
+
+def _guard(**kwargs) -> OpenAIGuard:
+    guard = OpenAIGuard(breaker_failures=1, breaker_reset_seconds=0.05, **kwargs)
+    guard.limiter.rate = 0
+    return guard
+
+
+def test_failed_half_open_probe_reopens_and_later_call_succeeds():
+    guard = _guard()
+    # The first call's 3 attempts fail and open the breaker; the 4th failure hits the probe
+    upstream = _Upstream(failures=4)
+
+    async def scenario():
+        with pytest.raises(UpstreamError):
+            await guard.call("sk-a", upstream)
+        with pytest.raises(CircuitOpenError):
+            await guard.call("sk-a", upstream)
+        time.sleep(0.06)
+        # Half-open probe fails once: not retried, the breaker re-opens
+        calls = upstream.calls
+        with pytest.raises(UpstreamError):
+            await guard.call("sk-a", upstream)
+        assert upstream.calls == calls + 1
+        assert guard.breaker("sk-a").state == "open"
+        time.sleep(0.06)
+        # Upstream is healthy again: the next probe closes the breaker
+        assert await guard.call("sk-a", upstream) == "ok"
+        assert guard.breaker("sk-a").state == "closed"
+        assert await guard.call("sk-a", upstream) == "ok"
+
+    asyncio.run(scenario())
+
+
+def test_probe_without_upstream_verdict_releases_half_open():
+    guard = _guard()
+
+    async def bad_request():
+        raise ValueError("bad request")
+
+    async def scenario():
+        with pytest.raises(UpstreamError):
+            await guard.call("sk-a", _Upstream(failures=10))
+        time.sleep(0.06)
+        with pytest.raises(ValueError):
+            await guard.call("sk-a", bad_request)
+        assert await guard.call("sk-a", _Upstream()) == "ok"
+
+    asyncio.run(scenario())
+
+
+def test_breaker_is_per_api_key():
+    guard = _guard()
+
+    async def scenario():
+        with pytest.raises(UpstreamError):
+            await guard.call("sk-exhausted", _Upstream(failures=10))
+        with pytest.raises(CircuitOpenError):
+            await guard.call("sk-exhausted", _Upstream())
+        assert await guard.call("sk-other", _Upstream()) == "ok"
+        assert guard.open_breakers() == 1
+
+    asyncio.run(scenario())
+
+
+def test_expired_breaker_without_probe_is_not_counted_open():
+    guard = _guard()
+
+    async def scenario():
+        with pytest.raises(UpstreamError):
+            await guard.call("sk-idle", _Upstream(failures=10))
+        assert guard.open_breakers() == 1
+        time.sleep(0.06)
+        # Nobody calls with this key again: no probe, but the breaker no longer counts as open
+        assert guard.open_breakers() == 0
+
+    asyncio.run(scenario())
+
+
+def test_identical_turns_coalesce_per_api_key(monkeypatch):
+    from utils import conversation
+
+    calls = []
+
+    async def fake_llm_turn(key, placeholder_label, messages, api_key):
+        calls.append(api_key)
+        await asyncio.sleep(0.05)
+        return {"action": "ask", "filled_value": "", "followup_question": f"asked with {api_key}"}
+
+    monkeypatch.setattr(conversation, "_llm_turn", fake_llm_turn)
+    monkeypatch.setattr(conversation.decision_cache, "get", lambda key: None)
+
+    async def turn(api_key):
+        return await conversation.handle_conversational_turn_async("WIDGET", "ctx", api_key=api_key)
+
+    async def scenario():
+        return await asyncio.gather(turn("sk-a"), turn("sk-b"), turn("sk-a"))
+
+    replies = asyncio.run(scenario())
+    # Same key: one shared call; a different key never rides on it
+    assert sorted(calls) == ["sk-a", "sk-b"]
+    assert [r["followup_question"] for r in replies] == ["asked with sk-a", "asked with sk-b", "asked with sk-a"]
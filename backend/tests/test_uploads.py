@@ -0,0 +1,56 @@
+import io
+import zipfile
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from benchmarks.docgen import DocSpec, make_docx
+from utils.parse_cache import content_digest
+from utils.uploads import UploadRejectedError, read_upload
+
+
+def _zip(members: dict) -> bytes:
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w", zipfile.ZIP_DEFLATED) as zf:
+        for name, data in members.items():
+            zf.writestr(name, data)
+    return buf.getvalue()
+
+
+@pytest.fixture(scope="module")
+def docx() -> bytes:
+    return make_docx(DocSpec(paragraphs=5, density=0.5, seed=1))[0]
+
+
+def test_read_upload_hashes_while_reading(docx):
+    content, digest = read_upload(io.BytesIO(docx))
+    assert content == docx
+    assert digest == content_digest(docx)
+
+
+@pytest.mark.parametrize("data", [
+    b"not a zip",
+    _zip({"hello.txt": "not a docx"}),
+    _zip({"[Content_Types].xml": "<Types/>", "_rels/.rels": "<broken"}),
+])
+def test_non_docx_is_rejected(data):
+    with pytest.raises(UploadRejectedError) as exc:
+        read_upload(io.BytesIO(data))
+    assert exc.value.status_code == 400
+
+
+def test_zip_bomb_is_rejected_from_the_central_directory():
+    bomb = _zip({"word/document.xml": "<w/>", "word/media/image1.png": b"\0" * (8 << 20)})
+    with pytest.raises(UploadRejectedError) as exc:
+        read_upload(io.BytesIO(bomb))
+    assert (exc.value.status_code, exc.value.reason) == (413, "compression_ratio")
+
+
+@pytest.mark.parametrize("data", [
+    _zip({"hello.txt": "not a docx"}),
+    _zip({"word/document.xml": "<w:document><unclosed"}),
+])
+def test_parse_doc_answers_400_for_unreadable_documents(data):
+    res = TestClient(main.app).post("/parse_doc", files={"file": ("x.docx", data)})
+    assert res.status_code == 400
@@ -0,0 +1,121 @@
+# utils/clients.py
+import asyncio
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import httpx
+from openai import AsyncOpenAI
+
+# Bounded LRU of long-lived AsyncOpenAI clients, one per API key.
+# Keys are never stored in clear: entries are indexed by a SHA-256 of the key.
+OPENAI_CLIENT_CACHE_SIZE = int(os.getenv("OPENAI_CLIENT_CACHE_SIZE", "64"))
+OPENAI_CLIENT_IDLE_SECONDS = float(os.getenv("OPENAI_CLIENT_IDLE_SECONDS", "900"))
+OPENAI_MAX_CONNECTIONS = int(os.getenv("OPENAI_MAX_CONNECTIONS", "20"))
+OPENAI_MAX_KEEPALIVE = int(os.getenv("OPENAI_MAX_KEEPALIVE", "10"))
+OPENAI_KEEPALIVE_EXPIRY = float(os.getenv("OPENAI_KEEPALIVE_EXPIRY", "60"))
+OPENAI_TIMEOUT_SECONDS = float(os.getenv("OPENAI_TIMEOUT_SECONDS", "60"))
+
+
+def hash_api_key(api_key: str | None) -> str:
+    return hashlib.sha256((api_key or "").encode("utf-8")).hexdigest()
+
+
+class AsyncClientCache:
+    """LRU cache of AsyncOpenAI clients with idle eviction.
+
+    Each client owns an httpx connection pool with keep-alive, so repeated
+    turns for the same key reuse warm TLS connections instead of paying a
+    handshake per placeholder. Clients are bound to the event loop that created
+    them; a lookup from a different loop transparently replaces the entry.
+    """
+
+    def __init__(self, max_size: int = OPENAI_CLIENT_CACHE_SIZE, idle_seconds: float = OPENAI_CLIENT_IDLE_SECONDS):
+        self.max_size = max(1, max_size)
+        self.idle_seconds = idle_seconds
+        self._entries: "OrderedDict[str, tuple[AsyncOpenAI, asyncio.AbstractEventLoop, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _new_client(self, api_key: str) -> AsyncOpenAI:
+        http_client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=OPENAI_MAX_CONNECTIONS,
+                max_keepalive_connections=OPENAI_MAX_KEEPALIVE,
+                keepalive_expiry=OPENAI_KEEPALIVE_EXPIRY,
+            ),
+            timeout=OPENAI_TIMEOUT_SECONDS,
+        )
+        return AsyncOpenAI(
+            api_key=api_key,
+            base_url=os.getenv("OPENAI_BASE_URL") or None,
+            http_client=http_client,
+            # Retries are done by utils/resilience.py (backoff, rate limit, circuit breaker)
+            max_retries=0,
+        )
+
+    def get(self, api_key: str) -> AsyncOpenAI:
+        """Return the cached client for `api_key`, creating it if needed. Must run inside a loop."""
+        loop = asyncio.get_running_loop()
+        key = hash_api_key(api_key)
+        now = time.monotonic()
+        evicted = []
+        with self._lock:
+            evicted.extend(self._expire(now))
+            entry = self._entries.pop(key, None)
+            if entry and entry[1] is not loop:
+                evicted.append(entry)
+                entry = None
+            client = entry[0] if entry else self._new_client(api_key)
+            self._entries[key] = (client, loop, now)
+            while len(self._entries) > self.max_size:
+                evicted.append(self._entries.popitem(last=False)[1])
+        for old in evicted:
+            self._close_later(old)
+        return client
+
+    def _expire(self, now: float) -> list:
+        """Pop entries idle for longer than `idle_seconds` (oldest first). Caller holds the lock."""
+        expired = []
+        while self._entries:
+            key, entry = next(iter(self._entries.items()))
+            if now - entry[2] < self.idle_seconds:
+                break
+            expired.append(self._entries.pop(key))
+        return expired
+
+    @staticmethod
+    def _close_later(entry) -> None:
+        """Close an evicted client on its own loop; clients of a dead loop are left to GC."""
+        client, loop, _ = entry
+        try:
+            current = asyncio.get_running_loop()
+        except RuntimeError:
+            current = None
+        if loop is current:
+            loop.create_task(client.close())
+        elif loop.is_running():
+            asyncio.run_coroutine_threadsafe(client.close(), loop)
+
+    async def aclose(self) -> None:
+        """Close every client owned by the running loop (call on app shutdown)."""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            entries = list(self._entries.items())
+            self._entries.clear()
+        for _, (client, owner, _) in entries:
+            if owner is loop:
+                await client.close()
+            else:
+                self._close_later((client, owner, 0.0))
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+client_cache = AsyncClientCache()
+
+
+def get_async_client(api_key: str | None) -> AsyncOpenAI:
+    return client_cache.get(api_key or os.getenv("OPENAI_API_KEY", ""))
@@ -0,0 +1,143 @@
+# utils/context.py
+import os
+import re
+from bisect import bisect_right
+from typing import List, Sequence, Tuple
+
+from utils.placeholders import MONEY_LABEL
+from utils.tokens import count_tokens
+
+# "budget": whole sentences around each occurrence up to CONTEXT_TOKEN_BUDGET tokens, target marked
+# inline, overlapping windows of the same label merged into one shared context.
+# "words": the previous fixed window of context_window_words words either side.
+CONTEXT_MODES = ("budget", "words")
+DEFAULT_CONTEXT_MODE = os.getenv("CONTEXT_MODE", "budget")
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "120"))
+# Overlapping same-label windows are merged while the merged window stays within this multiple of the budget
+CONTEXT_MERGE_RATIO = float(os.getenv("CONTEXT_MERGE_RATIO", "1.5"))
+
+# Catch-all labels shared by unrelated fields (every $[...] amount, underscore blanks): never merged
+UNMERGED_LABELS = frozenset({MONEY_LABEL, "_____________"})
+
+# Marks the occurrence(s) being filled inside the context (described in the system prompt)
+TARGET_OPEN, TARGET_CLOSE = "⟦", "⟧"
+
+# Sentence ends (". ", "? ", "! ") and paragraph breaks
+_BOUNDARY_RE = re.compile(r"\n+|(?<=[.!?])\s+")
+_WORD_RE = re.compile(r"\S+")
+
+
+def _sentence_units(text: str) -> List[Tuple[int, int]]:
+    units = []
+    start = 0
+    for m in _BOUNDARY_RE.finditer(text):
+        if m.start() > start:
+            units.append((start, m.start()))
+        start = m.end()
+    if start < len(text):
+        units.append((start, len(text)))
+    return units
+
+
+def _word_window(text: str, lo: int, hi: int, s: int, e: int, budget: int) -> Tuple[int, int]:
+    """Words around (s, e) inside [lo, hi) up to `budget` tokens, for a sentence longer than the budget."""
+    words = [(m.start(), m.end()) for m in _WORD_RE.finditer(text, lo, hi)]
+    first = next(k for k, (_, we) in enumerate(words) if we > s)
+    last = max(k for k, (ws, _) in enumerate(words) if ws < e)
+    used = count_tokens(text[words[first][0]:words[last][1]])
+    left, right = first, last
+    grow_left, grow_right = True, True
+    while grow_left or grow_right:
+        if grow_left:
+            cost = count_tokens(" " + text[words[left - 1][0]:words[left - 1][1]]) if left > 0 else None
+            if cost is not None and used + cost <= budget:
+                left -= 1
+                used += cost
+            else:
+                grow_left = False
+        if grow_right:
+            cost = count_tokens(" " + text[words[right + 1][0]:words[right + 1][1]]) if right + 1 < len(words) else None
+            if cost is not None and used + cost <= budget:
+                right += 1
+                used += cost
+            else:
+                grow_right = False
+    return words[left][0], words[right][1]
+
+
+def _render(text: str, start: int, end: int, targets: Sequence[Tuple[int, int]]) -> str:
+    out = text[start:end]
+    # Right to left so earlier offsets stay valid
+    for s, e in sorted(targets, reverse=True):
+        s, e = s - start, e - start
+        out = out[:s] + TARGET_OPEN + out[s:e] + TARGET_CLOSE + out[e:]
+    return out.strip()
+
+
+def build_context_windows(
+    text: str,
+    spans: Sequence[Tuple[int, int]],
+    labels: Sequence[str],
+    token_budget: int = CONTEXT_TOKEN_BUDGET,
+) -> List[str]:
+    """One context per (start, end) span of `text`, built to `token_budget` tokens.
+
+    A window starts as the sentence(s) holding the span and grows by whole sentences,
+    alternately before and after, while it fits the budget; a single sentence longer
+    than the budget is cut to the words around the span instead. Windows of the same
+    label that overlap (placeholders close together, e.g. signature blocks) are merged
+    into one context marking every occurrence in it, so those turns send the same
+    prompt (and hit the decision cache) rather than near-identical copies. Catch-all
+    labels (UNMERGED_LABELS) name unrelated fields and keep one window per occurrence.
+    """
+    if not spans:
+        return []
+    units = _sentence_units(text)
+    starts = [u[0] for u in units]
+    unit_tokens = [count_tokens(text[a:b]) for a, b in units]
+
+    windows = []
+    for s, e in spans:
+        i = max(0, bisect_right(starts, s) - 1)
+        j = max(i, bisect_right(starts, e - 1) - 1)
+        used = sum(unit_tokens[i:j + 1])
+        if used > token_budget:
+            windows.append(_word_window(text, units[i][0], units[j][1], s, e, token_budget))
+            continue
+        grow_left, grow_right = True, True
+        while grow_left or grow_right:
+            if grow_left:
+                if i > 0 and used + unit_tokens[i - 1] <= token_budget:
+                    i -= 1
+                    used += unit_tokens[i]
+                else:
+                    grow_left = False
+            if grow_right:
+                if j + 1 < len(units) and used + unit_tokens[j + 1] <= token_budget:
+                    j += 1
+                    used += unit_tokens[j]
+                else:
+                    grow_right = False
+        windows.append((units[i][0], units[j][1]))
+
+    by_label = {}
+    for idx, label in enumerate(labels):
+        by_label.setdefault(label, []).append(idx)
+    merge_limit = token_budget * CONTEXT_MERGE_RATIO
+    snippets = [""] * len(spans)
+    for label, members in by_label.items():
+        groups = []
+        for idx in sorted(members, key=lambda k: windows[k]):
+            ws, we = windows[idx]
+            if groups and ws < groups[-1][1] and label not in UNMERGED_LABELS:
+                gs, ge, group = groups[-1]
+                merged_end = max(ge, we)
+                if count_tokens(text[gs:merged_end]) <= merge_limit:
+                    groups[-1] = (gs, merged_end, group + [idx])
+                    continue
+            groups.append((ws, we, [idx]))
+        for gs, ge, group in groups:
+            snippet = _render(text, gs, ge, [spans[k] for k in group])
+            for k in group:
+                snippets[k] = snippet
+    return snippets
@@ -1,16 +1,24 @@
 # utils/conversation.py
-from openai import OpenAI
+from utils.clients import get_async_client, hash_api_key
+from utils.decision_cache import decision_cache, decision_key
+from utils.fast_path import classify_turn, turn_stats
+from utils.resilience import UpstreamError, openai_guard
+from utils.metrics import LLM_ERRORS, LLM_FIRST_TOKEN_SECONDS, LLM_REQUEST_SECONDS
+from typing import AsyncIterator
+import hashlib
 import json
-import os
+import re
+import time
 
-# Note: Global client is not used - each function call creates its own client with the provided api_key
+MODEL = "gpt-4o-mini"
+TEMPERATURE = 0.2
 
 SYSTEM_PROMPT = """
 You are a legal document assistant filling placeholders in uploaded contracts.
 
 INPUT YOU RECEIVE:
 - placeholder_label: the normalized label of this occurrence (e.g., "COMPANY NAME", "$[__________]", "DATE OF SAFE").
-- occurrence_context: ~80 words around this occurrence from the document.
+- occurrence_context: the sentences around this occurrence from the document. The occurrence you are filling is marked ⟦like this⟧. If several places are marked, the same placeholder appears more than once nearby; the other marks are context only, and your decision is for this placeholder.
 - previous_global_value: value already provided for the same label elsewhere (or empty).
 - prior_occurrence_value: value already provided for this exact occurrence (or empty).
 - user_input: the user's latest response (may be empty on the first turn).
@@ -37,17 +45,17 @@ OUTPUT STRICT JSON ONLY, e.g.:
 }
 """
 
-def handle_conversational_turn(
+# Part of every decision-cache key: changing the model, temperature or prompt invalidates old entries
+PROMPT_VERSION = hashlib.sha256(f"{MODEL}|{TEMPERATURE}|{SYSTEM_PROMPT.strip()}".encode("utf-8")).hexdigest()[:16]
+
+
+def _build_messages(
     placeholder_label: str,
     occurrence_context: str,
     user_input: str = "",
     previous_global_value: str | None = None,
     prior_occurrence_value: str | None = None,
-    api_key: str | None = None,
-):
-
-    client = OpenAI(api_key=api_key)
-
+) -> list[dict]:
     payload = {
         "placeholder_label": placeholder_label,
         "occurrence_context": occurrence_context,
@@ -55,39 +63,252 @@ def handle_conversational_turn(
         "prior_occurrence_value": prior_occurrence_value or "",
         "user_input": user_input or "",
     }
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT.strip()},
+        {"role": "user", "content": json.dumps(payload)}
+    ]
 
-    try:
-        resp = client.chat.completions.create(
-            model="gpt-4o-mini",
-            temperature=0.2,
-            messages=[
-                {"role": "system", "content": SYSTEM_PROMPT.strip()},
-                {"role": "user", "content": json.dumps(payload)}
-            ],
-        )
-        raw = resp.choices[0].message.content.strip()
-        # Try to parse strict JSON; fall back to asking if malformed
-        try:
-            data = json.loads(raw)
-        except json.JSONDecodeError:
-            data = {
-                "action": "ask",
-                "filled_value": "",
-                "followup_question": raw,
-                "confidence": 0.4
-            }
-
-        # Normalize keys
-        data.setdefault("action", "ask")
-        data.setdefault("filled_value", "")
-        data.setdefault("followup_question", "")
-        data.setdefault("confidence", 0.6)
-        return data
 
-    except Exception as e:
-        return {
+def _parse_reply(raw: str) -> tuple[dict, bool]:
+    """Return (decision, well_formed). Only well-formed replies are cacheable."""
+    raw = (raw or "").strip()
+    well_formed = True
+    # Try to parse strict JSON; fall back to asking if malformed
+    try:
+        data = json.loads(raw)
+        if not isinstance(data, dict):
+            raise json.JSONDecodeError("not an object", raw, 0)
+    except json.JSONDecodeError:
+        well_formed = False
+        data = {
             "action": "ask",
             "filled_value": "",
-            "followup_question": f"Sorry, I hit an error. Please provide this value: {placeholder_label}",
-            "confidence": 0.0
+            "followup_question": raw,
+            "confidence": 0.4
         }
+
+    # Normalize keys
+    data.setdefault("action", "ask")
+    data.setdefault("filled_value", "")
+    data.setdefault("followup_question", "")
+    data.setdefault("confidence", 0.6)
+    return data, well_formed
+
+
+def _cache_key(placeholder_label, occurrence_context, user_input, previous_global_value, prior_occurrence_value) -> str:
+    return decision_key(
+        placeholder_label, occurrence_context, user_input,
+        previous_global_value, prior_occurrence_value, PROMPT_VERSION,
+    )
+
+
+def _error_reply(placeholder_label: str) -> dict:
+    return {
+        "action": "ask",
+        "filled_value": "",
+        "followup_question": f"Sorry, I hit an error. Please provide this value: {placeholder_label}",
+        "confidence": 0.0
+    }
+
+
+def _record_llm_call(t0: float, data: dict | None, well_formed: bool = False, error: Exception | None = None) -> None:
+    """Observe one OpenAI round trip, labelled by the action it produced ("malformed"/"error" otherwise)."""
+    if error is not None:
+        LLM_ERRORS.inc(reason=type(error).__name__)
+        action = "error"
+    else:
+        action = data.get("action", "unknown") if well_formed else "malformed"
+    LLM_REQUEST_SECONDS.observe(time.perf_counter() - t0, action=action)
+
+
+async def handle_conversational_turn_async(
+    placeholder_label: str,
+    occurrence_context: str,
+    user_input: str = "",
+    previous_global_value: str | None = None,
+    prior_occurrence_value: str | None = None,
+    api_key: str | None = None,
+):
+    """One turn: fast path, then the decision cache, then a guarded call on a pooled AsyncOpenAI client."""
+    fast = classify_turn(placeholder_label, user_input, previous_global_value)
+    if fast is not None:
+        turn_stats.record("fast", fast[0])
+        return fast[1]
+
+    key = _cache_key(placeholder_label, occurrence_context, user_input, previous_global_value, prior_occurrence_value)
+    cached = decision_cache.get(key)
+    if cached is not None:
+        turn_stats.record("cache")
+        return cached
+    # Identical turns already waiting on OpenAI with the same API key share that call; other keys
+    # make their own, so nobody spends another user's quota or inherits their errors
+    flight_key = f"{hash_api_key(api_key)}:{key}"
+    turn_stats.record("coalesced" if openai_guard.coalescer.in_flight(flight_key) else "llm")
+    messages = _build_messages(
+        placeholder_label, occurrence_context, user_input, previous_global_value, prior_occurrence_value
+    )
+    data = await openai_guard.coalescer.run(flight_key, lambda: _llm_turn(key, placeholder_label, messages, api_key))
+    return dict(data)
+
+
+async def _llm_turn(key: str, placeholder_label: str, messages: list[dict], api_key: str | None) -> dict:
+    """One guarded OpenAI round trip. UpstreamError (rate limited, unavailable) is raised for the
+    caller to surface; any other failure becomes the generic "please provide this value" ask."""
+    client = get_async_client(api_key)
+    t0 = time.perf_counter()
+    try:
+        resp = await openai_guard.call(api_key, lambda: client.chat.completions.create(
+            model=MODEL,
+            temperature=TEMPERATURE,
+            messages=messages,
+        ))
+        data, well_formed = _parse_reply(resp.choices[0].message.content)
+        _record_llm_call(t0, data, well_formed)
+        if well_formed:
+            decision_cache.put(key, data)
+        return data
+
+    except UpstreamError as e:
+        _record_llm_call(t0, None, error=e)
+        raise
+    except Exception as e:
+        _record_llm_call(t0, None, error=e)
+        return _error_reply(placeholder_label)
+
+
+_ACTION_RE = re.compile(r'"action"\s*:\s*"(\w+)"')
+_QUESTION_RE = re.compile(r'"followup_question"\s*:\s*"')
+_JSON_ESCAPES = {'"': '"', "\\": "\\", "/": "/", "b": "\b", "f": "\f", "n": "\n", "r": "\r", "t": "\t"}
+
+
+class _DecisionStream:
+    """Reads `action` and the growing `followup_question` out of a JSON reply that is still arriving."""
+
+    def __init__(self):
+        self.text = ""
+        self.action = None
+        self._question_at = None  # next unread character of the followup_question string
+        self._question_done = False
+
+    def feed(self, delta: str) -> list[tuple[str, dict]]:
+        self.text += delta
+        events = []
+        if self.action is None:
+            m = _ACTION_RE.search(self.text)
+            if m:
+                self.action = m.group(1)
+                events.append(("action", {"action": self.action}))
+        if self._question_at is None:
+            m = _QUESTION_RE.search(self.text)
+            if m:
+                self._question_at = m.end()
+        if self._question_at is not None and not self._question_done:
+            piece = self._read_question()
+            if piece:
+                events.append(("question", {"delta": piece}))
+        return events
+
+    def _read_question(self) -> str:
+        # Decode the JSON string up to its closing quote, stopping before an escape that is still incomplete
+        text, i, out = self.text, self._question_at, []
+        while i < len(text):
+            c = text[i]
+            if c == '"':
+                self._question_done = True
+                i += 1
+                break
+            if c != "\\":
+                out.append(c)
+                i += 1
+                continue
+            if i + 1 >= len(text):
+                break
+            if text[i + 1] != "u":
+                out.append(_JSON_ESCAPES.get(text[i + 1], text[i + 1]))
+                i += 2
+                continue
+            if i + 6 > len(text):
+                break
+            code = int(text[i + 2:i + 6], 16)
+            if 0xD800 <= code < 0xDC00:
+                # Surrogate pair: wait for the low half
+                if i + 12 > len(text):
+                    break
+                code = 0x10000 + ((code - 0xD800) << 10) + (int(text[i + 8:i + 12], 16) - 0xDC00)
+                i += 6
+            out.append(chr(code))
+            i += 6
+        self._question_at = i
+        return "".join(out)
+
+
+async def stream_conversational_turn(
+    placeholder_label: str,
+    occurrence_context: str,
+    user_input: str = "",
+    previous_global_value: str | None = None,
+    prior_occurrence_value: str | None = None,
+    api_key: str | None = None,
+) -> AsyncIterator[tuple[str, dict]]:
+    """Streaming `handle_conversational_turn_async`: yields (event, data) as the reply arrives.
+
+    "token" relays each piece of model output, "action" is sent as soon as the decision
+    is known, "question" carries the followup_question incrementally, and "final" is the
+    validated decision, exactly what /chat_fill would return. When OpenAI is rate limited
+    or unavailable an "error" event ({status, detail, retry_after}) precedes "final".
+    """
+    fast = classify_turn(placeholder_label, user_input, previous_global_value)
+    if fast is not None:
+        turn_stats.record("fast", fast[0])
+        local = fast[1]
+    else:
+        key = _cache_key(placeholder_label, occurrence_context, user_input, previous_global_value, prior_occurrence_value)
+        local = decision_cache.get(key)
+        turn_stats.record("llm" if local is None else "cache")
+    if local is not None:
+        yield "action", {"action": local["action"]}
+        if local.get("followup_question"):
+            yield "question", {"delta": local["followup_question"]}
+        yield "final", local
+        return
+
+    client = get_async_client(api_key)
+    messages = _build_messages(
+        placeholder_label, occurrence_context, user_input, previous_global_value, prior_occurrence_value
+    )
+
+    reader = _DecisionStream()
+    t0 = time.perf_counter()
+    try:
+        # Rate limit, retries and breaker apply up to the first byte; a stream that breaks off is not retried
+        stream = await openai_guard.call(api_key, lambda: client.chat.completions.create(
+            model=MODEL,
+            temperature=TEMPERATURE,
+            messages=messages,
+            stream=True,
+        ))
+        async with stream:
+            async for chunk in stream:
+                delta = chunk.choices[0].delta.content if chunk.choices else None
+                if not delta:
+                    continue
+                if not reader.text:
+                    LLM_FIRST_TOKEN_SECONDS.observe(time.perf_counter() - t0)
+                yield "token", {"text": delta}
+                for event in reader.feed(delta):
+                    yield event
+    except UpstreamError as e:
+        _record_llm_call(t0, None, error=e)
+        yield "error", {"status": e.status_code, "detail": str(e), "retry_after": e.retry_after}
+        yield "final", _error_reply(placeholder_label)
+        return
+    except Exception as e:
+        _record_llm_call(t0, None, error=e)
+        yield "final", _error_reply(placeholder_label)
+        return
+
+    data, well_formed = _parse_reply(reader.text)
+    _record_llm_call(t0, data, well_formed)
+    if well_formed:
+        decision_cache.put(key, data)
+    yield "final", data
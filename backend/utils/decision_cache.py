@@ -0,0 +1,98 @@
+# utils/decision_cache.py
+import copy
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+# TTL + LRU cache of conversational-turn decisions. DECISION_CACHE_TTL_SECONDS=0 disables it.
+DECISION_CACHE_MAX_ENTRIES = int(os.getenv("DECISION_CACHE_MAX_ENTRIES", "4096"))
+DECISION_CACHE_TTL_SECONDS = float(os.getenv("DECISION_CACHE_TTL_SECONDS", "86400"))
+
+_WS_RE = re.compile(r"\s+")
+
+
+def _normalize(text: str | None) -> str:
+    return _WS_RE.sub(" ", text or "").strip()
+
+
+def decision_key(
+    placeholder_label: str,
+    occurrence_context: str,
+    user_input: str | None,
+    previous_global_value: str | None,
+    prior_occurrence_value: str | None,
+    model_version: str,
+) -> str:
+    """Key on every input the model sees; the context is whitespace-normalized and hashed."""
+    context_hash = hashlib.sha256(_normalize(occurrence_context).encode("utf-8")).hexdigest()
+    parts = [
+        _normalize(placeholder_label).upper(),
+        context_hash,
+        _normalize(user_input),
+        _normalize(previous_global_value),
+        _normalize(prior_occurrence_value),
+        model_version,
+    ]
+    return hashlib.sha256(json.dumps(parts).encode("utf-8")).hexdigest()
+
+
+class DecisionCache:
+    def __init__(self, max_entries: int = DECISION_CACHE_MAX_ENTRIES, ttl_seconds: float = DECISION_CACHE_TTL_SECONDS):
+        self.max_entries = max(1, max_entries)
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, tuple[float, dict]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl_seconds > 0
+
+    def get(self, key: str) -> dict | None:
+        if not self.enabled:
+            return None
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return copy.deepcopy(entry[1])
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, key: str, decision: dict) -> None:
+        if not self.enabled:
+            return
+        expires = time.monotonic() + self.ttl_seconds
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = (expires, copy.deepcopy(decision))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "ttl_seconds": self.ttl_seconds,
+            }
+
+
+decision_cache = DecisionCache()
@@ -0,0 +1,141 @@
+# utils/executors.py
+import asyncio
+import functools
+import multiprocessing
+import os
+import threading
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from utils.log import configure_logging
+from utils.profiling import current_profile, sample_call
+
+# CPU-bound python-docx work (parse/fill) goes to a process pool, blocking I/O to a thread pool.
+# PARSE_PROCESS_WORKERS=0 runs CPU jobs on the thread pool instead (e.g. memory-constrained hosts).
+PARSE_PROCESS_WORKERS = int(os.getenv("PARSE_PROCESS_WORKERS", str(min(4, os.cpu_count() or 1))))
+IO_THREAD_WORKERS = int(os.getenv("IO_THREAD_WORKERS", "16"))
+PROCESS_START_METHOD = os.getenv("PROCESS_START_METHOD", "spawn")
+# Jobs queued or running per pool before new requests are rejected with 503
+MAX_PENDING_JOBS = int(os.getenv("MAX_PENDING_JOBS", "64"))
+
+
+class PoolSaturatedError(RuntimeError):
+    """Raised when a pool already has MAX_PENDING_JOBS queued or running jobs."""
+
+
+class _BoundedPool:
+    def __init__(self, name: str, factory, max_pending: int):
+        self.name = name
+        self.max_pending = max(1, max_pending)
+        self.pending = 0
+        self._factory = factory
+        self._executor: Executor | None = None
+        self._lock = threading.Lock()  # pending is released from executor threads when a job finishes
+
+    @property
+    def executor(self) -> Executor:
+        if self._executor is None:
+            self._executor = self._factory()
+        return self._executor
+
+    async def run(self, fn, *args, **kwargs):
+        profile = current_profile()
+        if profile is None:
+            return await self._run(functools.partial(fn, *args, **kwargs))
+        # Profiled request: sample the job where it runs and fold its stacks into the request's profile
+        result, stacks = await self._run(functools.partial(sample_call, fn, profile.interval, *args, **kwargs))
+        profile.merge(stacks, f"[{self.name} pool] {getattr(fn, '__qualname__', repr(fn))}")
+        return result
+
+    async def _run(self, call):
+        # A dead worker (e.g. OOM-killed) breaks the whole process pool. Jobs that were in it fail, since
+        # any of them may be the one that killed it; the pool is then replaced, so later jobs run again
+        executor = self.executor
+        try:
+            future = self._submit(executor, call)
+        except BrokenProcessPool:
+            # Broken before this job got in: it cannot be the culprit, so it goes to the new pool
+            self._replace(executor)
+            future = self._submit(self.executor, call)
+            executor = self._executor
+        try:
+            return await asyncio.wrap_future(future)
+        except BrokenProcessPool:
+            self._replace(executor)
+            raise
+
+    def _submit(self, executor: Executor, call) -> Future:
+        with self._lock:
+            if self.pending >= self.max_pending:
+                raise PoolSaturatedError(f"{self.name} pool is saturated ({self.pending} jobs pending)")
+            self.pending += 1
+        try:
+            future = executor.submit(call)
+        except BaseException:
+            self._release()
+            raise
+        # Released when the job itself finishes, not when its request gives up on it: a cancelled
+        # request cancels a queued job, but one that is already running still counts until it ends
+        future.add_done_callback(self._release)
+        return future
+
+    def _release(self, _future: Future | None = None) -> None:
+        with self._lock:
+            self.pending -= 1
+
+    def _replace(self, broken: Executor) -> None:
+        # Concurrent jobs all see the same breakage; only the first one swaps the pool out
+        if self._executor is broken:
+            self._executor = None
+            broken.shutdown(wait=False, cancel_futures=True)
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+class WorkPools:
+    """Executors shared by all requests of a worker process."""
+
+    def __init__(
+        self,
+        process_workers: int = PARSE_PROCESS_WORKERS,
+        thread_workers: int = IO_THREAD_WORKERS,
+        max_pending: int = MAX_PENDING_JOBS,
+    ):
+        self.io = _BoundedPool(
+            "io",
+            lambda: ThreadPoolExecutor(max_workers=max(1, thread_workers), thread_name_prefix="lexsy-io"),
+            max_pending,
+        )
+        if process_workers > 0:
+            self.cpu = _BoundedPool(
+                "cpu",
+                lambda: ProcessPoolExecutor(
+                    max_workers=process_workers,
+                    mp_context=multiprocessing.get_context(PROCESS_START_METHOD),
+                    initializer=configure_logging,
+                ),
+                max_pending,
+            )
+        else:
+            self.cpu = _BoundedPool("cpu", lambda: self.io.executor, max_pending)
+
+    async def run_cpu(self, fn, *args, **kwargs):
+        """Run a picklable, CPU-bound callable in the process pool."""
+        return await self.cpu.run(fn, *args, **kwargs)
+
+    async def run_io(self, fn, *args, **kwargs):
+        """Run a blocking I/O callable in the thread pool."""
+        return await self.io.run(fn, *args, **kwargs)
+
+    def stats(self) -> dict:
+        return {"cpu_pending": self.cpu.pending, "io_pending": self.io.pending}
+
+    def shutdown(self) -> None:
+        self.cpu.shutdown()
+        self.io.shutdown()
+
+
+pools = WorkPools()
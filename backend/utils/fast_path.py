@@ -0,0 +1,112 @@
+# utils/fast_path.py
+import os
+import re
+import threading
+from datetime import datetime
+
+from utils.metrics import CHAT_TURNS
+from utils.placeholders import MONEY_LABEL
+
+# Deterministic answers for turns whose outcome is obvious, checked before the decision cache
+# and OpenAI. Anything it is not sure about returns None and goes to the model as before.
+FAST_PATH_ENABLED = os.getenv("FAST_PATH_ENABLED", "1") == "1"
+
+# Same entity everywhere in a document: reuse once a value is known (see SYSTEM_PROMPT guidance)
+_IDENTITY_RE = re.compile(r"\b(COMPANY|NAME|STATE OF INCORPORATION|DATE OF SAFE)\b")
+_AMOUNT_RE = re.compile(r"\b(AMOUNT|PRICE|VALUATION|CAP|PAYMENT|INVESTMENT|PRINCIPAL|FEE)\b")
+_DATE_RE = re.compile(r"\bDATE\b")
+
+# "1000", "1,000,000", "$ 1,000.50" (grouping, if any, must be regular)
+_CLEAN_AMOUNT_RE = re.compile(r"^\$?\s*(?P<num>\d{1,3}(?:,\d{3})+|\d+)(?P<cents>\.\d{1,2})?$")
+_DATE_FORMATS = ("%m/%d/%Y", "%Y-%m-%d", "%B %d, %Y", "%b %d, %Y", "%d %B %Y")
+
+
+def _is_amount_label(label: str) -> bool:
+    return label == MONEY_LABEL or label.startswith("$") or bool(_AMOUNT_RE.search(label))
+
+
+def _clean_amount(value: str) -> str | None:
+    m = _CLEAN_AMOUNT_RE.match(value)
+    if not m:
+        return None
+    cents = (m.group("cents") or "").ljust(3, "0") if m.group("cents") else ""
+    return f"${int(m.group('num').replace(',', '')):,}{cents}"
+
+
+def _is_clean_date(value: str) -> bool:
+    for fmt in _DATE_FORMATS:
+        try:
+            datetime.strptime(value, fmt)
+            return True
+        except ValueError:
+            continue
+    return False
+
+
+def _decision(action: str, value: str, confidence: float) -> dict:
+    return {"action": action, "filled_value": value, "followup_question": "", "confidence": confidence}
+
+
+def classify_turn(
+    placeholder_label: str,
+    user_input: str = "",
+    previous_global_value: str | None = None,
+) -> tuple[str, dict] | None:
+    """(rule, decision) when the turn can be answered locally, else None.
+
+    The decision has the /chat_fill schema. Rules:
+    - reuse_identity: no new input, identity-like label, value already known for the label
+    - fill_amount: the input is a plain dollar amount for a money/amount label (normalized to "$1,000.50")
+    - fill_date: the input is already a well-formed date for a date label (kept as typed)
+    """
+    if not FAST_PATH_ENABLED:
+        return None
+    label = (placeholder_label or "").strip().upper()
+    value = (user_input or "").strip()
+    previous = (previous_global_value or "").strip()
+
+    if not value:
+        if previous and not _is_amount_label(label) and _IDENTITY_RE.search(label):
+            return "reuse_identity", _decision("reuse", previous, 0.95)
+        return None
+    if _is_amount_label(label):
+        amount = _clean_amount(value)
+        if amount is not None:
+            return "fill_amount", _decision("fill", amount, 0.95)
+        return None
+    if _DATE_RE.search(label) and _is_clean_date(value):
+        return "fill_date", _decision("fill", value, 0.95)
+    return None
+
+
+class TurnStats:
+    """How conversational turns were answered: fast path (per rule), decision cache, an identical
+    in-flight call (coalesced) or the LLM."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.paths = {"fast": 0, "cache": 0, "coalesced": 0, "llm": 0}
+        self.rules = {}
+
+    def record(self, path: str, rule: str | None = None) -> None:
+        with self._lock:
+            self.paths[path] += 1
+            if rule:
+                self.rules[rule] = self.rules.get(rule, 0) + 1
+        CHAT_TURNS.inc(path=path)
+
+    def stats(self) -> dict:
+        with self._lock:
+            paths, rules = dict(self.paths), dict(self.rules)
+        total = sum(paths.values())
+        return {
+            "enabled": FAST_PATH_ENABLED,
+            "turns": total,
+            **paths,
+            "fast_share": round(paths["fast"] / total, 4) if total else 0.0,
+            "llm_share": round(paths["llm"] / total, 4) if total else 0.0,
+            "rules": rules,
+        }
+
+
+turn_stats = TurnStats()
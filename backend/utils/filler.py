@@ -1,100 +1,178 @@
 from docx import Document
-import tempfile
+from utils.placeholders import MONEY_LABEL, normalize_label, scan_placeholders
+from utils.log import get_logger
+from utils.metrics import StageTimings
+from utils.ooxml import as_file
+from utils.xml_fill import StalePositionError, checked_position, fill_xml, fill_xml_positions
+import io
+import logging
+import os
 import re
 
-def fill_placeholders(file_bytes: bytes, responses):
-    print("\n==============================")
-    print("🧾 Starting fill_placeholders()")
-    print("Responses received:", responses)
-    print("==============================\n")
-
-    # Handle both new format (ordered list) and legacy format (dict)
-    if isinstance(responses, list):
-        # New format: ordered list of {id, label, value}
-        ordered_values = [item.get("value", "") for item in responses]
-        is_ordered_format = True
-        print(f"✅ Using ordered format with {len(ordered_values)} values")
-    else:
-        # Legacy format: dict mapping labels to values
-        label_map = responses
-        is_ordered_format = False
-        print("✅ Using legacy dict format")
-    
-    with tempfile.NamedTemporaryFile(delete=False, suffix=".docx") as tmp:
-        tmp.write(file_bytes)
-        tmp_path = tmp.name
-        print(f"📁 Temporary file created at: {tmp_path}")
-
-    doc = Document(tmp_path)
-    print("✅ Document loaded successfully.")
-    
-    # Track which occurrence we're on (for ordered format)
-    occurrence_index = [0]
-    
-    # Placeholder patterns (same as parser uses)
-    PLACEHOLDER_PATTERNS = [
-        (r"\[[^\]]+\]", r"\[([^\]]+)\]"),           # [KEY]
-        (r"\{\{[^}]+\}\}", r"\{\{([^}]+)\}\}"),     # {{KEY}}
-        (r"<[^>]+>", r"<([^>]+)>"),                  # <KEY>
-        (r"\$\s*\[[^\]]+\]", r"\$\s*\[([^\]]+)\]"), # $[KEY]
-    ]
-    
-    def replace_in_paragraph(paragraph):
-        """Replace placeholders in paragraph, handling both formats."""
-        full_text = "".join(run.text for run in paragraph.runs)
+logger = get_logger("filler")
+
+# Legacy dict format only: runs of underscores filled with the "_____________" value
+UNDERLINE_RE = re.compile(r"_{3,}")
+
+# "docx" round-trips the package through python-docx; "xml" rewrites only the story parts
+FILL_ENGINES = ("docx", "xml")
+DEFAULT_FILL_ENGINE = os.getenv("FILL_ENGINE", "docx")
+
+
+class _TextReplacer:
+    """Computes the filled text of one paragraph at a time, for both response formats.
+
+    Called once per paragraph in document traversal order; in the ordered format it
+    consumes one value per placeholder, so both fill engines must visit paragraphs
+    in the same order.
+    """
+
+    def __init__(self, responses):
+        # Handle both new format (ordered list) and legacy format (dict)
+        if isinstance(responses, list):
+            # New format: ordered list of {id, label, value}
+            self.ordered_values = [item.get("value", "") for item in responses]
+            self.is_ordered_format = True
+            logger.debug("Using ordered format with %d values", len(self.ordered_values))
+        else:
+            # Legacy format: dict mapping labels to values
+            self.label_map = responses
+            # Bracket/mustache values keyed by normalized label (matching is case-insensitive)
+            self.legacy_values = {
+                normalize_label(key): value
+                for key, value in responses.items()
+                if key not in (MONEY_LABEL, "_____________") and value
+            }
+            self.is_ordered_format = False
+            logger.debug("Using legacy dict format")
+        # Track which occurrence we're on (for ordered format)
+        self.occurrence_index = 0
+        self._debug = logger.isEnabledFor(logging.DEBUG)
+
+    def __call__(self, full_text: str) -> str:
         replaced_text = full_text
-        
-        if is_ordered_format:
-            # Ordered format: find placeholders and replace in order
-            # Find all placeholders in this paragraph
-            matches = []
-            for pattern, extract_pattern in PLACEHOLDER_PATTERNS:
-                for match in re.finditer(pattern, full_text):
-                    matches.append((match.start(), match.end(), match.group(0), pattern))
-            
-            # Sort by position (left to right)
-            matches.sort(key=lambda x: x[0])
-            
+        # Same single-pass scanner as the parser, so both agree on which spans are placeholders
+        matches = scan_placeholders(full_text)
+
+        if self.is_ordered_format:
+            # Ordered format: consume one value per placeholder, left to right
+            values = []
+            for m in matches:
+                if self.occurrence_index >= len(self.ordered_values):
+                    break
+                values.append((m, self.ordered_values[self.occurrence_index], self.occurrence_index))
+                self.occurrence_index += 1
+
             # Replace in reverse order to preserve positions
-            for start, end, raw, _ in reversed(matches):
-                if occurrence_index[0] < len(ordered_values):
-                    value = ordered_values[occurrence_index[0]]
-                    if value:
-                        replaced_text = replaced_text[:start] + str(value) + replaced_text[end:]
-                        print(f"🔁 Replacing occurrence {occurrence_index[0]} '{raw}' with '{value}'")
-                    occurrence_index[0] += 1
+            for m, value, idx in reversed(values):
+                if value:
+                    replaced_text = replaced_text[:m.start] + str(value) + replaced_text[m.end:]
+                    if self._debug:
+                        logger.debug("Replacing occurrence %d %r", idx, m.raw)
         else:
             # Legacy format: label-based replacement
-            # Normal bracketed placeholders
-            for key, value in label_map.items():
-                if key not in ("$[__________]", "_____________") and value:
-                    patterns = [
-                        rf"\[\s*{re.escape(key)}\s*\]",   # [KEY]
-                        rf"\{{\s*{re.escape(key)}\s*\}}", # {{KEY}}
-                    ]
-                    for pattern in patterns:
-                        if re.search(pattern, replaced_text, flags=re.IGNORECASE):
-                            replaced_text = re.sub(pattern, str(value), replaced_text, flags=re.IGNORECASE)
-                            print(f"🔁 Replacing placeholder '{key}' with '{value}'")
-            
-            # Money placeholders
-            money_value = label_map.get("$[__________]")
-            if money_value:
-                if re.search(r"\$\s*\[[^\]]+\]", replaced_text):
-                    replaced_text = re.sub(
-                        r"\$\s*\[[^\]]+\]",
-                        f"${money_value}",
-                        replaced_text
-                    )
-                    print(f"💰 Replacing money placeholder with '${money_value}'")
-            
+            money_value = self.label_map.get(MONEY_LABEL)
+            for m in reversed(matches):
+                if m.kind in ("bracket", "mustache") and m.label in self.legacy_values:
+                    value = str(self.legacy_values[m.label])
+                    if self._debug:
+                        logger.debug("Replacing placeholder %r", m.raw)
+                elif m.kind == "money" and money_value:
+                    value = f"${money_value}"
+                    if self._debug:
+                        logger.debug("Replacing money placeholder %r", m.raw)
+                else:
+                    continue
+                replaced_text = replaced_text[:m.start] + value + replaced_text[m.end:]
+
             # Underline blanks
-            underline_value = label_map.get("_____________")
+            underline_value = self.label_map.get("_____________")
             if underline_value:
-                if re.search(r"_{3,}", replaced_text):
-                    replaced_text = re.sub(r"_{3,}", str(underline_value), replaced_text)
-                    print(f"🖊️ Replacing underline blanks with '{underline_value}'")
-        
+                if UNDERLINE_RE.search(replaced_text):
+                    replaced_text = UNDERLINE_RE.sub(str(underline_value), replaced_text)
+                    if self._debug:
+                        logger.debug("Replacing underline blanks")
+
+        return replaced_text
+
+
+def _position_edits(responses, positions: dict | None):
+    """(part, path, span, value) per ordered response, or None if any value has no known position.
+
+    A response item may carry its own `pos` (as returned by /parse_doc); otherwise it
+    is looked up by occurrence id in `positions`.
+    """
+    if not isinstance(responses, list):
+        return None
+    positions = positions or {}
+    edits = []
+    for item in responses:
+        if not isinstance(item, dict):
+            return None
+        if not item.get("value"):
+            continue
+        pos = item.get("pos") or positions.get(str(item.get("id")))
+        if not pos:
+            return None
+        edits.append((*checked_position(pos), item["value"]))
+    return edits
+
+
+def _log_filled(engine: str, replacer: _TextReplacer, filled: bytes) -> None:
+    if replacer.is_ordered_format:
+        logger.info("Filled %d occurrences with the %s engine (%d bytes)", replacer.occurrence_index, engine, len(filled))
+    else:
+        logger.info("Filled legacy responses with the %s engine (%d bytes)", engine, len(filled))
+
+
+def fill_placeholders(
+    file_bytes: bytes,
+    responses,
+    engine: str | None = None,
+    positions: dict | None = None,
+    timings: StageTimings | None = None,
+) -> bytes:
+    """Fill the template and return the completed .docx as bytes (nothing touches the disk).
+
+    `positions` maps occurrence id -> `pos` from the parse result. When every ordered
+    value has a position the occurrences are filled directly; otherwise, or if the
+    positions do not match the document, the selected engine scans it.
+    `timings`, if given, collects seconds per stage (load, replace, save) and the
+    engine that produced the output under labels["engine"].
+    """
+    timings = timings if timings is not None else StageTimings()
+    engine = engine or DEFAULT_FILL_ENGINE
+    if engine not in FILL_ENGINES:
+        raise ValueError(f"Unknown fill engine {engine!r} (expected one of {FILL_ENGINES})")
+
+    try:
+        edits = _position_edits(responses, positions)
+        if edits is not None:
+            timings.labels["engine"] = "positions"
+            filled = fill_xml_positions(as_file(file_bytes), edits, timings)
+            logger.info("Filled %d occurrences by position (%d bytes)", len(edits), len(filled))
+            return filled
+    except StalePositionError as e:
+        logger.warning("Positions do not match the document (%s); scanning instead", e)
+
+    replacer = _TextReplacer(responses)
+
+    if engine == "xml":
+        # Only document/header/footer XML is rewritten; other members are copied compressed
+        timings.labels["engine"] = "xml"
+        filled = fill_xml(as_file(file_bytes), replacer, timings)
+        _log_filled("xml", replacer, filled)
+        return filled
+
+    timings.labels["engine"] = "docx"
+    with timings.stage("load"):
+        doc = Document(as_file(file_bytes))
+
+    def replace_in_paragraph(paragraph):
+        """Replace placeholders in paragraph, handling both formats."""
+        full_text = "".join(run.text for run in paragraph.runs)
+        replaced_text = replacer(full_text)
+
         # Write back to paragraph
         if full_text != replaced_text:
             for run in paragraph.runs:
@@ -103,7 +181,7 @@ def fill_placeholders(file_bytes: bytes, responses):
                 paragraph.runs[0].text = replaced_text
             else:
                 paragraph.add_run(replaced_text)
-    
+
     def process_element(element):
         """Recursively process all paragraphs and tables."""
         if hasattr(element, "paragraphs"):
@@ -114,22 +192,28 @@ def fill_placeholders(file_bytes: bytes, responses):
                 for r in t.rows:
                     for c in r.cells:
                         process_element(c)
-    
-    # Process all paragraphs and tables in the main body
-    process_element(doc)
-    
-    # Process headers and footers
-    for section in doc.sections:
-        if section.header:
-            process_element(section.header)
-        if section.footer:
-            process_element(section.footer)
-
-    # Save filled file
-    output_path = tmp_path.replace(".docx", "_filled.docx")
-    doc.save(output_path)
-    print(f"✅ Document saved successfully at: {output_path}")
-    print(f"📊 Processed {occurrence_index[0]} occurrences" if is_ordered_format else "")
-    print("==============================\n")
-
-    return output_path
+
+    with timings.stage("replace"):
+        # Process all paragraphs and tables in the main body
+        process_element(doc)
+
+        # Process headers and footers
+        for section in doc.sections:
+            if section.header:
+                process_element(section.header)
+            if section.footer:
+                process_element(section.footer)
+
+    # Save filled file to memory
+    out = io.BytesIO()
+    with timings.stage("save"):
+        doc.save(out)
+    filled = out.getvalue()
+    _log_filled("docx", replacer, filled)
+    return filled
+
+
+def fill_placeholders_timed(*args, **kwargs) -> tuple[bytes, StageTimings]:
+    """fill_placeholders plus its per-stage timings, as one picklable result for the process pool."""
+    timings = StageTimings()
+    return fill_placeholders(*args, timings=timings, **kwargs), timings
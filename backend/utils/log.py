@@ -0,0 +1,25 @@
+# utils/log.py
+import logging
+import os
+
+# One-line records on stderr. DEBUG adds per-placeholder detail (labels and positions, never
+# filled values); at the default INFO level those calls are skipped before any formatting.
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "%(asctime)s %(levelname)s %(name)s [%(process)d] %(message)s")
+
+
+def configure_logging() -> None:
+    """Set up the "lexsy" logger tree once per process (also the pool initializer of spawned workers)."""
+    root = logging.getLogger("lexsy")
+    if root.handlers:
+        return
+    handler = logging.StreamHandler()
+    handler.setFormatter(logging.Formatter(LOG_FORMAT))
+    root.addHandler(handler)
+    root.setLevel(LOG_LEVEL)
+    root.propagate = False
+
+
+def get_logger(name: str) -> logging.Logger:
+    """Logger under the "lexsy" tree, e.g. get_logger("filler") -> "lexsy.filler"."""
+    return logging.getLogger(f"lexsy.{name}")
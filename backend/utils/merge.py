@@ -0,0 +1,208 @@
+# utils/merge.py
+import asyncio
+import csv
+import io
+import json
+import os
+import re
+import zipfile
+from typing import AsyncIterator, Iterator
+
+from utils.executors import PARSE_PROCESS_WORKERS, PoolSaturatedError, pools
+from utils.filler import fill_placeholders_timed
+from utils.metrics import FILL_STAGE_SECONDS, StageTimings
+from utils.placeholders import MONEY_LABEL, normalize_label
+
+# Mail merge: one template, many response sets, filled on the process pool and zipped as they finish.
+# At most MERGE_MAX_IN_FLIGHT filled documents are queued or held in memory at once.
+MERGE_MAX_IN_FLIGHT = int(os.getenv("MERGE_MAX_IN_FLIGHT", str(max(2, 2 * PARSE_PROCESS_WORKERS))))
+MERGE_MAX_ROWS = int(os.getenv("MERGE_MAX_ROWS", "10000"))
+
+ROW_FORMATS = ("jsonl", "csv")
+
+_UNSAFE_NAME_RE = re.compile(r"[^A-Za-z0-9._ -]+")
+
+
+def rows_format(filename: str | None) -> str:
+    return "csv" if (filename or "").lower().endswith(".csv") else "jsonl"
+
+
+def iter_rows(text: str, fmt: str) -> Iterator[tuple]:
+    """Yield (row_number, row, error) for each response set; row_number starts at 1.
+
+    A JSONL line is either an ordered list of {id, value} items or an object mapping
+    labels to values. A CSV file has one column per label. Blank lines are skipped; a
+    line that cannot be decoded is reported as that row's error.
+    """
+    lines = io.StringIO(text)
+    if fmt == "csv":
+        for number, row in enumerate(csv.DictReader(lines), start=1):
+            yield number, row, None
+        return
+    number = 0
+    for line in lines:
+        if not line.strip():
+            continue
+        number += 1
+        try:
+            row = json.loads(line)
+        except json.JSONDecodeError as e:
+            yield number, None, f"Invalid JSON: {e}"
+            continue
+        if not isinstance(row, (list, dict)):
+            yield number, None, "Each line must be a JSON list or object"
+            continue
+        yield number, row, None
+
+
+def row_responses(row, occurrences: list) -> list:
+    """Ordered responses for one row.
+
+    Lists are taken as-is (the /fill_doc ordered format). A label -> value mapping
+    fills every occurrence of that label; labels are matched case-insensitively with
+    or without their brackets, and a "$" column fills the money placeholders (with a
+    leading "$", as the legacy dict format does).
+    """
+    if isinstance(row, list):
+        return row
+    values = {}
+    for key, value in row.items():
+        if key is None or value in (None, ""):
+            continue
+        key = str(key).strip()
+        if key.startswith("$"):
+            value = str(value)
+            values[MONEY_LABEL] = value if value.startswith("$") else f"${value}"
+        else:
+            values[normalize_label(key)] = value
+    responses = []
+    for o in occurrences:
+        if o["label"] in values:
+            item = {"id": o["id"], "label": o["label"], "value": str(values[o["label"]])}
+            if "pos" in o:
+                item["pos"] = o["pos"]
+            responses.append(item)
+    return responses
+
+
+def member_name(row_number: int, row, name_field: str | None, used: set) -> str:
+    """Zip member name for a row's document: row number, plus the `name_field` value if any."""
+    name = f"{row_number:05d}"
+    if name_field and isinstance(row, dict) and row.get(name_field):
+        slug = _UNSAFE_NAME_RE.sub("_", str(row[name_field])).strip(" ._")[:80]
+        if slug:
+            name = f"{name}-{slug}"
+    candidate, n = f"{name}.docx", 1
+    while candidate in used:
+        n += 1
+        candidate = f"{name}-{n}.docx"
+    used.add(candidate)
+    return candidate
+
+
+class _ZipStream(io.RawIOBase):
+    """Write-only, non-seekable sink for ZipFile; `drain()` hands back what was written."""
+
+    def __init__(self):
+        self._chunks = []
+        self._offset = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, b) -> int:
+        self._chunks.append(bytes(b))
+        self._offset += len(b)
+        return len(b)
+
+    def tell(self) -> int:
+        return self._offset
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+async def _fill_row(content: bytes, responses, fill_engine: str | None, positions: dict, template=None) -> bytes:
+    # Other requests may fill the pool for a moment; a running merge waits rather than failing rows
+    delay = 0.05
+    while True:
+        try:
+            if template is not None:
+                timings = StageTimings()
+                filled = await pools.run_io(template.fill, responses, timings)
+            else:
+                filled, timings = await pools.run_cpu(
+                    fill_placeholders_timed, content, responses, fill_engine, positions
+                )
+            FILL_STAGE_SECONDS.observe_stages(timings, engine=timings.labels.get("engine", "unknown"))
+            return filled
+        except PoolSaturatedError:
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 1.0)
+
+
+async def merge_documents(
+    content: bytes,
+    parse_result: dict,
+    rows: Iterator[tuple],
+    fill_engine: str | None = None,
+    name_field: str | None = None,
+    template=None,
+) -> AsyncIterator[bytes]:
+    """Fill `content` once per row and stream a zip of the results in completion order.
+
+    With a compiled `template` (utils.templates) its plan is applied instead.
+
+    The archive ends with `report.jsonl`: one line per row with its document name
+    or its error, ordered by row number.
+    """
+    occurrences = parse_result.get("occurrences", [])
+    positions = {o["id"]: o["pos"] for o in occurrences if "pos" in o}
+    sink = _ZipStream()
+    report = []
+    used_names = set()
+    in_flight = {}
+
+    def record(task):
+        number, name = in_flight.pop(task)
+        try:
+            # Filled .docx files are already deflated: store them as-is
+            zout.writestr(zipfile.ZipInfo(name, (1980, 1, 1, 0, 0, 0)), task.result())
+            report.append({"row": number, "file": name, "error": None})
+        except Exception as e:
+            report.append({"row": number, "file": None, "error": str(e)})
+
+    try:
+        with zipfile.ZipFile(sink, "w", zipfile.ZIP_STORED) as zout:
+            for number, row, error in rows:
+                if number > MERGE_MAX_ROWS:
+                    report.append({"row": number, "file": None, "error": f"Exceeds MERGE_MAX_ROWS ({MERGE_MAX_ROWS})"})
+                    break
+                if error:
+                    report.append({"row": number, "file": None, "error": error})
+                    continue
+                responses = row_responses(row, occurrences)
+                task = asyncio.ensure_future(_fill_row(content, responses, fill_engine, positions, template))
+                in_flight[task] = (number, member_name(number, row, name_field, used_names))
+
+                while len(in_flight) >= MERGE_MAX_IN_FLIGHT:
+                    done, _ = await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+                    for finished in done:
+                        record(finished)
+                    yield sink.drain()
+
+            while in_flight:
+                done, _ = await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+                for finished in done:
+                    record(finished)
+                yield sink.drain()
+
+            report.sort(key=lambda r: r["row"])
+            zout.writestr("report.jsonl", "".join(json.dumps(r) + "\n" for r in report))
+        yield sink.drain()
+    finally:
+        # Client went away mid-stream: drop the fills nobody will receive
+        for task in in_flight:
+            task.cancel()
@@ -0,0 +1,196 @@
+# utils/metrics.py
+import threading
+import time
+from contextlib import contextmanager
+
+# Minimal Prometheus text-format metrics (no client library). Values live in this process:
+# with several uvicorn workers, each worker exposes its own /metrics.
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels: dict) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels.items()) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class StageTimings:
+    """Seconds spent per stage of one parse/fill. Picklable, so pool workers can return it."""
+
+    __slots__ = ("stages", "labels")
+
+    def __init__(self):
+        self.stages = {}
+        self.labels = {}
+
+    def add(self, stage: str, seconds: float) -> None:
+        self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+
+    @contextmanager
+    def stage(self, stage: str):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(stage, time.perf_counter() - t0)
+
+
+class _Metric:
+    type = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict) -> tuple:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[n]) for n in self.labelnames)
+
+    def _labels(self, key: tuple, **extra) -> dict:
+        return {**dict(zip(self.labelnames, key)), **extra}
+
+    def render(self) -> list[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"] + self._samples()
+
+    def _samples(self) -> list[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    type = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values = {}
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def _samples(self) -> list[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self._labels(k))} {_format_value(v)}" for k, v in items]
+
+
+class Histogram(_Metric):
+    type = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}  # key -> [bucket counts..., sum, count]
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - t0, **labels)
+
+    def observe_stages(self, timings: StageTimings, **labels) -> None:
+        """One observation per stage of `timings`, labelled stage=<name> (plus `labels`)."""
+        for stage, seconds in timings.stages.items():
+            self.observe(seconds, stage=stage, **labels)
+
+    def _samples(self) -> list[str]:
+        with self._lock:
+            items = sorted((k, list(v)) for k, v in self._series.items())
+        lines = []
+        for key, series in items:
+            for bound, count in zip(self.buckets + (float("inf"),), series[:len(self.buckets)] + [series[-1]]):
+                lines.append(f"{self.name}_bucket{_format_labels(self._labels(key, le=_format_value(float(bound))))} {count}")
+            lines.append(f"{self.name}_sum{_format_labels(self._labels(key))} {_format_value(series[-2])}")
+            lines.append(f"{self.name}_count{_format_labels(self._labels(key))} {series[-1]}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+
+    def counter(self, name: str, documentation: str, labelnames: tuple = ()) -> Counter:
+        metric = Counter(name, documentation, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, documentation: str, labelnames: tuple = (), buckets: tuple = DEFAULT_BUCKETS) -> Histogram:
+        metric = Histogram(name, documentation, labelnames, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def register_collector(self, fn) -> None:
+        """`fn()` returns [(name, type, help, [(labels dict, value), ...])], read at scrape time."""
+        self._collectors.append(fn)
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines += metric.render()
+        for collect in self._collectors:
+            for name, kind, documentation, samples in collect():
+                lines += [f"# HELP {name} {documentation}", f"# TYPE {name} {kind}"]
+                lines += [f"{name}{_format_labels(labels)} {_format_value(value)}" for labels, value in samples]
+        return "\n".join(lines) + "\n"
+
+
+metrics = MetricsRegistry()
+
+HTTP_REQUEST_SECONDS = metrics.histogram(
+    "lexsy_http_request_seconds", "Time to produce the response, per route.", ("method", "route", "status")
+)
+PARSE_STAGE_SECONDS = metrics.histogram(
+    "lexsy_parse_stage_seconds", "Time per /parse_doc stage (upload_read, docx_load, regex_scan, context_build).",
+    ("stage",),
+)
+FILL_STAGE_SECONDS = metrics.histogram(
+    "lexsy_fill_stage_seconds", "Time per fill stage (load, replace, save), per engine.", ("stage", "engine")
+)
+LLM_REQUEST_SECONDS = metrics.histogram(
+    "lexsy_llm_request_seconds", "OpenAI round trip of a conversational turn, by resulting action.", ("action",)
+)
+LLM_FIRST_TOKEN_SECONDS = metrics.histogram(
+    "lexsy_llm_first_token_seconds", "Time to the first streamed token of a /chat_fill_stream turn."
+)
+CHAT_TURNS = metrics.counter(
+    "lexsy_chat_turns_total", "Conversational turns by how they were answered (fast, cache, coalesced, llm).", ("path",)
+)
+OPENAI_RETRIES = metrics.counter(
+    "lexsy_openai_retries_total", "OpenAI calls retried after a transient failure, by error type.", ("reason",)
+)
+UPLOADS_REJECTED = metrics.counter(
+    "lexsy_uploads_rejected_total", "Uploads refused before parsing (size, uncompressed size, compression ratio).", ("reason",)
+)
+LLM_ERRORS = metrics.counter("lexsy_llm_errors_total", "Conversational turns whose LLM call failed.", ("reason",))
+DOCUMENT_OCCURRENCES = metrics.histogram(
+    "lexsy_document_occurrences", "Placeholder occurrences per parsed document.", (),
+    buckets=(0, 1, 5, 10, 25, 50, 100, 250, 500, 1000, 5000),
+)
@@ -0,0 +1,338 @@
+# utils/ooxml.py
+# Minimal WordprocessingML helpers working on raw lxml elements (no python-docx object model).
+import io
+import posixpath
+import zipfile
+from typing import Iterator
+
+from lxml import etree
+
+W_NS = "http://schemas.openxmlformats.org/wordprocessingml/2006/main"
+R_NS = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+REL_NS = "http://schemas.openxmlformats.org/package/2006/relationships"
+OFFICE_DOCUMENT_REL = "http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument"
+XML_SPACE = "{http://www.w3.org/XML/1998/namespace}space"
+NSMAP = {"w": W_NS}
+
+
+def as_file(source):
+    """Accept a path, a binary file object or raw bytes (wrapped in BytesIO, no temp file)."""
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return io.BytesIO(source)
+    return source
+
+
+def w(tag: str) -> str:
+    return f"{{{W_NS}}}{tag}"
+
+
+W_BODY = w("body")
+W_P = w("p")
+W_R = w("r")
+W_RPR = w("rPr")
+W_T = w("t")
+W_TAB = w("tab")
+W_BR = w("br")
+W_TYPE = w("type")
+W_VAL = w("val")
+W_TBL = w("tbl")
+W_TR = w("tr")
+W_TC = w("tc")
+
+# Parts are parsed without entity resolution; huge_tree lifts lxml's depth/size guards for big documents
+XML_PARSER = etree.XMLParser(resolve_entities=False, huge_tree=True)
+
+# Text equivalents of run inner-content, as python-docx's `Run.text` renders them
+_RUN_CHAR = {w("tab"): "\t", w("ptab"): "\t", w("cr"): "\n", w("noBreakHyphen"): "-"}
+
+
+def run_text(r) -> str:
+    parts = []
+    for child in r:
+        tag = child.tag
+        if tag == W_T:
+            parts.append(child.text or "")
+        elif tag == W_BR:
+            # Line breaks are "\n"; page and column breaks have no text
+            if child.get(W_TYPE, "textWrapping") == "textWrapping":
+                parts.append("\n")
+        else:
+            ch = _RUN_CHAR.get(tag)
+            if ch:
+                parts.append(ch)
+    return "".join(parts)
+
+
+def runs_text(p) -> str:
+    """Text of the paragraph's direct runs only (python-docx `paragraph.runs`), as the filler sees it."""
+    return "".join(run_text(r) for r in p if r.tag == W_R)
+
+
+def set_run_text(r, text: str) -> None:
+    """Same as python-docx `run.text = text`: keep w:rPr, tabs become w:tab and newlines w:br."""
+    for child in list(r):
+        if isinstance(child.tag, str) and child.tag != W_RPR:
+            r.remove(child)
+    buf = []
+
+    def flush():
+        if buf:
+            t = etree.SubElement(r, W_T)
+            t.text = "".join(buf)
+            if len(t.text.strip()) < len(t.text):
+                t.set(XML_SPACE, "preserve")
+            buf.clear()
+
+    for ch in text:
+        if ch == "\t":
+            flush()
+            etree.SubElement(r, W_TAB)
+        elif ch in "\r\n":
+            flush()
+            etree.SubElement(r, W_BR)
+        else:
+            buf.append(ch)
+    flush()
+
+
+def set_paragraph_text(p, text: str) -> None:
+    """Put `text` in the first run and empty the others (adds a run if there is none)."""
+    runs = [r for r in p if r.tag == W_R]
+    for r in runs:
+        set_run_text(r, "")
+    if not runs:
+        runs = [etree.SubElement(p, W_R)]
+    set_run_text(runs[0], text)
+
+
+def _child_val(el, *path: str, default=None):
+    for tag in path:
+        el = el.find(tag) if el is not None else None
+    if el is None:
+        return None
+    return el.get(W_VAL, default)
+
+
+def _grid_span(tc) -> int:
+    return int(_child_val(tc, w("tcPr"), w("gridSpan")) or 1)
+
+
+def _tc_above(tc):
+    """The w:tc starting at the same grid column in the previous row, or None."""
+    tr = tc.getparent()
+    offset = int(_child_val(tr, w("trPr"), w("gridBefore")) or 0)
+    for sib in tc.itersiblings(W_TC, preceding=True):
+        offset += _grid_span(sib)
+    prev = next(tr.itersiblings(W_TR, preceding=True), None)
+    if prev is None:
+        return None
+    remaining = offset - int(_child_val(prev, w("trPr"), w("gridBefore")) or 0)
+    for cand in prev.iterchildren(W_TC):
+        if remaining < 0:
+            break
+        if remaining == 0:
+            return cand
+        remaining -= _grid_span(cand)
+    return None
+
+
+def element_children(el) -> list:
+    """Element children only (comments and processing instructions are skipped), as used by paths."""
+    return [c for c in el if isinstance(c.tag, str)]
+
+
+def _cell_contents(tc, tc_paths: dict) -> Iterator:
+    # A vertically merged continuation cell stands for the cell above it; a
+    # horizontally spanned cell repeats once per grid column (python-docx `row.cells`)
+    if _child_val(tc, w("tcPr"), w("vMerge"), default="continue") == "continue":
+        above = _tc_above(tc)
+        if above is not None and above in tc_paths:
+            yield from _cell_contents(above, tc_paths)
+            return
+    for _ in range(_grid_span(tc)):
+        yield tc_paths[tc], tc
+
+
+def iter_table_paragraphs(tbl, path: tuple = ()) -> Iterator[tuple]:
+    """(path, w:p) of every paragraph in a table, row by row, recursing into cells."""
+    tc_paths = {}
+    for ri, tr in enumerate(element_children(tbl)):
+        if tr.tag != W_TR:
+            continue
+        for ci, tc in enumerate(element_children(tr)):
+            if tc.tag != W_TC:
+                continue
+            tc_paths[tc] = path + (ri, ci)
+            for cell_path, cell in _cell_contents(tc, tc_paths):
+                yield from iter_story_paragraphs(cell, cell_path)
+
+
+def iter_story_paragraphs(container, path: tuple = ()) -> Iterator[tuple]:
+    """(path, w:p) for each paragraph of a body/header/footer/cell in the filler's traversal order.
+
+    Mirrors python-docx: direct paragraphs first, then every direct table row by row,
+    recursing into each cell. Keeping this order identical is what lets the XML fill
+    engine consume ordered values exactly like the python-docx engine. `path` is the
+    chain of element-child indexes from the part root; merged cells repeat their path.
+    """
+    children = element_children(container)
+    for idx, child in enumerate(children):
+        if child.tag == W_P:
+            yield path + (idx,), child
+    for idx, child in enumerate(children):
+        if child.tag == W_TBL:
+            yield from iter_table_paragraphs(child, path + (idx,))
+
+
+def iter_part_paragraphs(root) -> Iterator[tuple]:
+    """Story paragraphs of a part root: w:document (via its w:body), w:hdr or w:ftr."""
+    if root.tag == w("document"):
+        for idx, child in enumerate(element_children(root)):
+            if child.tag == W_BODY:
+                yield from iter_story_paragraphs(child, (idx,))
+        return
+    yield from iter_story_paragraphs(root)
+
+
+def resolve_path(root, path, _children_cache: dict | None = None):
+    """Element at `path` under `root`; pass a dict as cache when resolving many paths in one part."""
+    cache = {} if _children_cache is None else _children_cache
+    el = root
+    for idx in path:
+        children = cache.get(el)
+        if children is None:
+            children = cache[el] = element_children(el)
+        el = children[idx]
+    return el
+
+
+def part_relationships(zf: zipfile.ZipFile, part_name: str) -> dict:
+    """rId -> zip member name for the internal relationships of `part_name`."""
+    base, name = posixpath.split(part_name)
+    try:
+        rels = etree.fromstring(zf.read(posixpath.join(base, "_rels", f"{name}.rels")))
+    except KeyError:
+        return {}
+    out = {}
+    for rel in rels.iter(f"{{{REL_NS}}}Relationship"):
+        if rel.get("TargetMode") == "External":
+            continue
+        target = rel.get("Target", "")
+        if target.startswith("/"):
+            out[rel.get("Id")] = posixpath.normpath(target.lstrip("/"))
+        else:
+            out[rel.get("Id")] = posixpath.normpath(posixpath.join(base, target))
+    return out
+
+
+def section_refs(sect_pr) -> dict:
+    """{"header": rId, "footer": rId} of a w:sectPr's default references (None when absent)."""
+    refs = {"header": None, "footer": None}
+    for kind in refs:
+        for ref in sect_pr.iterchildren(w(f"{kind}Reference")):
+            if ref.get(W_TYPE) == "default":
+                refs[kind] = ref.get(f"{{{R_NS}}}id")
+    return refs
+
+
+# Compiled so it also works on python-docx's oxml elements, which override `.xpath()`
+_BODY_SECT_PRS = etree.XPath("./w:p/w:pPr/w:sectPr | ./w:sectPr", namespaces=NSMAP)
+
+
+def body_section_refs(doc_root) -> list[dict]:
+    """Default header/footer rIds of every section of a w:document, in document order."""
+    body = doc_root.find(W_BODY)
+    if body is None:
+        return []
+    return [section_refs(s) for s in _BODY_SECT_PRS(body)]
+
+
+def section_header_footer_parts(refs: list[dict], rels: dict) -> list[str]:
+    """Default header/footer part of every section, in the order python-docx visits them.
+
+    Sections without their own reference inherit the previous section's part (so a
+    part can repeat, exactly like `section.header` does); sections with nothing to
+    inherit have no header/footer and are skipped.
+    """
+    parts = []
+    current = {"header": None, "footer": None}
+    for sect in refs:
+        for kind in ("header", "footer"):
+            if sect.get(kind) in rels:
+                current[kind] = rels[sect[kind]]
+            if current[kind]:
+                parts.append(current[kind])
+    return parts
+
+
+def serialize_part(root) -> bytes:
+    """Serialize a part the way python-docx does (UTF-8, standalone declaration)."""
+    return etree.tostring(root, encoding="UTF-8", standalone=True)
+
+
+def main_document_part(zf: zipfile.ZipFile) -> str:
+    """Zip member name of the main document part (normally word/document.xml)."""
+    try:
+        rels = etree.fromstring(zf.read("_rels/.rels"))
+    except KeyError:
+        return "word/document.xml"
+    for rel in rels.iter(f"{{{REL_NS}}}Relationship"):
+        if rel.get("Type") == OFFICE_DOCUMENT_REL:
+            return posixpath.normpath(rel.get("Target", "").lstrip("/"))
+    return "word/document.xml"
+
+
+def iter_stream_story_paragraphs(source) -> Iterator[tuple]:
+    """Stream (part, path, text) of every story paragraph, in the filler's traversal order.
+
+    `source` is a path, binary file object or bytes of the .docx. The main part is
+    iterparsed straight out of the zip and every body child is cleared and detached
+    once handled, so memory stays flat however large the document is. Only the text
+    of table paragraphs is held until the body paragraphs are done (the filler visits
+    tables after paragraphs); header and footer parts are small and parsed whole.
+    """
+    with zipfile.ZipFile(as_file(source)) as zf:
+        doc_part = main_document_part(zf)
+        sections = []
+        tables = []
+        with zf.open(doc_part) as xml:
+            depth = 0
+            body_idx = None
+            doc_child = body_child = -1
+            for event, el in etree.iterparse(xml, events=("start", "end")):
+                if event == "start":
+                    depth += 1
+                    if depth == 2:
+                        doc_child += 1
+                        if el.tag == W_BODY:
+                            body_idx = doc_child
+                    elif depth == 3 and body_idx == doc_child:
+                        body_child += 1
+                    continue
+                depth -= 1
+                # w:document (1) > w:body (2) > block-level children end at depth 2
+                if depth != 2 or body_idx != doc_child:
+                    continue
+                path = (body_idx, body_child)
+                if el.tag == W_P:
+                    yield doc_part, path, runs_text(el)
+                    sect = el.find(f"{w('pPr')}/{w('sectPr')}")
+                    if sect is not None:
+                        sections.append(section_refs(sect))
+                elif el.tag == W_TBL:
+                    tables.extend((p_path, runs_text(p)) for p_path, p in iter_table_paragraphs(el, path))
+                elif el.tag == w("sectPr"):
+                    sections.append(section_refs(el))
+                el.clear()
+                parent = el.getparent()
+                while el.getprevious() is not None:
+                    del parent[0]
+
+        for path, text in tables:
+            yield doc_part, path, text
+
+        for part in section_header_footer_parts(sections, part_relationships(zf, doc_part)):
+            if part in zf.NameToInfo:
+                root = etree.fromstring(zf.read(part), XML_PARSER)
+                for path, p in iter_part_paragraphs(root):
+                    yield part, path, runs_text(p)
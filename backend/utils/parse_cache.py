@@ -0,0 +1,155 @@
+# utils/parse_cache.py
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+# In-memory LRU bounded by both entry count and serialized bytes,
+# with an optional on-disk tier (PARSE_CACHE_DIR) that survives restarts.
+PARSE_CACHE_MAX_ENTRIES = int(os.getenv("PARSE_CACHE_MAX_ENTRIES", "256"))
+PARSE_CACHE_MAX_BYTES = int(os.getenv("PARSE_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+PARSE_CACHE_DIR = os.getenv("PARSE_CACHE_DIR") or None
+PARSE_CACHE_DISK_MAX_BYTES = int(os.getenv("PARSE_CACHE_DISK_MAX_BYTES", str(512 * 1024 * 1024)))
+
+
+def content_digest(content: bytes) -> str:
+    return hashlib.sha256(content).hexdigest()
+
+
+def parse_cache_key(digest: str, **params) -> str:
+    """Key = SHA-256 of the document digest plus every parse parameter that changes the output."""
+    h = hashlib.sha256(digest.encode("ascii"))
+    h.update(json.dumps(params, sort_keys=True).encode("utf-8"))
+    return h.hexdigest()
+
+
+class ParseCache:
+    """Stores `extract_placeholders` results as JSON bytes.
+
+    Entries are kept serialized so that callers never share mutable dicts and the
+    byte budget is exact. Disk reads promote entries back into memory.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = PARSE_CACHE_MAX_ENTRIES,
+        max_bytes: int = PARSE_CACHE_MAX_BYTES,
+        disk_dir: str | None = PARSE_CACHE_DIR,
+        disk_max_bytes: int = PARSE_CACHE_DISK_MAX_BYTES,
+    ):
+        self.max_entries = max(1, max_entries)
+        self.max_bytes = max(1, max_bytes)
+        self.disk_dir = disk_dir
+        self.disk_max_bytes = disk_max_bytes
+        self._entries: "OrderedDict[str, bytes]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._disk_writes = 0
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        if self.disk_dir:
+            os.makedirs(self.disk_dir, exist_ok=True)
+
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self.disk_dir, key[:2], f"{key}.json")
+
+    def get(self, key: str) -> dict | None:
+        with self._lock:
+            blob = self._entries.get(key)
+            if blob is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return json.loads(blob)
+
+        if self.disk_dir:
+            try:
+                with open(self._disk_path(key), "rb") as f:
+                    blob = f.read()
+            except OSError:
+                blob = None
+            if blob is not None:
+                with self._lock:
+                    self.disk_hits += 1
+                    self._store(key, blob)
+                return json.loads(blob)
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key: str, result: dict) -> None:
+        blob = json.dumps(result, separators=(",", ":")).encode("utf-8")
+        with self._lock:
+            self._store(key, blob)
+        if self.disk_dir:
+            self._write_disk(key, blob)
+
+    def _store(self, key: str, blob: bytes) -> None:
+        """Insert into the memory tier and evict LRU entries over budget. Caller holds the lock."""
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self._bytes -= len(old)
+        if len(blob) > self.max_bytes:
+            return
+        self._entries[key] = blob
+        self._bytes += len(blob)
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self._bytes -= len(evicted)
+            self.evictions += 1
+
+    def _write_disk(self, key: str, blob: bytes) -> None:
+        path = self._disk_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(blob)
+        os.replace(tmp, path)
+        self._disk_writes += 1
+        if self._disk_writes % 32 == 0:
+            self._prune_disk()
+
+    def _prune_disk(self) -> None:
+        """Drop the least recently written files once the disk tier exceeds its byte budget."""
+        files = []
+        for root, _, names in os.walk(self.disk_dir):
+            for name in names:
+                if name.endswith(".json"):
+                    path = os.path.join(root, name)
+                    try:
+                        st = os.stat(path)
+                    except OSError:
+                        continue
+                    files.append((st.st_mtime, st.st_size, path))
+        total = sum(size for _, size, _ in files)
+        for _, size, path in sorted(files):
+            if total <= self.disk_max_bytes:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "disk_enabled": bool(self.disk_dir),
+            }
+
+
+parse_cache = ParseCache()
@@ -1,13 +1,31 @@
+import logging
+import os
 import re
-from typing import Dict, List, Tuple
+import time
+from bisect import bisect_left, bisect_right
+from typing import Dict, Iterator, List, Tuple
 from docx import Document
-
-PLACEHOLDER_PATTERNS = [
-    r"\[[^\]]+\]",     # [PLACEHOLDER]
-    r"\{\{[^}]+\}\}",  # {{PLACEHOLDER}}
-    r"<[^>]+>",        # <PLACEHOLDER>
-    r"\$\s*\[[^\]]+\]"
-]
+from utils.ooxml import (
+    as_file,
+    body_section_refs,
+    iter_part_paragraphs,
+    iter_stream_story_paragraphs,
+    runs_text,
+    section_header_footer_parts,
+)
+from utils.placeholders import scan_placeholders
+from utils.context import CONTEXT_MODES, CONTEXT_TOKEN_BUDGET, DEFAULT_CONTEXT_MODE, build_context_windows
+from utils.metrics import StageTimings
+from utils.log import get_logger
+
+logger = get_logger("parser")
+
+# "docx" loads the python-docx object model; "stream" iterparses the XML straight from the zip.
+PARSE_MODES = ("docx", "stream")
+DEFAULT_PARSE_MODE = os.getenv("PARSE_MODE", "docx")
+
+# Bumped whenever the shape of the parse result changes, so cached results are not reused
+PARSER_VERSION = "4"
 
 def _tokenize_words_with_offsets(text: str) -> List[Tuple[str, int]]:
     """Return list of (word, start_char_idx) so we can slice by word windows robustly."""
@@ -17,72 +35,142 @@ def _tokenize_words_with_offsets(text: str) -> List[Tuple[str, int]]:
         out.append((m.group(0), m.start()))
     return out
 
-def extract_placeholders(file_path: str, context_window_words: int = 80) -> Dict:
-    doc = Document(file_path)
+def _context_windows(
+    word_positions: List[int],
+    words_only: List[str],
+    spans: List[Tuple[int, int]],
+    context_window_words: int,
+) -> List[str]:
+    """Snippet of `context_window_words` words either side of each (start, end) span.
+
+    `word_positions` is sorted, so the word containing a span's start is the last word
+    starting at or before it (bisect_right), and the last word touched by the span is
+    the last one starting before its end (bisect_left). That gives the same indices as
+    a full scan of `word_positions` in O(log words) per span.
+    """
+    n_words = len(words_only)
+    snippets = []
+    for s, e in spans:
+        left_idx = bisect_right(word_positions, s) - 1
+        if left_idx < 0:
+            left_idx = 0
+        right_idx = bisect_left(word_positions, e) - 1
+        if right_idx < 0:
+            right_idx = n_words - 1
 
-    # Combine paragraphs; skip empty lines to reduce noise
-    lines: List[str] = [p.text for p in doc.paragraphs if p.text.strip()]
+        cstart = max(0, left_idx - context_window_words)
+        cend = min(n_words, right_idx + 1 + context_window_words)
+        snippets.append(" ".join(words_only[cstart:cend]).strip())
+    return snippets
+
+def _docx_story_paragraphs(file_path) -> Iterator[Tuple[str, tuple, str]]:
+    """(part, path, text) of every story paragraph through the python-docx object model."""
+    doc = Document(as_file(file_path))
+    doc_part = doc.part.partname.lstrip("/")
+    for path, p in iter_part_paragraphs(doc.element):
+        yield doc_part, path, runs_text(p)
+
+    # Header/footer parts are read through the relationships, not `section.header`,
+    # which would add an empty header to sections that have none
+    parts = {}
+    rels = {}
+    for r_id, rel in doc.part.rels.items():
+        if not rel.is_external:
+            rels[r_id] = rel.target_part.partname.lstrip("/")
+            parts[rels[r_id]] = rel.target_part
+    for part in section_header_footer_parts(body_section_refs(doc.element), rels):
+        for path, p in iter_part_paragraphs(parts[part].element):
+            yield part, path, runs_text(p)
+
+def _story_paragraphs(file_path, parse_mode: str) -> Iterator[Tuple[str, tuple, str]]:
+    """Each (part, path, text) once, in the order the filler first reaches it."""
+    if parse_mode == "stream":
+        paragraphs = iter_stream_story_paragraphs(file_path)
+    elif parse_mode == "docx":
+        paragraphs = _docx_story_paragraphs(file_path)
+    else:
+        raise ValueError(f"Unknown parse_mode {parse_mode!r} (expected one of {PARSE_MODES})")
+    # Merged cells and headers shared by several sections are visited more than once
+    seen = set()
+    for part, path, text in paragraphs:
+        if (part, path) not in seen:
+            seen.add((part, path))
+            yield part, path, text
+
+def extract_placeholders(
+    file_path,
+    context_window_words: int = 80,
+    parse_mode: str | None = None,
+    timings: StageTimings | None = None,
+    context_mode: str | None = None,
+    context_token_budget: int | None = None,
+) -> Dict:
+    """`file_path` may be a path, a binary file object or the raw .docx bytes.
+
+    Covers every paragraph the filler touches (body, tables, headers and footers) and
+    records where each occurrence lives: `pos` is {part, path, span}, the zip member,
+    the element-index path of the paragraph inside it and the character span in the
+    paragraph's run text, so the fill can go straight to it.
+
+    `context_mode` "budget" builds each context from whole sentences up to
+    `context_token_budget` tokens with the occurrence marked inline (see utils/context.py);
+    "words" takes `context_window_words` words either side.
+
+    `timings` collects seconds spent in docx_load, regex_scan and context_build.
+    """
+    context_mode = context_mode or DEFAULT_CONTEXT_MODE
+    if context_mode not in CONTEXT_MODES:
+        raise ValueError(f"Unknown context mode {context_mode!r} (expected one of {CONTEXT_MODES})")
+    timings = timings if timings is not None else StageTimings()
+    lines: List[str] = []
+    offset = 0
+    matches = []
+    positions = []
+    scan_s = 0.0
+    t0 = time.perf_counter()
+    # Placeholders are scanned per paragraph, like the filler does; the paragraph
+    # texts are combined (skipping empty lines to reduce noise) for the context windows
+    for part, path, text in _story_paragraphs(file_path, parse_mode or DEFAULT_PARSE_MODE):
+        if not text.strip():
+            continue
+        t_scan = time.perf_counter()
+        for m in scan_placeholders(text):
+            matches.append(m._replace(start=offset + m.start, end=offset + m.end))
+            positions.append({"part": part, "path": list(path), "span": [m.start, m.end]})
+        scan_s += time.perf_counter() - t_scan
+        lines.append(text)
+        offset += len(text) + 1
     full_text = "\n".join(lines)
+    # Loading and scanning are interleaved paragraph by paragraph; split the time between them
+    timings.add("docx_load", time.perf_counter() - t0 - scan_s)
+    timings.add("regex_scan", scan_s)
 
-    # Find all matches with positions so we can build per-occurrence context
-    # Find all matches with positions, avoiding duplicates for $[...] placeholders
-    matches = []
-    for pat in PLACEHOLDER_PATTERNS:
-        for m in re.finditer(pat, full_text):
-            raw = m.group(0)
-            # ⚠️ Skip redundant [____] match if it's part of a $[____] already
-            if pat == r"\[[^\]]+\]" and re.match(r"^\$\s*\[", full_text[m.start()-1 : m.end()]):
-                continue
-            matches.append((m.start(), m.end(), raw, pat))
-
-
-    print("\n=== DEBUG: PLACEHOLDER TEST ===")
-    print("Document length:", len(full_text))
-    print("Patterns:", PLACEHOLDER_PATTERNS)
-    print("Matches found:", len(matches))
-    for s, e, raw, pat in matches:
-        print(f"Matched [{raw}] using {pat}")
-    print("==============================\n")
-
-    # Keep reading order
-    matches.sort(key=lambda x: x[0])
-
-    # Tokenize words to extract context windows
-    words_with_offs = _tokenize_words_with_offsets(full_text)
-    word_positions = [off for _, off in words_with_offs]
-    words_only = [w for w, _ in words_with_offs]
+    logger.info("Parsed %d placeholder occurrences from %d characters", len(matches), len(full_text))
+    if logger.isEnabledFor(logging.DEBUG):
+        for m, pos in zip(matches, positions):
+            logger.debug("Matched %s placeholder %r at %s:%s%s", m.kind, m.label, pos["part"], pos["path"], pos["span"])
 
+    t0 = time.perf_counter()
     occurrences = []
     context_map: Dict[str, str] = {}
-
-    def normalize_label(raw: str) -> str:
-        label = raw.strip().strip("[]{}<> ").upper()
-        return label
-
-    for idx, (s, e, raw, pat) in enumerate(matches):
+    spans = [(m.start, m.end) for m in matches]
+
+    if context_mode == "budget":
+        snippets = build_context_windows(
+            full_text, spans, [m.label for m in matches], context_token_budget or CONTEXT_TOKEN_BUDGET
+        )
+    else:
+        # Tokenize words to extract context windows
+        words_with_offs = _tokenize_words_with_offsets(full_text)
+        word_positions = [off for _, off in words_with_offs]
+        words_only = [w for w, _ in words_with_offs]
+        snippets = _context_windows(word_positions, words_only, spans, context_window_words)
+
+    for idx, m in enumerate(matches):
         occ_id = str(idx)
-
-        # Label normalization
-        if pat == r"\$\s*\[[^\]]+\]":
-            label = "$[__________]"  # special case for monetary placeholders
-        else:
-            label = normalize_label(raw)
-
-        # Build local context window around the placeholder
-        left_idx = 0
-        right_idx = len(words_only) - 1
-        for i, off in enumerate(word_positions):
-            if off <= s:
-                left_idx = i
-            if off < e:
-                right_idx = i
-
-        cstart = max(0, left_idx - context_window_words)
-        cend = min(len(words_only), right_idx + 1 + context_window_words)
-        snippet = " ".join(words_only[cstart:cend]).strip()
-
-        occurrences.append({"id": occ_id, "label": label})
-        context_map[occ_id] = snippet
+        occurrences.append({"id": occ_id, "label": m.label, "pos": positions[idx]})
+        context_map[occ_id] = snippets[idx]
+    timings.add("context_build", time.perf_counter() - t0)
 
     # ✅ Clean ordered return
     return {
@@ -90,3 +178,8 @@ def extract_placeholders(file_path: str, context_window_words: int = 80) -> Dict
         "occurrences": occurrences,  
         "context_map": context_map  
     }
+
+def extract_placeholders_timed(*args, **kwargs) -> Tuple[Dict, StageTimings]:
+    """`extract_placeholders` that also returns its stage timings (for process-pool callers)."""
+    timings = StageTimings()
+    return extract_placeholders(*args, timings=timings, **kwargs), timings
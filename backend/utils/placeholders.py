@@ -0,0 +1,41 @@
+# utils/placeholders.py
+import re
+from typing import List, NamedTuple
+
+# Label every monetary placeholder ($[...]) is normalized to
+MONEY_LABEL = "$[__________]"
+
+# All placeholder kinds in one alternation, scanned in a single pass.
+# `money` comes first so "$[...]" wins over the "[...]" it contains; matches never overlap.
+PLACEHOLDER_RE = re.compile(
+    r"(?P<money>\$\s*\[[^\]]+\])"   # $[AMOUNT]
+    r"|(?P<bracket>\[[^\]]+\])"     # [PLACEHOLDER]
+    r"|(?P<mustache>\{\{[^}]+\}\})" # {{PLACEHOLDER}}
+    r"|(?P<angle><[^>]+>)"          # <PLACEHOLDER>
+)
+
+KINDS = ("money", "bracket", "mustache", "angle")
+
+
+class PlaceholderMatch(NamedTuple):
+    kind: str
+    start: int
+    end: int
+    raw: str
+    label: str
+
+
+def normalize_label(raw: str, kind: str | None = None) -> str:
+    if kind == "money":
+        return MONEY_LABEL
+    return raw.strip().strip("[]{}<> ").upper()
+
+
+def scan_placeholders(text: str) -> List[PlaceholderMatch]:
+    """Every placeholder in `text`, left to right, from one regex pass."""
+    out = []
+    for m in PLACEHOLDER_RE.finditer(text):
+        kind = m.lastgroup
+        raw = m.group(0)
+        out.append(PlaceholderMatch(kind, m.start(), m.end(), raw, normalize_label(raw, kind)))
+    return out
@@ -0,0 +1,206 @@
+# utils/profiling.py
+import contextvars
+import json
+import os
+import re
+import secrets
+import sys
+import threading
+import time
+from collections import Counter
+
+# Opt-in per-request sampling profiler: a request sent with `X-Profile: 1` (or `?profile=1`) has
+# its event-loop thread and every pool job it submits sampled, and the merged call profile is
+# saved under PROFILE_DIR for download from /profiles/{id}. Profiles hold function names only,
+# but they expose the service's internals to unauthenticated callers: off unless PROFILING_ENABLED=1.
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "0") == "1"
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "2"))
+PROFILE_MAX_FILES = int(os.getenv("PROFILE_MAX_FILES", "50"))
+PROFILE_MAX_DEPTH = 64
+PROFILE_ID_RE = re.compile(r"^[0-9a-f]{16}$")
+
+
+def _frame_name(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def _collapse(frame) -> str:
+    """Root-to-leaf stack of `frame` in the collapsed ("a;b;c") flame graph format."""
+    names = []
+    while frame is not None and len(names) < PROFILE_MAX_DEPTH:
+        names.append(_frame_name(frame))
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+class StackSampler:
+    """Samples one thread's stack every `interval` seconds from a background thread."""
+
+    def __init__(self, thread_id: int, interval: float):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="lexsy-profiler", daemon=True)
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                self.stacks[_collapse(frame)] += 1
+
+    def start(self) -> "StackSampler":
+        self._thread.start()
+        return self
+
+    def stop(self) -> Counter:
+        self._stop.set()
+        self._thread.join()
+        return self.stacks
+
+
+def sample_call(fn, interval: float, *args, **kwargs):
+    """Run `fn` on this thread while sampling it; returns (result, stacks). Picklable for the process pool."""
+    sampler = StackSampler(threading.get_ident(), interval).start()
+    try:
+        result = fn(*args, **kwargs)
+    finally:
+        stacks = sampler.stop()
+    # Drop the worker's own frames (thread/process bootstrap) above this call
+    marker = _frame_name(sys._getframe()) + ";"
+    trimmed = Counter()
+    for stack, count in stacks.items():
+        trimmed[stack.partition(marker)[2] or stack] += count
+    return result, dict(trimmed)
+
+
+class RequestProfile:
+    """Samples collected for one request, from the event loop and from the pool jobs it ran."""
+
+    def __init__(self, method: str, path: str, interval: float = PROFILE_INTERVAL_MS / 1000):
+        self.profile_id = secrets.token_hex(8)
+        self.method = method
+        self.path = path
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self.closed = False
+        self._started = time.time()
+        self._duration = 0.0
+        self._loop_sampler: StackSampler | None = None
+
+    def start(self) -> None:
+        self._loop_sampler = StackSampler(threading.get_ident(), self.interval).start()
+
+    def merge(self, stacks: dict, root: str) -> None:
+        # Jobs still running after the response started (e.g. a streamed merge) are not included
+        if self.closed:
+            return
+        for stack, count in stacks.items():
+            self.stacks[f"{root};{stack}"] += count
+
+    def stop(self) -> None:
+        if self._loop_sampler is not None:
+            self.merge(self._loop_sampler.stop(), "[event loop]")
+        self.closed = True
+        self._duration = time.time() - self._started
+
+    def summary(self, top: int = 30) -> dict:
+        inclusive, leaf = Counter(), Counter()
+        for stack, count in self.stacks.items():
+            frames = stack.split(";")
+            leaf[frames[-1]] += count
+            for name in set(frames):
+                inclusive[name] += count
+        return {
+            "id": self.profile_id,
+            "method": self.method,
+            "path": self.path,
+            "started_at": self._started,
+            "duration_s": round(self._duration, 4),
+            "interval_ms": self.interval * 1000,
+            "samples": sum(self.stacks.values()),
+            "top_self": leaf.most_common(top),
+            "top_inclusive": inclusive.most_common(top),
+        }
+
+    def collapsed(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+_current: contextvars.ContextVar[RequestProfile | None] = contextvars.ContextVar("lexsy_profile", default=None)
+
+
+def current_profile() -> RequestProfile | None:
+    return _current.get()
+
+
+def activate(profile: RequestProfile):
+    profile.start()
+    return _current.set(profile)
+
+
+def deactivate(profile: RequestProfile, token) -> None:
+    _current.reset(token)
+    profile.stop()
+
+
+class ProfileStore:
+    """Saved profiles on disk: <id>.json (summary) and <id>.collapsed (flame graph input)."""
+
+    def __init__(self, directory: str = PROFILE_DIR, max_files: int = PROFILE_MAX_FILES):
+        self.directory = directory
+        self.max_files = max(1, max_files)
+        self._lock = threading.Lock()
+
+    def _path(self, profile_id: str, ext: str) -> str:
+        return os.path.join(self.directory, f"{profile_id}.{ext}")
+
+    def save(self, profile: RequestProfile) -> dict:
+        summary = profile.summary()
+        with self._lock:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(self._path(profile.profile_id, "collapsed"), "w", encoding="utf-8") as f:
+                f.write(profile.collapsed())
+            with open(self._path(profile.profile_id, "json"), "w", encoding="utf-8") as f:
+                json.dump(summary, f, indent=2)
+            self._prune()
+        return summary
+
+    def _prune(self) -> None:
+        saved = sorted(
+            (os.path.getmtime(os.path.join(self.directory, name)), name[:-5])
+            for name in os.listdir(self.directory)
+            if name.endswith(".json")
+        )
+        for _, profile_id in saved[:-self.max_files]:
+            for ext in ("json", "collapsed"):
+                try:
+                    os.remove(self._path(profile_id, ext))
+                except FileNotFoundError:
+                    pass
+
+    def load(self, profile_id: str, fmt: str = "json") -> str | None:
+        if not PROFILE_ID_RE.match(profile_id):
+            return None
+        try:
+            with open(self._path(profile_id, "collapsed" if fmt == "collapsed" else "json"), encoding="utf-8") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def list(self) -> list[dict]:
+        if not os.path.isdir(self.directory):
+            return []
+        out = []
+        for name in sorted(os.listdir(self.directory)):
+            if name.endswith(".json"):
+                data = self.load(name[:-5])
+                if data:
+                    summary = json.loads(data)
+                    out.append({k: summary[k] for k in ("id", "method", "path", "started_at", "duration_s", "samples")})
+        return sorted(out, key=lambda s: s["started_at"], reverse=True)
+
+
+profile_store = ProfileStore()
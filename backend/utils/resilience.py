@@ -0,0 +1,256 @@
+# utils/resilience.py
+import asyncio
+import os
+import random
+import time
+from collections import OrderedDict
+
+import openai
+
+from utils.clients import hash_api_key
+from utils.metrics import OPENAI_RETRIES
+
+# Guards around every OpenAI call of the async path: identical concurrent turns share one call,
+# each API key is held to a token-bucket rate, transient failures are retried with jittered
+# exponential backoff, and a circuit breaker fails fast while the upstream keeps failing.
+OPENAI_COALESCE = os.getenv("OPENAI_COALESCE", "1") == "1"
+OPENAI_RATE_PER_SECOND = float(os.getenv("OPENAI_RATE_PER_SECOND", "8"))  # per API key; 0 disables
+OPENAI_RATE_BURST = float(os.getenv("OPENAI_RATE_BURST", "16"))
+OPENAI_RATE_MAX_WAIT_SECONDS = float(os.getenv("OPENAI_RATE_MAX_WAIT_SECONDS", "10"))
+OPENAI_MAX_RETRIES = int(os.getenv("OPENAI_MAX_RETRIES", "2"))
+OPENAI_RETRY_BASE_SECONDS = float(os.getenv("OPENAI_RETRY_BASE_SECONDS", "0.25"))
+OPENAI_RETRY_MAX_SECONDS = float(os.getenv("OPENAI_RETRY_MAX_SECONDS", "4"))
+OPENAI_BREAKER_FAILURES = int(os.getenv("OPENAI_BREAKER_FAILURES", "5"))
+OPENAI_BREAKER_RESET_SECONDS = float(os.getenv("OPENAI_BREAKER_RESET_SECONDS", "30"))
+
+# Worth another attempt: upstream rate limits, 5xx, timeouts and dropped connections
+RETRYABLE_ERRORS = (openai.RateLimitError, openai.InternalServerError, openai.APIConnectionError)
+
+
+class UpstreamError(RuntimeError):
+    """OpenAI cannot be used right now; mapped to an HTTP error with Retry-After."""
+
+    status_code = 503
+
+    def __init__(self, message: str, retry_after: float = 1.0):
+        super().__init__(message)
+        self.retry_after = max(1.0, retry_after)
+
+
+class RateLimitedError(UpstreamError):
+    """Over this key's rate (local bucket) or still rate-limited by OpenAI after retries."""
+
+    status_code = 429
+
+
+class CircuitOpenError(UpstreamError):
+    """Recent calls kept failing; not calling OpenAI until the breaker resets."""
+
+
+class TokenBucketLimiter:
+    """One token bucket per API key (by hash). Callers wait their turn, up to `max_wait` seconds."""
+
+    def __init__(
+        self,
+        rate: float = OPENAI_RATE_PER_SECOND,
+        burst: float = OPENAI_RATE_BURST,
+        max_wait: float = OPENAI_RATE_MAX_WAIT_SECONDS,
+        max_keys: int = 1024,
+    ):
+        self.rate = rate
+        self.burst = max(1.0, burst)
+        self.max_wait = max_wait
+        self.max_keys = max_keys
+        # key hash -> [tokens, last refill]; only touched from the event loop
+        self._buckets: "OrderedDict[str, list]" = OrderedDict()
+        self.throttled = 0
+        self.rejected = 0
+
+    async def acquire(self, api_key: str | None) -> None:
+        if self.rate <= 0:
+            return
+        key = hash_api_key(api_key)
+        now = time.monotonic()
+        bucket = self._buckets.pop(key, None) or [self.burst, now]
+        self._buckets[key] = bucket
+        while len(self._buckets) > self.max_keys:
+            self._buckets.popitem(last=False)
+        bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+        bucket[1] = now
+        # Reserve a token now (the balance may go negative) so waiters are served in arrival order
+        bucket[0] -= 1
+        if bucket[0] >= 0:
+            return
+        wait = -bucket[0] / self.rate
+        if wait > self.max_wait:
+            bucket[0] += 1
+            self.rejected += 1
+            raise RateLimitedError(f"OpenAI rate limit for this API key reached; retry in {wait:.0f}s", wait)
+        self.throttled += 1
+        await asyncio.sleep(wait)
+
+
+class CircuitBreaker:
+    """Opens after `failures` consecutive upstream failures; after `reset_seconds` one probe call is let through."""
+
+    def __init__(self, failures: int = OPENAI_BREAKER_FAILURES, reset_seconds: float = OPENAI_BREAKER_RESET_SECONDS):
+        self.failures = max(1, failures)
+        self.reset_seconds = reset_seconds
+        self.consecutive_failures = 0
+        self.opened_at: float | None = None
+        self.probing = False
+        self.times_opened = 0
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if self.probing or time.monotonic() - self.opened_at >= self.reset_seconds:
+            return "half_open"
+        return "open"
+
+    def before_call(self) -> bool:
+        """Raise CircuitOpenError while open; return True when this call is the half-open probe."""
+        if self.opened_at is None:
+            return False
+        remaining = self.reset_seconds - (time.monotonic() - self.opened_at)
+        if remaining > 0 or self.probing:
+            raise CircuitOpenError("OpenAI is failing; requests are paused", max(remaining, 1.0))
+        self.probing = True
+        return True
+
+    def record_success(self) -> None:
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self.probing = False
+
+    def record_failure(self) -> None:
+        self.consecutive_failures += 1
+        if self.probing or self.consecutive_failures >= self.failures:
+            if self.opened_at is None or self.probing:
+                self.times_opened += 1
+            self.opened_at = time.monotonic()
+            self.probing = False
+
+
+class Coalescer:
+    """Concurrent calls with the same key share the first caller's in-flight task."""
+
+    def __init__(self, enabled: bool = OPENAI_COALESCE):
+        self.enabled = enabled
+        self._in_flight: dict[str, asyncio.Task] = {}
+        self.coalesced = 0
+
+    def in_flight(self, key: str) -> bool:
+        return self.enabled and key in self._in_flight
+
+    async def run(self, key: str, factory):
+        if not self.enabled:
+            return await factory()
+        task = self._in_flight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(factory())
+            self._in_flight[key] = task
+            task.add_done_callback(lambda _: self._in_flight.pop(key, None))
+        else:
+            self.coalesced += 1
+        # A caller that goes away (client disconnect) must not cancel the call the others wait on
+        return await asyncio.shield(task)
+
+
+def _retry_after(error: Exception) -> float | None:
+    response = getattr(error, "response", None)
+    try:
+        return float(response.headers.get("retry-after")) if response is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+def backoff_delay(attempt: int, retry_after: float | None = None) -> float:
+    """Full-jitter exponential backoff, never shorter than an upstream Retry-After."""
+    delay = random.uniform(0, min(OPENAI_RETRY_MAX_SECONDS, OPENAI_RETRY_BASE_SECONDS * 2 ** attempt))
+    return max(delay, min(retry_after or 0.0, OPENAI_RETRY_MAX_SECONDS))
+
+
+class OpenAIGuard:
+    def __init__(
+        self,
+        breaker_failures: int = OPENAI_BREAKER_FAILURES,
+        breaker_reset_seconds: float = OPENAI_BREAKER_RESET_SECONDS,
+        max_keys: int = 1024,
+    ):
+        self.limiter = TokenBucketLimiter(max_keys=max_keys)
+        self.coalescer = Coalescer()
+        self.breaker_failures = breaker_failures
+        self.breaker_reset_seconds = breaker_reset_seconds
+        self.max_keys = max_keys
+        # One breaker per API key (by hash), like the limiter: one user's exhausted quota or bad
+        # key must not pause OpenAI for everyone. Only touched from the event loop.
+        self._breakers: "OrderedDict[str, CircuitBreaker]" = OrderedDict()
+        self.breakers_opened = 0
+
+    def breaker(self, api_key: str | None) -> CircuitBreaker:
+        key = hash_api_key(api_key)
+        breaker = self._breakers.pop(key, None)
+        if breaker is None:
+            breaker = CircuitBreaker(self.breaker_failures, self.breaker_reset_seconds)
+        self._breakers[key] = breaker
+        while len(self._breakers) > self.max_keys:
+            self._breakers.popitem(last=False)
+        return breaker
+
+    def open_breakers(self) -> int:
+        """API keys whose breaker is open or has a probe in flight.
+
+        A breaker past its reset time with no probe yet is not counted: for a key nobody
+        uses again no probe ever comes, and it would otherwise look open forever.
+        """
+        return sum(1 for b in self._breakers.values() if b.state == "open" or b.probing)
+
+    async def call(self, api_key: str | None, create):
+        """Await `create()` (an OpenAI request) under the key's rate limit, retries and circuit breaker.
+
+        Raises RateLimitedError / UpstreamError once retries are exhausted and
+        CircuitOpenError while the key's breaker is open; other errors (bad key, bad
+        request) are raised as they are and do not count against the breaker. The
+        half-open probe is not retried: its first result re-opens or closes the breaker.
+        """
+        breaker = self.breaker(api_key)
+        probe = breaker.before_call()
+        attempt = 0
+        try:
+            while True:
+                await self.limiter.acquire(api_key)
+                try:
+                    result = await create()
+                except RETRYABLE_ERRORS as e:
+                    if probe or attempt >= OPENAI_MAX_RETRIES:
+                        opened = breaker.times_opened
+                        breaker.record_failure()
+                        self.breakers_opened += breaker.times_opened - opened
+                        if isinstance(e, openai.RateLimitError):
+                            raise RateLimitedError("OpenAI rate limit reached", _retry_after(e) or 1.0) from e
+                        raise UpstreamError(f"OpenAI unavailable ({type(e).__name__})") from e
+                    OPENAI_RETRIES.inc(reason=type(e).__name__)
+                    await asyncio.sleep(backoff_delay(attempt, _retry_after(e)))
+                    attempt += 1
+                    continue
+                breaker.record_success()
+                return result
+        finally:
+            # A probe that ended without an upstream verdict (bad key, local rate limit,
+            # cancellation) must not leave the breaker half-open: the next call probes again
+            if probe:
+                breaker.probing = False
+
+    def stats(self) -> dict:
+        return {
+            "breakers_open": self.open_breakers(),
+            "breaker_opened": self.breakers_opened,
+            "coalesced": self.coalescer.coalesced,
+            "throttled": self.limiter.throttled,
+            "rate_limited": self.limiter.rejected,
+        }
+
+
+openai_guard = OpenAIGuard()
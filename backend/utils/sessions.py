@@ -0,0 +1,95 @@
+# utils/sessions.py
+import json
+import os
+import secrets
+import threading
+import time
+from collections import OrderedDict
+
+# Template bytes + parse result kept server-side so /fill_doc can take a doc_id instead of a re-upload.
+DOC_SESSION_TTL_SECONDS = float(os.getenv("DOC_SESSION_TTL_SECONDS", "3600"))
+DOC_SESSION_MAX_BYTES = int(os.getenv("DOC_SESSION_MAX_BYTES", str(256 * 1024 * 1024)))
+
+
+class DocumentSession:
+    __slots__ = ("doc_id", "content", "parse_result", "filename", "size", "last_access")
+
+    def __init__(self, doc_id: str, content: bytes, parse_result: dict, filename: str | None):
+        self.doc_id = doc_id
+        self.content = content
+        self.parse_result = parse_result
+        self.filename = filename
+        self.size = len(content) + len(json.dumps(parse_result, separators=(",", ":")))
+        self.last_access = time.monotonic()
+
+
+class DocumentSessionStore:
+    """In-memory sessions with sliding expiry and an LRU-enforced memory budget."""
+
+    def __init__(self, ttl_seconds: float = DOC_SESSION_TTL_SECONDS, max_bytes: int = DOC_SESSION_MAX_BYTES):
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max(1, max_bytes)
+        self._sessions: "OrderedDict[str, DocumentSession]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.evictions = 0
+        self.expirations = 0
+
+    def create(self, content: bytes, parse_result: dict, filename: str | None = None) -> str | None:
+        """Store a document and return its doc_id, or None if it alone exceeds the budget."""
+        doc_id = secrets.token_urlsafe(16)
+        session = DocumentSession(doc_id, content, parse_result, filename)
+        with self._lock:
+            self._expire(time.monotonic())
+            if session.size > self.max_bytes:
+                # Too large to keep: callers fall back to the upload path
+                return None
+            self._sessions[doc_id] = session
+            self._bytes += session.size
+            while self._bytes > self.max_bytes:
+                _, old = self._sessions.popitem(last=False)
+                self._bytes -= old.size
+                self.evictions += 1
+        return doc_id
+
+    def get(self, doc_id: str) -> DocumentSession | None:
+        now = time.monotonic()
+        with self._lock:
+            self._expire(now)
+            session = self._sessions.get(doc_id)
+            if session is None:
+                return None
+            session.last_access = now
+            self._sessions.move_to_end(doc_id)
+            return session
+
+    def delete(self, doc_id: str) -> bool:
+        with self._lock:
+            session = self._sessions.pop(doc_id, None)
+            if session is None:
+                return False
+            self._bytes -= session.size
+            return True
+
+    def _expire(self, now: float) -> None:
+        """Drop sessions idle past the TTL. Caller holds the lock; oldest access is first."""
+        while self._sessions:
+            doc_id, session = next(iter(self._sessions.items()))
+            if now - session.last_access < self.ttl_seconds:
+                break
+            del self._sessions[doc_id]
+            self._bytes -= session.size
+            self.expirations += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "sessions": len(self._sessions),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
+
+
+doc_sessions = DocumentSessionStore()
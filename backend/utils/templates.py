@@ -0,0 +1,362 @@
+# utils/templates.py
+import io
+import json
+import os
+import pickle
+import re
+import secrets
+import shutil
+import threading
+import time
+import zipfile
+from collections import OrderedDict
+from typing import NamedTuple
+
+from lxml import etree
+
+from utils.merge import row_responses
+from utils.metrics import StageTimings
+from utils.ooxml import XML_PARSER, resolve_path, runs_text, serialize_part, set_paragraph_text
+from utils.xml_fill import write_package
+
+# Registered templates are compiled once and stored on disk; fills by template_id only apply values.
+TEMPLATE_STORE_DIR = os.getenv("TEMPLATE_STORE_DIR", "template_store")
+TEMPLATE_MAX_VERSIONS = int(os.getenv("TEMPLATE_MAX_VERSIONS", "5"))
+TEMPLATE_CACHE_SIZE = int(os.getenv("TEMPLATE_CACHE_SIZE", "16"))
+
+TEMPLATE_ID_RE = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+# Private-use characters never found in templates: they tag the paragraphs and run text
+# that get cut out of the serialized XML when the plan is built
+_MARK_OPEN, _MARK_CLOSE, _RUN_SENTINEL = "\ue000", "\ue001", "\ue002"
+_MARKER_RE = re.compile(
+    f"<!--{_MARK_OPEN}([BE])(\\d+){_MARK_CLOSE}-->".encode("utf-8")
+)
+_RUN_SENTINEL_BYTES = _RUN_SENTINEL.encode("utf-8")
+_RUN_BREAKS_RE = re.compile(r"([\t\r\n])")
+# Characters lxml refuses in text nodes (XML 1.0 forbids them)
+_INVALID_XML_RE = re.compile("[\x00-\x08\x0b\x0c\x0e-\x1f\ufffe\uffff]")
+
+
+class TemplateNotFoundError(KeyError):
+    """No template (or no such version) in the registry."""
+
+
+class ParagraphSlot(NamedTuple):
+    original: bytes     # the paragraph as serialized when none of its values are given
+    head: bytes         # filled paragraph up to the first run's text content
+    tail: bytes         # ... and from after it
+    tag_prefix: str     # namespace prefix of the run content tags ("w:")
+    segments: tuple     # literal text, or (occurrence id, raw placeholder) to substitute
+    occurrence_ids: frozenset
+
+
+class PartPlan(NamedTuple):
+    chunks: list        # untouched XML between slots; len(chunks) == len(slots) + 1
+    slots: list
+    occurrence_ids: frozenset
+
+
+def _escape(text: str) -> str:
+    if _INVALID_XML_RE.search(text):
+        raise ValueError("All strings must be XML compatible: Unicode or ASCII, no NULL bytes or control characters")
+    return text.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+
+
+def _render_run_text(text: str, prefix: str) -> bytes:
+    """Run content exactly as `set_run_text` + `serialize_part` would write it."""
+    out = []
+    for piece in _RUN_BREAKS_RE.split(text):
+        if piece == "\t":
+            out.append(f"<{prefix}tab/>")
+        elif piece in ("\r", "\n"):
+            out.append(f"<{prefix}br/>")
+        elif piece:
+            space = ' xml:space="preserve"' if len(piece.strip()) < len(piece) else ""
+            out.append(f"<{prefix}t{space}>{_escape(piece)}</{prefix}t>")
+    return "".join(out).encode("utf-8")
+
+
+def _split_marked(data: bytes) -> tuple[list, list]:
+    """Cut serialized XML at the paragraph markers: (chunks between paragraphs, paragraph bytes)."""
+    chunks, paragraphs = [], []
+    pos = 0
+    for m in _MARKER_RE.finditer(data):
+        if m.group(1) == b"B":
+            chunks.append(data[pos:m.start()])
+        else:
+            paragraphs.append(data[pos:m.start()])
+        pos = m.end()
+    chunks.append(data[pos:])
+    return chunks, paragraphs
+
+
+def _compile_part(xml: bytes, paragraphs: dict) -> PartPlan:
+    """`paragraphs` maps a paragraph path to its [(start, end, occurrence id)] spans."""
+    root = etree.fromstring(xml, XML_PARSER)
+    children_cache = {}
+    targets = [(resolve_path(root, path, children_cache), spans) for path, spans in paragraphs.items()]
+    # Document order, so the slots line up with the chunks between them
+    order = {el: i for i, el in enumerate(root.iter())}
+    targets.sort(key=lambda t: order[t[0]])
+    for k, (p, _) in enumerate(targets):
+        p.addprevious(etree.Comment(f"{_MARK_OPEN}B{k}{_MARK_CLOSE}"))
+        p.addnext(etree.Comment(f"{_MARK_OPEN}E{k}{_MARK_CLOSE}"))
+    chunks, originals = _split_marked(serialize_part(root))
+
+    segments = []
+    for p, spans in targets:
+        text = runs_text(p)
+        parts, pos = [], 0
+        for start, end, occ_id in sorted(spans):
+            parts.append(text[pos:start])
+            parts.append((occ_id, text[start:end]))
+            pos = end
+        parts.append(text[pos:])
+        segments.append(tuple(s for s in parts if s != ""))
+        set_paragraph_text(p, _RUN_SENTINEL)
+    _, filled = _split_marked(serialize_part(root))
+
+    slots = []
+    for original, data, segs, (_, spans) in zip(originals, filled, segments, targets):
+        i = data.index(_RUN_SENTINEL_BYTES)
+        start = data.rindex(b"<", 0, i)
+        end = data.index(b">", i) + 1
+        tag = data[start + 1:data.index(b">", start)].decode("utf-8")
+        slots.append(ParagraphSlot(
+            original, data[:start], data[end:], tag[:-1], segs, frozenset(s[2] for s in spans)
+        ))
+    return PartPlan(chunks, slots, frozenset().union(*(s.occurrence_ids for s in slots)))
+
+
+class CompiledTemplate:
+    """A parsed template plus its substitution plan.
+
+    Every paragraph holding a placeholder is cut out of its part's serialized XML in
+    two forms, untouched and with its text rewritten (the same output as the XML fill
+    engines), so a fill only joins byte chunks and values and deflates the parts that
+    changed; everything else in the package is copied raw from `source`.
+    """
+
+    def __init__(self, template_id: str, source: bytes, parse_result: dict, parts: dict, filename: str | None):
+        self.template_id = template_id
+        self.version = 0
+        self.source = source
+        self.parse_result = parse_result
+        self.parts = parts
+        self.filename = filename
+        self.created_at = time.time()
+
+    def meta(self) -> dict:
+        return {
+            "template_id": self.template_id,
+            "version": self.version,
+            "filename": self.filename,
+            "created_at": self.created_at,
+            "size": len(self.source),
+            # Not "occurrences": endpoints return meta() merged with the parse result's occurrence list
+            "occurrence_count": len(self.parse_result.get("occurrences", [])),
+            "labels": sorted({o["label"] for o in self.parse_result.get("occurrences", [])}),
+        }
+
+    def _values(self, responses) -> dict:
+        """Occurrence id -> value; ordered items match by `id` (or position in the list)."""
+        if isinstance(responses, dict):
+            responses = row_responses(responses, self.parse_result.get("occurrences", []))
+        values = {}
+        for idx, item in enumerate(responses):
+            value = item.get("value")
+            occ_id = str(item.get("id", idx))
+            if value and occ_id not in values:
+                values[occ_id] = str(value)
+        return values
+
+    def fill(self, responses, timings: StageTimings | None = None) -> bytes:
+        timings = timings if timings is not None else StageTimings()
+        timings.labels["engine"] = "template"
+        with timings.stage("replace"):
+            values = self._values(responses)
+            replaced = self._render(values)
+        with timings.stage("save"), zipfile.ZipFile(io.BytesIO(self.source)) as zin:
+            return write_package(zin, replaced)
+
+    def _render(self, values: dict) -> dict:
+        replaced = {}
+        for name, plan in self.parts.items():
+            if not any(occ_id in values for occ_id in plan.occurrence_ids):
+                continue
+            out = [plan.chunks[0]]
+            for slot, chunk in zip(plan.slots, plan.chunks[1:]):
+                if any(occ_id in values for occ_id in slot.occurrence_ids):
+                    text = "".join(
+                        seg if isinstance(seg, str) else values.get(seg[0], seg[1]) for seg in slot.segments
+                    )
+                    out += (slot.head, _render_run_text(text, slot.tag_prefix), slot.tail)
+                else:
+                    out.append(slot.original)
+                out.append(chunk)
+            replaced[name] = b"".join(out)
+        return replaced
+
+
+def compile_template(template_id: str, content: bytes, parse_result: dict, filename: str | None = None) -> CompiledTemplate:
+    """Build the substitution plan from `extract_placeholders` output (runs on the process pool)."""
+    by_part = {}
+    for occ in parse_result.get("occurrences", []):
+        pos = occ.get("pos")
+        if not pos:
+            raise ValueError("Parse result has no occurrence positions")
+        start, end = pos["span"]
+        by_part.setdefault(pos["part"], {}).setdefault(tuple(pos["path"]), []).append((start, end, occ["id"]))
+    with zipfile.ZipFile(io.BytesIO(content)) as zf:
+        parts = {name: _compile_part(zf.read(name), paragraphs) for name, paragraphs in by_part.items()}
+    return CompiledTemplate(template_id, content, parse_result, parts, filename)
+
+
+def new_template_id() -> str:
+    return secrets.token_hex(8)
+
+
+class TemplateRegistry:
+    """Compiled templates on disk (`<dir>/<template_id>/<version>.pkl` + `.json` metadata).
+
+    Re-registering a template_id adds a version (unless the bytes are unchanged);
+    only the newest TEMPLATE_MAX_VERSIONS are kept. Loaded templates are held in a
+    small in-memory LRU. The store is local and written only by this service, which
+    is what makes pickle acceptable for it.
+    """
+
+    def __init__(
+        self,
+        store_dir: str = TEMPLATE_STORE_DIR,
+        max_versions: int = TEMPLATE_MAX_VERSIONS,
+        cache_size: int = TEMPLATE_CACHE_SIZE,
+    ):
+        self.store_dir = store_dir
+        self.max_versions = max(1, max_versions)
+        self.cache_size = max(0, cache_size)
+        self._cache: "OrderedDict[tuple, CompiledTemplate]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.loads = 0
+
+    def _dir(self, template_id: str) -> str:
+        if not TEMPLATE_ID_RE.match(template_id):
+            raise TemplateNotFoundError(template_id)
+        return os.path.join(self.store_dir, template_id)
+
+    def _versions(self, template_id: str) -> list[int]:
+        try:
+            names = os.listdir(self._dir(template_id))
+        except FileNotFoundError:
+            return []
+        return sorted(int(n[:-4]) for n in names if n.endswith(".pkl") and n[:-4].isdigit())
+
+    def _remember(self, template: CompiledTemplate) -> None:
+        if self.cache_size:
+            self._cache[(template.template_id, template.version)] = template
+            self._cache.move_to_end((template.template_id, template.version))
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def add(self, template: CompiledTemplate) -> dict:
+        """Store `template` as the next version of its template_id and return its metadata."""
+        with self._lock:
+            path = self._dir(template.template_id)
+            versions = self._versions(template.template_id)
+            if versions:
+                latest = self._load(template.template_id, versions[-1])
+                if latest.source == template.source:
+                    return latest.meta()
+            template.version = (versions[-1] if versions else 0) + 1
+            os.makedirs(path, exist_ok=True)
+            base = os.path.join(path, str(template.version))
+            tmp = f"{base}.pkl.tmp"
+            with open(tmp, "wb") as f:
+                pickle.dump(template, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, f"{base}.pkl")
+            with open(f"{base}.json", "w", encoding="utf-8") as f:
+                json.dump(template.meta(), f)
+            for old in (versions + [template.version])[:-self.max_versions]:
+                self._remove_version(template.template_id, old)
+            self._remember(template)
+            return template.meta()
+
+    def _load(self, template_id: str, version: int) -> CompiledTemplate:
+        """Caller holds the lock."""
+        template = self._cache.get((template_id, version))
+        if template is not None:
+            self.hits += 1
+            self._cache.move_to_end((template_id, version))
+            return template
+        try:
+            with open(os.path.join(self._dir(template_id), f"{version}.pkl"), "rb") as f:
+                template = pickle.load(f)
+        except FileNotFoundError:
+            raise TemplateNotFoundError(f"{template_id} v{version}") from None
+        self.loads += 1
+        self._remember(template)
+        return template
+
+    def get(self, template_id: str, version: int | None = None) -> CompiledTemplate:
+        with self._lock:
+            if version is None:
+                versions = self._versions(template_id)
+                if not versions:
+                    raise TemplateNotFoundError(template_id)
+                version = versions[-1]
+            return self._load(template_id, version)
+
+    def list(self) -> list[dict]:
+        """Metadata of the newest version of every template, plus the versions kept."""
+        out = []
+        try:
+            template_ids = sorted(os.listdir(self.store_dir))
+        except FileNotFoundError:
+            return out
+        with self._lock:
+            for template_id in template_ids:
+                if not TEMPLATE_ID_RE.match(template_id):
+                    continue
+                versions = self._versions(template_id)
+                if not versions:
+                    continue
+                try:
+                    with open(os.path.join(self.store_dir, template_id, f"{versions[-1]}.json"), encoding="utf-8") as f:
+                        meta = json.load(f)
+                except (OSError, ValueError):
+                    continue
+                out.append({**meta, "versions": versions})
+        return out
+
+    def _remove_version(self, template_id: str, version: int) -> None:
+        self._cache.pop((template_id, version), None)
+        for ext in (".pkl", ".json"):
+            try:
+                os.remove(os.path.join(self._dir(template_id), f"{version}{ext}"))
+            except FileNotFoundError:
+                pass
+
+    def delete(self, template_id: str, version: int | None = None) -> bool:
+        """Evict one version, or the whole template when `version` is None."""
+        with self._lock:
+            versions = self._versions(template_id)
+            if version is not None:
+                if version not in versions:
+                    return False
+                self._remove_version(template_id, version)
+                if len(versions) > 1:
+                    return True
+            elif not versions:
+                return False
+            for key in [k for k in self._cache if k[0] == template_id]:
+                del self._cache[key]
+            shutil.rmtree(self._dir(template_id), ignore_errors=True)
+            return True
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"cached": len(self._cache), "hits": self.hits, "loads": self.loads}
+
+
+template_registry = TemplateRegistry()
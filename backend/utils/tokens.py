@@ -0,0 +1,33 @@
+# utils/tokens.py
+import math
+import os
+
+# Prompt-token counting for context budgets and reports. Uses tiktoken when it is installed
+# (exact for the OpenAI models); otherwise ~4 characters per token, OpenAI's rule of thumb.
+TOKEN_ENCODING = os.getenv("TOKEN_ENCODING", "o200k_base")  # gpt-4o / gpt-4o-mini
+
+try:
+    import tiktoken
+except ImportError:  # optional dependency
+    tiktoken = None
+
+_encoding = None
+
+
+def _get_encoding():
+    global _encoding
+    if _encoding is None:
+        _encoding = tiktoken.get_encoding(TOKEN_ENCODING)
+    return _encoding
+
+
+def count_tokens(text: str) -> int:
+    if not text:
+        return 0
+    if tiktoken is not None:
+        return len(_get_encoding().encode(text, disallowed_special=()))
+    return math.ceil(len(text) / 4)
+
+
+def token_counter_name() -> str:
+    return f"tiktoken:{TOKEN_ENCODING}" if tiktoken is not None else "approx:4chars"
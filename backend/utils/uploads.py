@@ -0,0 +1,104 @@
+# utils/uploads.py
+import hashlib
+import os
+import zipfile
+import zlib
+
+from lxml import etree
+
+from utils.ooxml import main_document_part
+
+# Uploads are read from the spooled temporary file the multipart parser already wrote them to
+# (kept in memory up to 1 MiB, on disk beyond). The size and the zip central directory are
+# checked first, so an oversized file or a zip bomb is refused without being loaded; accepted
+# files are then read in chunks and hashed as they are read.
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(50 * 1024 * 1024)))
+# Whole request body, checked from Content-Length before the body is received (room for form fields / rows)
+MAX_REQUEST_BYTES = int(os.getenv("MAX_REQUEST_BYTES", str(MAX_UPLOAD_BYTES + 8 * 1024 * 1024)))
+MAX_XML_PART_BYTES = int(os.getenv("MAX_XML_PART_BYTES", str(32 * 1024 * 1024)))  # uncompressed, e.g. word/document.xml
+MAX_UNCOMPRESSED_BYTES = int(os.getenv("MAX_UNCOMPRESSED_BYTES", str(256 * 1024 * 1024)))  # all members together
+MAX_COMPRESSION_RATIO = float(os.getenv("MAX_COMPRESSION_RATIO", "100"))
+UPLOAD_CHUNK_BYTES = 1024 * 1024
+
+# Small members legitimately compress very well (runs of spaces, empty tables); only larger ones can be bombs
+_RATIO_MIN_BYTES = 1024 * 1024
+
+
+class UploadRejectedError(ValueError):
+    """The upload is too large, not a .docx, or decompresses to far more than it weighs."""
+
+    def __init__(self, message: str, status_code: int = 400, reason: str = "invalid"):
+        super().__init__(message)
+        self.status_code = status_code
+        self.reason = reason
+
+
+def _size(fileobj) -> int:
+    fileobj.seek(0, os.SEEK_END)
+    size = fileobj.tell()
+    fileobj.seek(0)
+    return size
+
+
+def check_docx_zip(fileobj) -> None:
+    """Reject from the zip central directory, plus the small package relationships part
+    that names the main document part, which must be present."""
+    fileobj.seek(0)
+    try:
+        with zipfile.ZipFile(fileobj) as zf:
+            _check_members(zf.infolist())
+            try:
+                main_part = main_document_part(zf)
+            except (etree.XMLSyntaxError, zlib.error):
+                raise UploadRejectedError("Upload is not a .docx file (unreadable _rels/.rels)")
+            try:
+                zf.getinfo(main_part)
+            except KeyError:
+                raise UploadRejectedError(f"Upload is not a .docx file (no {main_part})") from None
+    except zipfile.BadZipFile:
+        raise UploadRejectedError("Upload is not a .docx file")
+
+
+def _check_members(infos: list) -> None:
+    total = 0
+    for info in infos:
+        total += info.file_size
+        if info.filename.endswith((".xml", ".rels")) and info.file_size > MAX_XML_PART_BYTES:
+            raise UploadRejectedError(
+                f"{info.filename} is {info.file_size} bytes uncompressed (limit {MAX_XML_PART_BYTES})",
+                413,
+                "xml_part_size",
+            )
+        if info.file_size > _RATIO_MIN_BYTES and info.file_size > MAX_COMPRESSION_RATIO * max(info.compress_size, 1):
+            raise UploadRejectedError(
+                f"{info.filename} expands {info.file_size / max(info.compress_size, 1):.0f}x "
+                f"(limit {MAX_COMPRESSION_RATIO:g}x)",
+                413,
+                "compression_ratio",
+            )
+    if total > MAX_UNCOMPRESSED_BYTES:
+        raise UploadRejectedError(
+            f"Upload is {total} bytes uncompressed (limit {MAX_UNCOMPRESSED_BYTES})", 413, "uncompressed_size"
+        )
+
+
+def read_upload(fileobj, max_bytes: int = MAX_UPLOAD_BYTES, docx: bool = True) -> tuple[bytes, str]:
+    """Checked, chunked read of a seekable upload file -> (content, SHA-256 hex digest).
+
+    Blocking (the spooled file may be on disk): run it on the I/O pool.
+    """
+    size = _size(fileobj)
+    if size > max_bytes:
+        raise UploadRejectedError(f"Upload is {size} bytes (limit {max_bytes})", 413, "size")
+    if docx:
+        check_docx_zip(fileobj)
+    fileobj.seek(0)
+    digest = hashlib.sha256()
+    chunks = []
+    while True:
+        chunk = fileobj.read(UPLOAD_CHUNK_BYTES)
+        if not chunk:
+            break
+        digest.update(chunk)
+        chunks.append(chunk)
+    return b"".join(chunks), digest.hexdigest()
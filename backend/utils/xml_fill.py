@@ -0,0 +1,206 @@
+# utils/xml_fill.py
+# Fill engine that edits the story XML parts directly and copies every other zip member
+# as raw compressed bytes (no decompress/recompress of images, fonts, etc.).
+import copy
+import io
+import struct
+import zipfile
+from typing import Callable
+
+from lxml import etree
+
+from utils.ooxml import (
+    W_BODY,
+    W_P,
+    XML_PARSER,
+    body_section_refs,
+    iter_story_paragraphs,
+    main_document_part,
+    part_relationships,
+    resolve_path,
+    runs_text,
+    section_header_footer_parts,
+    serialize_part,
+    set_paragraph_text,
+)
+from utils.placeholders import PLACEHOLDER_RE
+from utils.metrics import StageTimings
+
+_LOCAL_HEADER = struct.Struct("<4s5H3L2H")
+_DATA_DESCRIPTOR_FLAG = 0x08
+_COPY_CHUNK = 1024 * 1024
+
+
+class StalePositionError(ValueError):
+    """A recorded occurrence position no longer points at a placeholder in this document."""
+
+
+def _index(value) -> bool:
+    return type(value) is int and value >= 0
+
+
+def checked_position(pos) -> tuple:
+    """(part, path, (start, end)) from a `pos` as returned by /parse_doc.
+
+    Positions can come from the client, so a malformed one raises StalePositionError
+    (the fill then scans the document) rather than a TypeError deep in the engine.
+    """
+    try:
+        part, path, span = pos["part"], pos["path"], pos["span"]
+    except (TypeError, KeyError):
+        raise StalePositionError(f"Malformed position {str(pos)[:80]}") from None
+    if not (
+        isinstance(part, str)
+        and isinstance(path, list)
+        and all(_index(i) for i in path)
+        and isinstance(span, (list, tuple))
+        and len(span) == 2
+        and all(_index(i) for i in span)
+        and span[0] <= span[1]
+    ):
+        raise StalePositionError(f"Malformed position {str(pos)[:80]}")
+    return part, path, (span[0], span[1])
+
+
+def copy_member_raw(zin: zipfile.ZipFile, zout: zipfile.ZipFile, info: zipfile.ZipInfo) -> None:
+    """Append `info` from `zin` to `zout` without decompressing it.
+
+    zipfile has no public raw-copy API, so this writes the local header itself
+    (the same bookkeeping `ZipFile.mkdir` does) and streams the compressed bytes.
+    """
+    zin.fp.seek(info.header_offset)
+    header = _LOCAL_HEADER.unpack(zin.fp.read(_LOCAL_HEADER.size))
+    if header[0] != zipfile.stringFileHeader:
+        raise zipfile.BadZipFile(f"Bad local header for {info.filename}")
+    zin.fp.seek(header[-2] + header[-1], io.SEEK_CUR)  # name + extra field
+
+    out = copy.copy(info)
+    # Sizes and CRC are known from the central directory: no trailing data descriptor
+    out.flag_bits &= ~_DATA_DESCRIPTOR_FLAG
+    zip64 = out.file_size > zipfile.ZIP64_LIMIT or out.compress_size > zipfile.ZIP64_LIMIT
+    with zout._lock:
+        if zout._seekable:
+            zout.fp.seek(zout.start_dir)
+        out.header_offset = zout.fp.tell()
+        zout._writecheck(out)
+        zout._didModify = True
+        zout.fp.write(out.FileHeader(zip64))
+        remaining = info.compress_size
+        while remaining:
+            chunk = zin.fp.read(min(_COPY_CHUNK, remaining))
+            if not chunk:
+                raise zipfile.BadZipFile(f"Truncated member {info.filename}")
+            zout.fp.write(chunk)
+            remaining -= len(chunk)
+        zout.filelist.append(out)
+        zout.NameToInfo[out.filename] = out
+        zout.start_dir = zout.fp.tell()
+
+
+def _fill_story(container, replace_text: Callable[[str], str]) -> bool:
+    changed = False
+    for _, p in iter_story_paragraphs(container):
+        full_text = runs_text(p)
+        replaced_text = replace_text(full_text)
+        if full_text != replaced_text:
+            set_paragraph_text(p, replaced_text)
+            changed = True
+    return changed
+
+
+def write_package(zin: zipfile.ZipFile, replaced: dict) -> bytes:
+    """Copy the package in `zin`, writing `replaced` (member name -> XML bytes) and raw-copying every other member."""
+    out = io.BytesIO()
+    with zipfile.ZipFile(out, "w", zipfile.ZIP_DEFLATED) as zout:
+        for info in zin.infolist():
+            if info.filename in replaced:
+                new_info = zipfile.ZipInfo(info.filename, info.date_time)
+                new_info.compress_type = zipfile.ZIP_DEFLATED
+                new_info.external_attr = info.external_attr
+                zout.writestr(new_info, replaced[info.filename])
+            else:
+                copy_member_raw(zin, zout, info)
+    return out.getvalue()
+
+
+def fill_xml(source, replace_text: Callable[[str], str], timings: StageTimings | None = None):
+    """Fill the .docx at `source` (path or binary file object) and return the new package as bytes.
+
+    `replace_text` maps a paragraph's text to its filled text and is called for every
+    paragraph in the same order as the python-docx engine: body, then the default
+    header and footer of each section.
+    """
+    timings = timings if timings is not None else StageTimings()
+    with zipfile.ZipFile(source) as zin:
+        with timings.stage("load"):
+            doc_part = main_document_part(zin)
+            roots = {doc_part: etree.fromstring(zin.read(doc_part), XML_PARSER)}
+        changed = set()
+
+        with timings.stage("replace"):
+            body = roots[doc_part].find(W_BODY)
+            if body is not None and _fill_story(body, replace_text):
+                changed.add(doc_part)
+
+        sections = body_section_refs(roots[doc_part])
+        for part in section_header_footer_parts(sections, part_relationships(zin, doc_part)):
+            if part not in roots:
+                with timings.stage("load"):
+                    roots[part] = etree.fromstring(zin.read(part), XML_PARSER)
+            with timings.stage("replace"):
+                if _fill_story(roots[part], replace_text):
+                    changed.add(part)
+
+        with timings.stage("save"):
+            return write_package(zin, {part: serialize_part(roots[part]) for part in changed})
+
+
+def fill_xml_positions(source, edits, timings: StageTimings | None = None) -> bytes:
+    """Fill the .docx at `source` by jumping straight to each recorded occurrence.
+
+    `edits` is an iterable of (part, path, (start, end), value) as produced by the
+    parser. Only the parts that hold an edit are parsed, each paragraph is reached by
+    its element path instead of walking the document, and every span is checked to
+    still be a placeholder: a template that changed since it was parsed raises
+    StalePositionError so the caller can fall back to the scanning fill. When the
+    same span appears twice the first non-empty value wins.
+    """
+    timings = timings if timings is not None else StageTimings()
+    by_part: dict = {}
+    for part, path, (start, end), value in edits:
+        if not value:
+            continue
+        spans = by_part.setdefault(part, {}).setdefault(tuple(path), {})
+        spans.setdefault((start, end), str(value))
+
+    with zipfile.ZipFile(source) as zin:
+        roots = {}
+        for part, paragraphs in by_part.items():
+            try:
+                with timings.stage("load"):
+                    roots[part] = root = etree.fromstring(zin.read(part), XML_PARSER)
+            except KeyError:
+                raise StalePositionError(f"No part {part!r} in document") from None
+            with timings.stage("replace"):
+                _apply_part_edits(part, root, paragraphs)
+
+        with timings.stage("save"):
+            return write_package(zin, {part: serialize_part(root) for part, root in roots.items()})
+
+
+def _apply_part_edits(part: str, root, paragraphs: dict) -> None:
+    children_cache = {}
+    for path, spans in paragraphs.items():
+        try:
+            p = resolve_path(root, path, children_cache)
+        except IndexError:
+            p = None
+        if p is None or p.tag != W_P:
+            raise StalePositionError(f"No paragraph at {part}:{list(path)}")
+        text = runs_text(p)
+        # Right to left so earlier spans keep their offsets
+        for start, end in sorted(spans, reverse=True):
+            if not PLACEHOLDER_RE.fullmatch(text, start, end):
+                raise StalePositionError(f"No placeholder at {part}:{list(path)}[{start}:{end}]")
+            text = text[:start] + spans[(start, end)] + text[end:]
+        set_paragraph_text(p, text)
@@ -1,9 +1,13 @@
 import streamlit as st
 import requests
+import functools
 import json
+import os
 import pandas as pd
 
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from datetime import datetime
+from requests.adapters import HTTPAdapter
 
 # Custom CSS for better styling
 st.markdown("""
@@ -86,16 +90,45 @@ st.markdown("""
     </style>
 """, unsafe_allow_html=True)
 
+# --- Validation rules (built once, not on every call) ---
+US_STATES = frozenset({
+    "AL","AK","AZ","AR","CA","CO","CT","DE","FL","GA","HI","ID","IL","IN","IA","KS","KY",
+    "LA","ME","MD","MA","MI","MN","MS","MO","MT","NE","NV","NH","NJ","NM","NY","NC","ND",
+    "OH","OK","OR","PA","RI","SC","SD","TN","TX","UT","VT","VA","WA","WV","WI","WY"
+})
+AMOUNT_KEYWORDS = ("AMOUNT", "PRICE", "COST", "VALUATION", "CAP", "PAYMENT", "INVESTMENT",
+                   "PRINCIPAL", "DOLLAR", "DOLLARS", "MONEY", "PAY", "FEE", "$")
+
+
+@functools.lru_cache(maxsize=4096)
+def field_kind(label: str, question: str = "") -> str | None:
+    """Which validation applies to a field: "date", "state", "amount" or None (cached per label/question)."""
+    label_upper = label.upper().strip()
+    if "DATE" in label_upper:
+        return "date"
+    if "STATE" in label_upper or "INCORPORATION" in label_upper:
+        return "state"
+    question_upper = question.upper() if question else ""
+    # Check label or question for amount-related keywords
+    if (
+        any(keyword in label_upper for keyword in AMOUNT_KEYWORDS) or
+        label.startswith("$") or
+        any(keyword in question_upper for keyword in AMOUNT_KEYWORDS)
+    ):
+        return "amount"
+    return None
+
+
 def validate_input(label: str, value: str, question: str = "") -> tuple[bool, str]:
     """
     Validate user input for specific placeholders (Date, State, Amount).
     Returns (is_valid, error_message)
     """
-    label_upper = label.upper().strip()
+    kind = field_kind(label, question)
     val = value.strip()
 
     # --- Date validation (MM/DD/YYYY) ---
-    if "DATE" in label_upper:
+    if kind == "date":
         try:
             datetime.strptime(val, "%m/%d/%Y")
             return True, ""
@@ -103,28 +136,13 @@ def validate_input(label: str, value: str, question: str = "") -> tuple[bool, st
             return False, "❌ Please enter the date in MM/DD/YYYY format (e.g., 03/14/2025)."
 
     # --- State validation (U.S. two-letter codes) ---
-    if "STATE" in label_upper or "INCORPORATION" in label_upper:
-        US_STATES = {
-            "AL","AK","AZ","AR","CA","CO","CT","DE","FL","GA","HI","ID","IL","IN","IA","KS","KY",
-            "LA","ME","MD","MA","MI","MN","MS","MO","MT","NE","NV","NH","NJ","NM","NY","NC","ND",
-            "OH","OK","OR","PA","RI","SC","SD","TN","TX","UT","VT","VA","WA","WV","WI","WY"
-        }
+    if kind == "state":
         if val.upper() not in US_STATES:
             return False, "❌ Please enter a valid two-letter U.S. state abbreviation (e.g., MD, CA, NY)."
         return True, ""
 
     # --- Amount validation (for monetary values) ---
-    amount_keywords = ["AMOUNT", "PRICE", "COST", "VALUATION", "CAP", "PAYMENT", "INVESTMENT", 
-                       "PRINCIPAL", "DOLLAR", "DOLLARS", "MONEY", "PAY", "FEE", "$"]
-    question_upper = question.upper() if question else ""
-    # Check label or question for amount-related keywords
-    is_amount_field = (
-        any(keyword in label_upper for keyword in amount_keywords) or 
-        label.startswith("$") or
-        any(keyword in question_upper for keyword in amount_keywords)
-    )
-    
-    if is_amount_field:
+    if kind == "amount":
         # Remove common currency symbols and formatting
         cleaned = val.replace("$", "").replace(",", "").replace(" ", "").strip()
         
@@ -225,14 +243,141 @@ st.markdown("---")
 #BACKEND_URL = "http://127.0.0.1:8000"  # Local backend
 BACKEND_URL = "https://lexsy-ai-swe-backend.onrender.com"  # Production backend 
 
-def send_request_with_auth(endpoint, **kwargs):
-    """Helper to attach API key if available."""
-    headers = {}
+# Concurrent /chat_fill calls while preparing questions and processing answers
+CHAT_FILL_CONCURRENCY = int(os.getenv("CHAT_FILL_CONCURRENCY", "6"))
+
+
+@st.cache_resource
+def get_http_session():
+    """One keep-alive session per process so calls to the backend reuse TLS connections."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(CHAT_FILL_CONCURRENCY, 4))
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def auth_headers():
+    """Authorization header for the session's API key (read on the main script thread only)."""
     if "api_key" in st.session_state:
-        headers["Authorization"] = f"Bearer {st.session_state['api_key']}"
-    return requests.post(f"{BACKEND_URL}/{endpoint}", headers=headers, **kwargs)
+        return {"Authorization": f"Bearer {st.session_state['api_key']}"}
+    return {}
 
 
+def send_request_with_auth(endpoint, headers=None, **kwargs):
+    """Helper to attach API key if available. Worker threads must pass `headers` from auth_headers()."""
+    if headers is None:
+        headers = auth_headers()
+    return get_http_session().post(f"{BACKEND_URL}/{endpoint}", headers=headers, **kwargs)
+
+
+def _post_chat_fill(form, headers):
+    # Runs on a worker thread: no st.* calls here
+    res = send_request_with_auth("chat_fill", headers=headers, data=form, timeout=60)
+    return res.json() if res.ok else None
+
+
+def run_chat_turns(items, make_form, on_result, progress_text):
+    """Send /chat_fill for every (occ_id, label) in `items` with bounded concurrency.
+
+    The first occurrence of each label is sent first; the label's other occurrences are
+    sent once it has resolved, so they see the value it filled (reuse). `make_form` and
+    `on_result(occ_id, label, reply_or_None)` run on the script thread, where session_state
+    may be touched; only the HTTP calls run on the pool.
+    """
+    if not items:
+        return
+    headers = auth_headers()
+    by_label = {}
+    for occ_id, label in items:
+        by_label.setdefault(label, []).append(occ_id)
+
+    progress = st.progress(0.0, text=f"{progress_text} (0/{len(items)})")
+    done = 0
+    with ThreadPoolExecutor(max_workers=CHAT_FILL_CONCURRENCY) as pool:
+        def submit(occ_id, label):
+            return pool.submit(_post_chat_fill, make_form(occ_id, label), headers)
+
+        pending = {submit(ids[0], label): (ids[0], label) for label, ids in by_label.items()}
+        while pending:
+            finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in finished:
+                occ_id, label = pending.pop(future)
+                try:
+                    reply = future.result()
+                except Exception:
+                    reply = None
+                on_result(occ_id, label, reply)
+                done += 1
+                progress.progress(done / len(items), text=f"{progress_text} ({done}/{len(items)})")
+                ids = by_label[label]
+                if ids[0] == occ_id:
+                    for other_id in ids[1:]:
+                        pending[submit(other_id, label)] = (other_id, label)
+    progress.empty()
+
+
+
+
+# --- Placeholder form state ---
+# Cards shown per page of the form; only the current page's widgets are rendered on a rerun
+FORM_PAGE_SIZE = int(os.getenv("FORM_PAGE_SIZE", "25"))
+
+
+def build_label_index(occs):
+    """Label (upper-case) -> occurrence ids in document order; built once per parsed document."""
+    index = {}
+    for occ in occs:
+        index.setdefault(occ["label"].upper(), []).append(occ["id"])
+    return index
+
+
+def is_auto_filled(occ_id):
+    return bool(st.session_state.responses_occurrence.get(occ_id)) and \
+        "✅ Auto-filled" in st.session_state.placeholder_questions.get(occ_id, "")
+
+
+def record_input(occ_id, label_upper, value):
+    """Store and validate one field's value and update the filled set. Returns whether it is valid."""
+    ss = st.session_state
+    ss.user_inputs[occ_id] = value
+    valid = False
+    if value.strip():
+        valid, error = validate_input(label_upper, value, ss.placeholder_questions.get(occ_id, ""))
+        if valid:
+            ss.validation_errors.pop(occ_id, None)
+        else:
+            ss.validation_errors[occ_id] = error
+    else:
+        # Clear error if input is empty
+        ss.validation_errors.pop(occ_id, None)
+    if valid or is_auto_filled(occ_id):
+        ss.filled_ids.add(occ_id)
+    else:
+        ss.filled_ids.discard(occ_id)
+    return valid
+
+
+def prefill_label(label_upper, value, skip_id=None):
+    """Give the label's occurrences that were never typed into (and not auto-filled) `value`."""
+    ss = st.session_state
+    for other_id in ss.label_index.get(label_upper, ()):
+        if other_id == skip_id or other_id in ss.user_inputs or is_auto_filled(other_id):
+            continue
+        record_input(other_id, label_upper, value)
+        other_key = f"input_{other_id}"
+        if other_key in ss:
+            ss[other_key] = value
+
+
+def on_input_change(occ_id, label_upper):
+    """Widget callback: runs before the rerun, so each keystroke only touches this label's occurrences."""
+    value = st.session_state.get(f"input_{occ_id}", "")
+    if record_input(occ_id, label_upper, value):
+        # Store in global responses so other occurrences of the label can use it
+        st.session_state.responses_global[label_upper] = value
+        prefill_label(label_upper, value, skip_id=occ_id)
+
 
 # --- Initialize session state ---
 st.session_state.setdefault("placeholders", [])
@@ -241,10 +386,13 @@ st.session_state.setdefault("current_index", 0)
 st.session_state.setdefault("conversation_started", False)
 st.session_state.setdefault("doc_bytes", None)
 st.session_state.setdefault("doc_name", None)
+st.session_state.setdefault("doc_id", None)  # server-side template session from /parse_doc
 st.session_state.setdefault("questions_initialized", False)
 st.session_state.setdefault("placeholder_questions", {})  # occ_id -> question text
 st.session_state.setdefault("user_inputs", {})  # occ_id -> user input value
 st.session_state.setdefault("validation_errors", {})  # occ_id -> error message
+st.session_state.setdefault("label_index", None)  # label -> occ_ids, see build_label_index
+st.session_state.setdefault("filled_ids", set())  # occ_ids auto-filled or with a valid answer
 st.session_state.setdefault("extraction_complete", False)
 st.session_state.setdefault("review_mode", False)
 
@@ -300,10 +448,14 @@ if st.session_state.get("extraction_button_clicked", False) and uploaded_file:
                 st.session_state.conversation_started = True
                 st.session_state.doc_bytes = uploaded_file.getvalue()
                 st.session_state.doc_name = uploaded_file.name
+                st.session_state.doc_id = data.get("doc_id")
                 st.session_state.questions_initialized = False
                 st.session_state.placeholder_questions = {}
                 st.session_state.user_inputs = {}
                 st.session_state.validation_errors = {}
+                st.session_state.label_index = build_label_index(occs)
+                st.session_state.filled_ids = set()
+                st.session_state.pop("form_page", None)
                 st.session_state.extraction_complete = True
                 st.session_state.extraction_button_clicked = False
                 st.rerun()
@@ -319,82 +471,69 @@ if st.session_state.extraction_complete and st.session_state.occurrences and not
     st.markdown("### Please answer the following questions")
     
     occs = list(st.session_state.occurrences)
+    if st.session_state.label_index is None:
+        st.session_state.label_index = build_label_index(occs)
     
     # === Initialize questions for all placeholders ===
     if not st.session_state.questions_initialized:
         with st.spinner("🔄 Preparing questions for all placeholders..."):
             questions_map = {}
-            for occ in occs:
-                occ_id = occ["id"]
-                label = occ["label"].upper()
-                context = st.session_state.context_map.get(occ_id, "")
-                prev_global = st.session_state.responses_global.get(label, "")
-                prev_occ = st.session_state.responses_occurrence.get(occ_id, "")
-                
-                try:
-                    init = send_request_with_auth(
-                        "chat_fill",
-                        data={
-                            "placeholder": label,
-                            "context": context,
-                            "user_input": "",
-                            "previous_global_value": prev_global,
-                            "prior_occurrence_value": prev_occ,
-                        },
-                        timeout=60,
-                    )
-                    if init.ok:
-                        ai0 = init.json()
-                        action0 = ai0.get("action", "ask")
-                        filled0 = ai0.get("filled_value", "").strip()
-                        q0 = ai0.get("followup_question", "").strip()
-                        
-                        # Auto-fill if reuse or LLM can fill
-                        if action0 == "reuse" and prev_global:
-                            st.session_state.responses_occurrence[occ_id] = prev_global
-                            questions_map[occ_id] = f"✅ Auto-filled (reused): **{prev_global}**"
-                            if occ_id in st.session_state.user_inputs:
-                                del st.session_state.user_inputs[occ_id]
-                        elif action0 == "fill" and filled0:
-                            st.session_state.responses_occurrence[occ_id] = filled0
-                            if label not in st.session_state.responses_global:
-                                st.session_state.responses_global[label] = filled0
-                            questions_map[occ_id] = f"✅ Auto-filled: **{filled0}**"
-                            if occ_id in st.session_state.user_inputs:
-                                del st.session_state.user_inputs[occ_id]
-                        else:
-                            questions_map[occ_id] = q0 or f"Please provide the value for **{label}**."
-                    else:
-                        questions_map[occ_id] = f"Please provide the value for **{label}**."
-                except Exception as e:
+
+            def question_form(occ_id, label):
+                return {
+                    "placeholder": label,
+                    "context": st.session_state.context_map.get(occ_id, ""),
+                    "user_input": "",
+                    "previous_global_value": st.session_state.responses_global.get(label, ""),
+                    "prior_occurrence_value": st.session_state.responses_occurrence.get(occ_id, ""),
+                }
+
+            def apply_question(occ_id, label, ai0):
+                if ai0 is None:
                     questions_map[occ_id] = f"Please provide the value for **{label}**."
-            
+                    return
+                prev_global = st.session_state.responses_global.get(label, "")
+                action0 = ai0.get("action", "ask")
+                filled0 = ai0.get("filled_value", "").strip()
+                q0 = ai0.get("followup_question", "").strip()
+
+                # Auto-fill if reuse or LLM can fill
+                if action0 == "reuse" and prev_global:
+                    st.session_state.responses_occurrence[occ_id] = prev_global
+                    questions_map[occ_id] = f"✅ Auto-filled (reused): **{prev_global}**"
+                    if occ_id in st.session_state.user_inputs:
+                        del st.session_state.user_inputs[occ_id]
+                elif action0 == "fill" and filled0:
+                    st.session_state.responses_occurrence[occ_id] = filled0
+                    if label not in st.session_state.responses_global:
+                        st.session_state.responses_global[label] = filled0
+                    questions_map[occ_id] = f"✅ Auto-filled: **{filled0}**"
+                    if occ_id in st.session_state.user_inputs:
+                        del st.session_state.user_inputs[occ_id]
+                else:
+                    questions_map[occ_id] = q0 or f"Please provide the value for **{label}**."
+
+            run_chat_turns(
+                [(occ["id"], occ["label"].upper()) for occ in occs],
+                question_form,
+                apply_question,
+                "Preparing questions",
+            )
+
             st.session_state.placeholder_questions = questions_map
+            # Start every field from its typed value, or the label's known value if it has one
+            st.session_state.filled_ids = {occ["id"] for occ in occs if is_auto_filled(occ["id"])}
+            for occ in occs:
+                if occ["id"] in st.session_state.user_inputs:
+                    record_input(occ["id"], occ["label"].upper(), st.session_state.user_inputs[occ["id"]])
+            for label_upper, value in st.session_state.responses_global.items():
+                prefill_label(label_upper, value)
             st.session_state.questions_initialized = True
             st.rerun()
     
-    # === Display all placeholders with input fields ===
+    # === Display the current page of placeholders ===
     total_count = len(occs)
-    
-    # First, calculate filled_count by checking all fields
-    filled_count = 0
-    validation_errors = st.session_state.get("validation_errors", {})
-    for occ in occs:
-        occ_id = occ["id"]
-        user_input_key = f"input_{occ_id}"
-        current_value = st.session_state.responses_occurrence.get(occ_id, "")
-        question = st.session_state.placeholder_questions.get(occ_id, "")
-        widget_val = st.session_state.get(user_input_key, "").strip()
-        
-        # Count as filled if auto-filled or has valid input without errors
-        if current_value and "✅ Auto-filled" in question:
-            filled_count += 1
-        elif widget_val and occ_id not in validation_errors:
-            # Double-check validation for filled fields
-            label_upper = occ["label"].upper()
-            valid, _ = validate_input(label_upper, widget_val, question)
-            if valid:
-                filled_count += 1
+    filled_count = len(st.session_state.filled_ids)
     
     # Progress indicator (compact)
     progress_ratio = filled_count / total_count if total_count > 0 else 0
@@ -404,101 +543,59 @@ if st.session_state.extraction_complete and st.session_state.occurrences and not
     with col2:
         st.markdown(f'<p class="progress-info" style="margin:0; padding-top:0.25rem;">{filled_count}/{total_count}</p>', unsafe_allow_html=True)
     
+    page_count = -(-total_count // FORM_PAGE_SIZE)
+    page = 0
+    if page_count > 1:
+        page = st.selectbox(
+            "Questions",
+            range(page_count),
+            format_func=lambda p: f"Questions {p * FORM_PAGE_SIZE + 1}–{min(total_count, (p + 1) * FORM_PAGE_SIZE)} of {total_count}",
+            key="form_page",
+        )
+        if filled_count < total_count:
+            open_pages = sorted({
+                idx // FORM_PAGE_SIZE + 1
+                for idx, occ in enumerate(occs)
+                if occ["id"] not in st.session_state.filled_ids
+            })
+            st.caption(f"Unanswered questions on page(s): {', '.join(map(str, open_pages))}")
+    
     # Placeholder cards
-    for idx, occ in enumerate(occs):
+    page_start = page * FORM_PAGE_SIZE
+    for idx, occ in enumerate(occs[page_start:page_start + FORM_PAGE_SIZE], start=page_start):
         occ_id = occ["id"]
         label = occ["label"]
-        context = st.session_state.context_map.get(occ_id, "")
         question = st.session_state.placeholder_questions.get(occ_id, f"Please provide **{label}**.")
         
-        # Check if already auto-filled
-        current_value = st.session_state.responses_occurrence.get(occ_id, "")
-        is_auto_filled = current_value and "✅ Auto-filled" in question
-        
-        if is_auto_filled:
-            st.markdown(f"**{idx + 1}. {label}**")
-            st.caption(question)
+        st.markdown(f"**{idx + 1}. {label}**")
+        st.caption(question)
+        if is_auto_filled(occ_id):
             st.text_input(
                 "Value",
-                value=current_value,
+                value=st.session_state.responses_occurrence[occ_id],
                 key=f"display_{occ_id}",
                 disabled=True,
                 label_visibility="collapsed"
             )
-        else:
-            # Get user input for this field
-            user_input_key = f"input_{occ_id}"
-            label_upper = label.upper()
-            
-            # Check if there's a previous value for the same label (from earlier occurrences)
-            previous_global_value = st.session_state.responses_global.get(label_upper, "")
-            
-            # Initialize widget value in session state if needed
-            if user_input_key not in st.session_state:
-                # Widget doesn't exist yet - initialize with global value if available
-                if previous_global_value:
-                    st.session_state[user_input_key] = previous_global_value
-                    st.session_state.user_inputs[occ_id] = previous_global_value
-                else:
-                    st.session_state[user_input_key] = ""
-            else:
-                # Widget exists - check if we should update it with global value
-                current_widget_val = st.session_state.get(user_input_key, "")
-                # If widget is empty but we have a global value, prefill it
-                if not current_widget_val and previous_global_value:
-                    st.session_state[user_input_key] = previous_global_value
-                    st.session_state.user_inputs[occ_id] = previous_global_value
-            
-            # Get the current value to display
-            prev_input = st.session_state.get(user_input_key, "")
-            
-            st.markdown(f"**{idx + 1}. {label}**")
-            st.caption(question)
-            
-            user_input = st.text_input(
-                f"Enter your answer",
-                value=prev_input,
-                key=user_input_key,
-                placeholder="Type your answer here..." if not prev_input else "",
-                label_visibility="collapsed"
-            )
-            
-            # Streamlit widgets with keys automatically update st.session_state[key]
-            # Get the current widget value
-            widget_val = st.session_state.get(user_input_key, "")
-            
-            # Sync to user_inputs if changed
-            if widget_val != st.session_state.user_inputs.get(occ_id, ""):
-                st.session_state.user_inputs[occ_id] = widget_val
-                
-                # Validate input
-                if widget_val:
-                    valid, error = validate_input(label, widget_val, question)
-                    if valid:
-                        if occ_id in st.session_state.validation_errors:
-                            del st.session_state.validation_errors[occ_id]
-                        # Store in global responses so subsequent occurrences can use it
-                        st.session_state.responses_global[label_upper] = widget_val
-                        # Update other occurrences of the same label that don't have user input yet
-                        for other_occ in occs:
-                            other_occ_id = other_occ["id"]
-                            other_label_upper = other_occ["label"].upper()
-                            if other_label_upper == label_upper and other_occ_id != occ_id:
-                                other_input_key = f"input_{other_occ_id}"
-                                # Only update if the other field is empty and not manually set
-                                if not st.session_state.get(other_input_key, "") and other_occ_id not in st.session_state.user_inputs:
-                                    st.session_state[other_input_key] = widget_val
-                                    st.session_state.user_inputs[other_occ_id] = widget_val
-                    else:
-                        st.session_state.validation_errors[occ_id] = error
-                else:
-                    # Clear error if input is empty
-                    if occ_id in st.session_state.validation_errors:
-                        del st.session_state.validation_errors[occ_id]
-            
-            # Show validation error if any
-            if occ_id in st.session_state.validation_errors:
-                st.error(st.session_state.validation_errors[occ_id])
+            continue
+        
+        # Widgets of other pages are not kept by Streamlit; user_inputs is the source of truth
+        user_input_key = f"input_{occ_id}"
+        if user_input_key not in st.session_state:
+            st.session_state[user_input_key] = st.session_state.user_inputs.get(occ_id, "")
+        
+        st.text_input(
+            "Enter your answer",
+            key=user_input_key,
+            on_change=on_input_change,
+            args=(occ_id, label.upper()),
+            placeholder="Type your answer here...",
+            label_visibility="collapsed"
+        )
+        
+        # Show validation error if any
+        if occ_id in st.session_state.validation_errors:
+            st.error(st.session_state.validation_errors[occ_id])
     
     # Process button
     col1, col2, col3 = st.columns([1, 2, 1])
@@ -507,26 +604,24 @@ if st.session_state.extraction_complete and st.session_state.occurrences and not
             # Process all user inputs through LLM
             with st.spinner("🔄 Processing your answers..."):
                 all_valid = True
+                pending_turns = []  # (occ_id, label) validated and ready for the LLM
                 for occ in occs:
                     occ_id = occ["id"]
                     label = occ["label"].upper()
-                    context = st.session_state.context_map.get(occ_id, "")
-                    
+
                     # Skip if already auto-filled
                     if occ_id in st.session_state.responses_occurrence:
                         if st.session_state.responses_occurrence[occ_id]:
                             continue
-                    
-                    # Get input from widget or session state
-                    input_widget_key = f"input_{occ_id}"
-                    user_input = st.session_state.get(input_widget_key, st.session_state.user_inputs.get(occ_id, "")).strip()
+
+                    user_input = st.session_state.user_inputs.get(occ_id, "").strip()
                     if not user_input:
                         all_valid = False
                         continue
-                    
+
                     # Update session state
                     st.session_state.user_inputs[occ_id] = user_input
-                    
+
                     # Validate - get question from session state
                     question_text = st.session_state.placeholder_questions.get(occ_id, "")
                     valid, error = validate_input(label, user_input, question_text)
@@ -534,46 +629,37 @@ if st.session_state.extraction_complete and st.session_state.occurrences and not
                         st.session_state.validation_errors[occ_id] = error
                         all_valid = False
                         continue
-                    
-                    # Process through LLM
+                    pending_turns.append((occ_id, label))
+
+                def answer_form(occ_id, label):
+                    return {
+                        "placeholder": label,
+                        "context": st.session_state.context_map.get(occ_id, ""),
+                        "user_input": st.session_state.user_inputs[occ_id],
+                        "previous_global_value": st.session_state.responses_global.get(label, ""),
+                        "prior_occurrence_value": st.session_state.responses_occurrence.get(occ_id, ""),
+                    }
+
+                def apply_answer(occ_id, label, ai):
+                    user_input = st.session_state.user_inputs[occ_id]
                     prev_global = st.session_state.responses_global.get(label, "")
-                    prev_occ = st.session_state.responses_occurrence.get(occ_id, "")
-                    
-                    try:
-                        res = send_request_with_auth(
-                            "chat_fill",
-                            data={
-                                "placeholder": label,
-                                "context": context,
-                                "user_input": user_input,
-                                "previous_global_value": prev_global,
-                                "prior_occurrence_value": prev_occ,
-                            },
-                            timeout=60,
-                        )
-                        
-                        if res.ok:
-                            ai = res.json()
-                            action = ai.get("action", "ask")
-                            filled = ai.get("filled_value", "").strip()
-                            
-                            if action == "fill" and filled:
-                                st.session_state.responses_occurrence[occ_id] = filled
-                                if label not in st.session_state.responses_global:
-                                    st.session_state.responses_global[label] = filled
-                            elif action == "reuse" and prev_global:
-                                st.session_state.responses_occurrence[occ_id] = prev_global
-                            else:
-                                # Use user input as-is if LLM doesn't fill
-                                st.session_state.responses_occurrence[occ_id] = user_input
-                                if label not in st.session_state.responses_global:
-                                    st.session_state.responses_global[label] = user_input
-                    except Exception as e:
-                        # Fallback to user input
-                                st.session_state.responses_occurrence[occ_id] = user_input
-                                if label not in st.session_state.responses_global:
-                                    st.session_state.responses_global[label] = user_input
-                
+                    action = ai.get("action", "ask") if ai else "ask"
+                    filled = ai.get("filled_value", "").strip() if ai else ""
+
+                    if action == "fill" and filled:
+                        st.session_state.responses_occurrence[occ_id] = filled
+                        if label not in st.session_state.responses_global:
+                            st.session_state.responses_global[label] = filled
+                    elif action == "reuse" and prev_global:
+                        st.session_state.responses_occurrence[occ_id] = prev_global
+                    else:
+                        # Use user input as-is if LLM doesn't fill (or the request failed)
+                        st.session_state.responses_occurrence[occ_id] = user_input
+                        if label not in st.session_state.responses_global:
+                            st.session_state.responses_global[label] = user_input
+
+                run_chat_turns(pending_turns, answer_form, apply_answer, "Processing answers")
+
                 if all_valid:
                     st.session_state.review_mode = True
                     st.rerun()
@@ -628,6 +714,7 @@ if all_filled or st.session_state.review_mode:
                         "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
                     )
                 }
+                doc_id = st.session_state.get("doc_id")
                 # Send ordered list of occurrences with their values to preserve order
                 # This ensures each placeholder (even with same label) gets its unique value
                 ordered_responses = [
@@ -641,7 +728,12 @@ if all_filled or st.session_state.review_mode:
                 data = {"responses": json.dumps(ordered_responses)}
                 
                 try:
-                    res = requests.post(f"{BACKEND_URL}/fill_doc", files=files, data=data, timeout=120)
+                    # Reuse the template kept by the backend; re-upload only if that session expired
+                    res = None
+                    if doc_id:
+                        res = get_http_session().post(f"{BACKEND_URL}/fill_doc", data={**data, "doc_id": doc_id}, timeout=120)
+                    if res is None or res.status_code == 404:
+                        res = get_http_session().post(f"{BACKEND_URL}/fill_doc", files=files, data=data, timeout=120)
                     if res.ok:
                         st.success("✅ Document generated successfully!")
                         st.download_button(